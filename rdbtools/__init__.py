@@ -1,10 +1,10 @@
-from rdbtools.parser import RdbCallback, RdbParser, DebugCallback
-from rdbtools.callbacks import JSONCallback, DiffCallback, ProtocolCallback
+from rdbtools.parser import RdbCallback, RdbParser, DebugCallback, LazyValue, RdbRecord, KeyInfo
+from rdbtools.callbacks import JSONCallback, DiffCallback, NDJSONCallback, ProtocolCallback, RestoreCallback
 from rdbtools.memprofiler import MemoryCallback, PrintAllKeys, StatsAggregator
 
 __version__ = '0.1.6'
 VERSION = tuple(map(int, __version__.split('.')))
 
 __all__ = [
-    'RdbParser', 'RdbCallback', 'JSONCallback', 'DiffCallback', 'MemoryCallback', 'ProtocolCallback', 'PrintAllKeys']
+    'RdbParser', 'RdbCallback', 'LazyValue', 'RdbRecord', 'KeyInfo', 'JSONCallback', 'DiffCallback', 'NDJSONCallback', 'MemoryCallback', 'ProtocolCallback', 'RestoreCallback', 'PrintAllKeys']
 
@@ -0,0 +1,57 @@
+try :
+    import numpy
+except ImportError:
+    numpy = None
+
+# The encoding of an intset, then the number of entries
+INTSET_HEADER_SIZE = 8
+# zlbytes, zltail and the number of entries
+ZIPLIST_HEADER_SIZE = 10
+
+if numpy is not None :
+    # Numpy type of the entries of an intset, keyed by the intset encoding
+    INTSET_DTYPES = {2 : numpy.dtype('<u2'), 4 : numpy.dtype('<u4'), 8 : numpy.dtype('<u8')}
+
+    # Ziplist entries that all hold an integer of the same size are the same number of bytes apart :
+    # the length of the previous entry, the entry header, and the integer. Keyed by that number of bytes,
+    # the header of those entries and the numpy type that reads them.
+    def _integer_entries(header, *value_fields):
+        return header, numpy.dtype([('prev_length', 'u1'), ('header', 'u1')] + list(value_fields))
+
+    INTEGER_ZIPLIST_ENTRIES = {
+        3 : _integer_entries(0xFE, ('value', '<i1')),
+        4 : _integer_entries(0xC0, ('value', '<i2')),
+        # numpy has no 24 bit integers, so these are put together from their bytes
+        5 : _integer_entries(0xF0, ('low', '<u2'), ('high', '<i1')),
+        6 : _integer_entries(0xD0, ('value', '<i4')),
+        10 : _integer_entries(0xE0, ('value', '<i8')),
+    }
+
+def intset_array(data, encoding, count):
+    '''Returns the `count` entries of the intset `data` as a numpy array, from its `encoding`'''
+    return numpy.frombuffer(data, INTSET_DTYPES[encoding], count, INTSET_HEADER_SIZE)
+
+def integer_ziplist_array(data):
+    '''
+    Returns the entries of the ziplist `data` as a numpy array if they are all integers
+    encoded in the same number of bytes, which is how lists of numeric ids are often
+    stored. Returns None for any other ziplist, which has to be walked entry by entry.
+    '''
+    # the ziplist ends with a 255 byte
+    size = len(data) - ZIPLIST_HEADER_SIZE - 1
+    count = numpy.frombuffer(data, '<u2', 1, 8)[0]
+    if count == 0 or count == 65535 or size % count :
+        return None
+    stride = size // count
+    if not stride in INTEGER_ZIPLIST_ENTRIES :
+        return None
+    header, dtype = INTEGER_ZIPLIST_ENTRIES[stride]
+    entries = numpy.frombuffer(data, dtype, count, ZIPLIST_HEADER_SIZE)
+    if (entries['header'] != header).any() or entries['prev_length'][0] != 0 or (entries['prev_length'][1:] != stride).any() :
+        return None
+    if header == 0xF0 :
+        return (entries['high'].astype(numpy.int32) << 16) | entries['low']
+    return entries['value']
+
+def is_array(values):
+    return numpy is not None and isinstance(values, numpy.ndarray)
@@ -1,9 +1,10 @@
 import calendar
+import datetime
 import re
 from decimal import Decimal
 import sys
 import struct
-from rdbtools.parser import RdbCallback, RdbParser
+from rdbtools.parser import RdbCallback, RdbParser, expiry_to_datetime
 
 ESCAPE = re.compile(ur'[\x00-\x1f\\"\b\f\n\r\t\u2028\u2029]')
 ESCAPE_ASCII = re.compile(r'([\\"]|[^\ -~])')
@@ -21,6 +22,10 @@ ESCAPE_DCT = {
 }
 for i in range(0x20):
     ESCAPE_DCT.setdefault(chr(i), '\\u%04x' % (i,))
+# Printable ASCII characters that JSON strings hold as they are. Deleting them with
+# str.translate leaves nothing of a string that needs no escaping, which is much
+# faster to check than searching it with ESCAPE_ASCII.
+PLAIN_ASCII = ''.join(chr(i) for i in range(0x20, 0x7f) if not chr(i) in '\\"')
 
 def _floatconstants():
     _BYTES = '7FF80000000000007FF0000000000000'.decode('hex')
@@ -41,32 +46,35 @@ def _encode_basestring(s):
         return ESCAPE_DCT[match.group(0)]
     return u'"' + ESCAPE.sub(replace, s) + u'"'
 
+def _replace_ascii(match):
+    s = match.group(0)
+    try:
+        return ESCAPE_DCT[s]
+    except KeyError:
+        n = ord(s)
+        if n < 0x10000:
+            #return '\\u{0:04x}'.format(n)
+            return '\\u%04x' % (n,)
+        else:
+            # surrogate pair
+            n -= 0x10000
+            s1 = 0xd800 | ((n >> 10) & 0x3ff)
+            s2 = 0xdc00 | (n & 0x3ff)
+            return '\\u%04x\\u%04x' % (s1, s2)
+
 def _encode_basestring_ascii(s):
     """Return an ASCII-only JSON representation of a Python string
 
     """
+    # Most keys and values are printable ASCII, and are only quoted
+    if isinstance(s, str) and not s.translate(None, PLAIN_ASCII):
+        return '"' + s + '"'
     try :
         if isinstance(s, str) and HAS_UTF8.search(s) is not None:
             s = s.decode('utf-8')
     except:
         pass
-
-    def replace(match):
-        s = match.group(0)
-        try:
-            return ESCAPE_DCT[s]
-        except KeyError:
-            n = ord(s)
-            if n < 0x10000:
-                #return '\\u{0:04x}'.format(n)
-                return '\\u%04x' % (n,)
-            else:
-                # surrogate pair
-                n -= 0x10000
-                s1 = 0xd800 | ((n >> 10) & 0x3ff)
-                s2 = 0xdc00 | (n & 0x3ff)
-                return '\\u%04x\\u%04x' % (s1, s2)
-    return '"' + str(ESCAPE_ASCII.sub(replace, s)) + '"'
+    return '"' + str(ESCAPE_ASCII.sub(_replace_ascii, s)) + '"'
 
 def _encode(s, quote_numbers = True):
     if quote_numbers:
@@ -88,21 +96,58 @@ def _encode(s, quote_numbers = True):
         return _encode_basestring_ascii(s)
 
 def encode_key(s):
+    if type(s) is str and not s.translate(None, PLAIN_ASCII):
+        return '"' + s + '"'
     return _encode(s, quote_numbers=True)
 
 def encode_value(s):
+    if type(s) is str and not s.translate(None, PLAIN_ASCII):
+        return '"' + s + '"'
     return _encode(s, quote_numbers=False)
 
+# Bytes collected by BufferedOutput before they are written out
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+class BufferedOutput(object):
+    '''
+    Collects the many small strings written by a callback, and writes them to `out`
+    joined in blocks of about `size` bytes. Whatever is left is written by `flush`.
+    '''
+    def __init__(self, out, size=OUTPUT_BUFFER_SIZE):
+        self._out = out
+        self._size = size
+        self._parts = []
+        self._length = 0
+
+    def write(self, data):
+        self._parts.append(data)
+        self._length += len(data)
+        if self._length >= self._size:
+            self.flush()
+
+    def flush(self):
+        if self._parts:
+            self._out.write(''.join(self._parts))
+            self._parts = []
+            self._length = 0
+
 
 class JSONCallback(RdbCallback):
+    '''
+    Writes the dump as a JSON array with an object per database. Output is buffered,
+    and written to `out` in large blocks, the last of them by `end_rdb` or `flush`.
+    '''
     def __init__(self, out):
-        self._out = out
+        self._out = BufferedOutput(out)
         self._is_first_db = True
         self._has_databases = False
         self._is_first_key_in_db = True
         self._elements_in_key = 0 
         self._element_index = 0
         
+    def flush(self):
+        self._out.flush()
+    
     def start_rdb(self):
         self._out.write('[')
     
@@ -121,6 +166,7 @@ class JSONCallback(RdbCallback):
         if self._has_databases:
             self._out.write('}')
         self._out.write(']')
+        self._out.flush()
 
     def _start_key(self, key, length):
         if not self._is_first_key_in_db:
@@ -137,18 +183,29 @@ class JSONCallback(RdbCallback):
         if self._element_index > 0 and self._element_index < self._elements_in_key :
             self._out.write(',')
         self._element_index = self._element_index + 1
+    
+    def _write_elements(self, elements):
+        if not elements:
+            return
+        if self._element_index > 0:
+            self._out.write(',')
+        self._element_index = self._element_index + len(elements)
+        self._out.write(','.join(elements))
         
     def set(self, key, value, expiry, info):
         self._start_key(key, 0)
-        self._out.write('%s:%s' % (encode_key(key), encode_value(value)))
+        self._out.write(encode_key(key) + ':' + encode_value(value))
     
     def start_hash(self, key, length, expiry, info):
         self._start_key(key, length)
-        self._out.write('%s:{' % encode_key(key))
+        self._out.write(encode_key(key) + ':{')
     
     def hset(self, key, field, value):
         self._write_comma()
-        self._out.write('%s:%s' % (encode_key(field), encode_value(value)))
+        self._out.write(encode_key(field) + ':' + encode_value(value))
+    
+    def hset_many(self, key, pairs):
+        self._write_elements([encode_key(field) + ':' + encode_value(value) for field, value in pairs])
     
     def end_hash(self, key):
         self._end_key(key)
@@ -156,11 +213,14 @@ class JSONCallback(RdbCallback):
     
     def start_set(self, key, cardinality, expiry, info):
         self._start_key(key, cardinality)
-        self._out.write('%s:[' % encode_key(key))
+        self._out.write(encode_key(key) + ':[')
 
     def sadd(self, key, member):
         self._write_comma()
-        self._out.write('%s' % encode_value(member))
+        self._out.write(encode_value(member))
+    
+    def sadd_many(self, key, members):
+        self._write_elements([encode_value(member) for member in members])
     
     def end_set(self, key):
         self._end_key(key)
@@ -168,11 +228,14 @@ class JSONCallback(RdbCallback):
     
     def start_list(self, key, length, expiry, info):
         self._start_key(key, length)
-        self._out.write('%s:[' % encode_key(key))
+        self._out.write(encode_key(key) + ':[')
     
     def rpush(self, key, value) :
         self._write_comma()
-        self._out.write('%s' % encode_value(value))
+        self._out.write(encode_value(value))
+    
+    def rpush_many(self, key, values):
+        self._write_elements([encode_value(value) for value in values])
     
     def end_list(self, key):
         self._end_key(key)
@@ -180,11 +243,14 @@ class JSONCallback(RdbCallback):
     
     def start_sorted_set(self, key, length, expiry, info):
         self._start_key(key, length)
-        self._out.write('%s:{' % encode_key(key))
+        self._out.write(encode_key(key) + ':{')
     
     def zadd(self, key, score, member):
         self._write_comma()
-        self._out.write('%s:%s' % (encode_key(member), encode_value(score)))
+        self._out.write(encode_key(member) + ':' + encode_value(score))
+    
+    def zadd_many(self, key, pairs):
+        self._write_elements([encode_key(member) + ':' + encode_value(score) for score, member in pairs])
     
     def end_sorted_set(self, key):
         self._end_key(key)
@@ -193,34 +259,49 @@ class JSONCallback(RdbCallback):
 
 class DiffCallback(RdbCallback):
     '''Prints the contents of RDB in a format that is unix sort friendly, 
-        so that two rdb files can be diffed easily'''
+        so that two rdb files can be diffed easily. Output is buffered like that of JSONCallback'''
     def __init__(self, out):
-        self._out = out
+        self._out = BufferedOutput(out)
         self._index = 0
         self._dbnum = 0
+        self._key = None
+        self._key_prefix = None
         
+    def flush(self):
+        self._out.flush()
+    
     def start_rdb(self):
         pass
     
     def start_database(self, db_number):
         self._dbnum = db_number
+        self._key = None
 
     def end_database(self, db_number):
         pass
         
     def end_rdb(self):
-        pass
+        self._out.flush()
+    
+    def prefix(self, key):
+        '''The database and encoded key that start every line of `key`, encoded once for all its elements'''
+        if key is not self._key:
+            self._key = key
+            self._key_prefix = 'db=%d %s' % (self._dbnum, encode_key(key))
+        return self._key_prefix
        
     def set(self, key, value, expiry, info):
-        self._out.write('db=%d %s -> %s' % (self._dbnum, encode_key(key), encode_value(value)))
-        self.newline()
+        self._out.write('%s -> %s\r\n' % (self.prefix(key), encode_value(value)))
     
     def start_hash(self, key, length, expiry, info):
         pass
     
     def hset(self, key, field, value):
-        self._out.write('db=%d %s . %s -> %s' % (self._dbnum, encode_key(key), encode_key(field), encode_value(value)))
-        self.newline()
+        self._out.write('%s . %s -> %s\r\n' % (self.prefix(key), encode_key(field), encode_value(value)))
+    
+    def hset_many(self, key, pairs):
+        prefix = self.prefix(key) + ' . '
+        self._out.write(''.join([prefix + encode_key(field) + ' -> ' + encode_value(value) + '\r\n' for field, value in pairs]))
     
     def end_hash(self, key):
         pass
@@ -229,8 +310,11 @@ class DiffCallback(RdbCallback):
         pass
 
     def sadd(self, key, member):
-        self._out.write('db=%d %s { %s }' % (self._dbnum, encode_key(key), encode_value(member)))
-        self.newline()
+        self._out.write('%s { %s }\r\n' % (self.prefix(key), encode_value(member)))
+    
+    def sadd_many(self, key, members):
+        prefix = self.prefix(key) + ' { '
+        self._out.write(''.join([prefix + encode_value(member) + ' }\r\n' for member in members]))
     
     def end_set(self, key):
         pass
@@ -239,10 +323,15 @@ class DiffCallback(RdbCallback):
         self._index = 0
             
     def rpush(self, key, value) :
-        self._out.write('db=%d %s[%d] -> %s' % (self._dbnum, encode_key(key), self._index, encode_value(value)))
-        self.newline()
+        self._out.write('%s[%d] -> %s\r\n' % (self.prefix(key), self._index, encode_value(value)))
         self._index = self._index + 1
     
+    def rpush_many(self, key, values):
+        prefix = self.prefix(key)
+        self._out.write(''.join(['%s[%d] -> %s\r\n' % (prefix, index, encode_value(value)) 
+                                 for index, value in enumerate(values, self._index)]))
+        self._index = self._index + len(values)
+    
     def end_list(self, key):
         pass
     
@@ -250,10 +339,15 @@ class DiffCallback(RdbCallback):
         self._index = 0
     
     def zadd(self, key, score, member):
-        self._out.write('db=%d %s[%d] -> {%s, score=%s}' % (self._dbnum, encode_key(key), self._index, encode_key(member), encode_value(score)))
-        self.newline()
+        self._out.write('%s[%d] -> {%s, score=%s}\r\n' % (self.prefix(key), self._index, encode_key(member), encode_value(score)))
         self._index = self._index + 1
     
+    def zadd_many(self, key, pairs):
+        prefix = self.prefix(key)
+        self._out.write(''.join(['%s[%d] -> {%s, score=%s}\r\n' % (prefix, index, encode_key(member), encode_value(score)) 
+                                 for index, (score, member) in enumerate(pairs, self._index)]))
+        self._index = self._index + len(pairs)
+    
     def end_sorted_set(self, key):
         pass
 
@@ -261,102 +355,323 @@ class DiffCallback(RdbCallback):
         self._out.write('\r\n')
 
 
+class NDJSONCallback(RdbCallback):
+    '''
+    Writes a line of JSON per key, with its database, key, type, expiry and value. Lines 
+    can be read, and the output split between them, without parsing the rest of the dump.
+    Values are encoded like JSONCallback does, and expiries in ISO 8601 format, or null.
+
+    If `out` has a `write_record(key, record)` method, like the shards of `rdbtools.shards`, 
+    every line is passed to it along with its key. Otherwise output is buffered, like that 
+    of JSONCallback.
+    '''
+    wants_raw_expiry = True
+
+    def __init__(self, out):
+        self._write_record = getattr(out, 'write_record', None)
+        self._out = None
+        if self._write_record is None:
+            self._out = BufferedOutput(out)
+            self._write_record = lambda key, record: self._out.write(record)
+        self._dbnum = 0
+        self._record = None
+        self._elements = None
+
+    def flush(self):
+        if self._out is not None:
+            self._out.flush()
+
+    def start_database(self, db_number):
+        self._dbnum = db_number
+
+    def end_rdb(self):
+        self.flush()
+
+    def _start_key(self, key, data_type, expiry):
+        if expiry is None:
+            expiry = 'null'
+        else:
+            expiry = '"%s"' % _expiry_isoformat(expiry)
+        self._record = '{"db":%d,"key":%s,"type":"%s","expiry":%s,"value":' % (self._dbnum, encode_key(key), data_type, expiry)
+        self._elements = []
+
+    def _end_key(self, key, start, end):
+        self._write_record(key, self._record + start + ','.join(self._elements) + end + '}\n')
+        self._elements = None
+
+    def set(self, key, value, expiry, info):
+        self._start_key(key, 'string', expiry)
+        self._write_record(key, self._record + encode_value(value) + '}\n')
+
+    def start_hash(self, key, length, expiry, info):
+        self._start_key(key, 'hash', expiry)
+
+    def hset(self, key, field, value):
+        self._elements.append(encode_key(field) + ':' + encode_value(value))
+
+    def hset_many(self, key, pairs):
+        self._elements.extend([encode_key(field) + ':' + encode_value(value) for field, value in pairs])
+
+    def end_hash(self, key):
+        self._end_key(key, '{', '}')
+
+    def start_set(self, key, cardinality, expiry, info):
+        self._start_key(key, 'set', expiry)
+
+    def sadd(self, key, member):
+        self._elements.append(encode_value(member))
+
+    def sadd_many(self, key, members):
+        self._elements.extend([encode_value(member) for member in members])
+
+    def end_set(self, key):
+        self._end_key(key, '[', ']')
+
+    def start_list(self, key, length, expiry, info):
+        self._start_key(key, 'list', expiry)
+
+    def rpush(self, key, value):
+        self._elements.append(encode_value(value))
+
+    def rpush_many(self, key, values):
+        self._elements.extend([encode_value(value) for value in values])
+
+    def end_list(self, key):
+        self._end_key(key, '[', ']')
+
+    def start_sorted_set(self, key, length, expiry, info):
+        self._start_key(key, 'sortedset', expiry)
+
+    def zadd(self, key, score, member):
+        self._elements.append(encode_key(member) + ':' + encode_value(score))
+
+    def zadd_many(self, key, pairs):
+        self._elements.extend([encode_key(member) + ':' + encode_value(score) for score, member in pairs])
+
+    def end_sorted_set(self, key):
+        self._end_key(key, '{', '}')
+
+
 def _unix_timestamp(dt):
      return calendar.timegm(dt.utctimetuple())
 
+def _expiry_seconds(expiry):
+    # Expiries are milliseconds since the epoch, unless the callback was run with wants_raw_expiry off
+    if isinstance(expiry, datetime.datetime):
+        return _unix_timestamp(expiry)
+    return expiry // 1000
 
-class ProtocolCallback(RdbCallback):
-    def __init__(self, out):
-        self._out = out
-        self.reset()
+def _expiry_isoformat(expiry):
+    if not isinstance(expiry, datetime.datetime):
+        expiry = expiry_to_datetime(expiry)
+    return expiry.isoformat()
 
-    def reset(self):
-        self._expires = {}
 
-    def set_expiry(self, key, dt):
-        self._expires[key] = dt
+# Elements sent in each HSET, SADD, RPUSH or ZADD command by ProtocolCallback
+PROTOCOL_BATCH_SIZE = 100
 
-    def get_expiry_seconds(self, key):
-        if key in self._expires:
-            return _unix_timestamp(self._expires[key])
-        return None
+def bulk_string(arg):
+    '''Returns `arg` in the redis protocol. Strings are sent byte for byte, and scores with all their digits'''
+    if type(arg) is not str:
+        if isinstance(arg, unicode):
+            arg = arg.encode('utf-8')
+        elif isinstance(arg, float):
+            arg = repr(arg)
+        else:
+            arg = str(arg)
+    return '$%d\r\n%s\r\n' % (len(arg), arg)
+
+class ProtocolCallback(RdbCallback):
+    '''
+    Writes the dump as redis commands, in the redis protocol, to be replayed with redis-cli --pipe.
+
+    The elements of hashes, sets, lists and sorted sets are sent `batch_size` at a time, in
+    variadic HSET, SADD, RPUSH and ZADD commands, which need redis 4.0 or later. Keys with an 
+    expiry are followed by an EXPIREAT. Output is buffered like that of JSONCallback.
+    '''
+    wants_raw_expiry = True
+
+    def __init__(self, out, batch_size=PROTOCOL_BATCH_SIZE):
+        self._out = BufferedOutput(out)
+        self._batch_size = batch_size
+        self._expiry = None
+        # the command and key that start every command of the current key, and the
+        # arguments of its elements that have not been written yet
+        self._key = None
+        self._prefix = None
+        self._args = []
+        self._batch_args = 0
+
+    def flush(self):
+        self._out.flush()
 
     def expires(self, key):
-        return key in self._expires
+        return self._expiry is not None
+
+    def get_expiry_seconds(self, key):
+        if self._expiry is not None:
+            return _expiry_seconds(self._expiry)
+        return None
 
     def pre_expiry(self, key, expiry):
-        if expiry is not None:
-            self.set_expiry(key, expiry)
+        self._expiry = expiry
 
     def post_expiry(self, key):
-        if self.expires(key):
+        if self._expiry is not None:
             self.expireat(key, self.get_expiry_seconds(key))
+            self._expiry = None
+
+    def send(self, key, command):
+        '''Writes one `command` about `key`, or about no key if `key` is None'''
+        self._out.write(command)
 
     def emit(self, *args):
-        self._out.write(u"*" + unicode(len(args)) + u"\r\n")
-        for arg in args:
-            self._out.write(u"$" + unicode(len(unicode(arg))) + u"\r\n")
-            self._out.write(unicode(arg) + u"\r\n")
+        self.send(None, self.command(*args))
+
+    def command(self, *args):
+        return '*%d\r\n' % len(args) + ''.join([bulk_string(arg) for arg in args])
 
     def start_database(self, db_number):
-        self.reset()
         self.select(db_number)
 
+    def end_rdb(self):
+        self._out.flush()
+
+    def _start_elements(self, command, key, expiry, args_per_element):
+        self.pre_expiry(key, expiry)
+        self._key = key
+        self._prefix = bulk_string(command) + bulk_string(key)
+        self._args = []
+        self._batch_args = self._batch_size * args_per_element
+
+    def _add_args(self, args):
+        self._args.extend(args)
+        if len(self._args) >= self._batch_args:
+            self._write_batches(len(self._args) - len(self._args) % self._batch_args)
+
+    def _write_batches(self, count):
+        '''Writes the first `count` pending arguments, in batches of `batch_size` elements'''
+        args = self._args
+        for start in xrange(0, count, self._batch_args):
+            batch = args[start:start + self._batch_args]
+            self.send(self._key, '*%d\r\n' % (len(batch) + 2) + self._prefix + ''.join(batch))
+        self._args = args[count:]
+
+    def _end_elements(self, key):
+        self._write_batches(len(self._args))
+        self.post_expiry(key)
+
     # String handling
 
     def set(self, key, value, expiry, info):
         self.pre_expiry(key, expiry)
-        self.emit('SET', key, value)
+        self.send(key, self.command('SET', key, value))
         self.post_expiry(key)
 
     # Hash handling
 
     def start_hash(self, key, length, expiry, info):
-        self.pre_expiry(key, expiry)
+        self._start_elements('HSET', key, expiry, 2)
 
     def hset(self, key, field, value):
-        self.emit('HSET', key, field, value)
+        self._add_args((bulk_string(field), bulk_string(value)))
+
+    def hset_many(self, key, pairs):
+        self._add_args([bulk_string(x) for pair in pairs for x in pair])
 
     def end_hash(self, key):
-        self.post_expiry(key)
+        self._end_elements(key)
 
     # Set handling
 
     def start_set(self, key, cardinality, expiry, info):
-        self.pre_expiry(key, expiry)
+        self._start_elements('SADD', key, expiry, 1)
 
     def sadd(self, key, member):
-        self.emit('SADD', key, member)
+        self._add_args((bulk_string(member), ))
+
+    def sadd_many(self, key, members):
+        self._add_args([bulk_string(member) for member in members])
 
     def end_set(self, key):
-        self.post_expiry(key)
+        self._end_elements(key)
 
     # List handling
 
     def start_list(self, key, length, expiry, info):
-        self.pre_expiry(key, expiry)
+        self._start_elements('RPUSH', key, expiry, 1)
 
     def rpush(self, key, value):
-        self.emit('RPUSH', key, value)
+        self._add_args((bulk_string(value), ))
+
+    def rpush_many(self, key, values):
+        self._add_args([bulk_string(value) for value in values])
 
     def end_list(self, key):
-        self.post_expiry(key)
+        self._end_elements(key)
 
     # Sorted set handling
 
     def start_sorted_set(self, key, length, expiry, info):
-        self.pre_expiry(key, expiry)
+        self._start_elements('ZADD', key, expiry, 2)
 
     def zadd(self, key, score, member):
-        self.emit('ZADD', key, score, member)
+        self._add_args((bulk_string(score), bulk_string(member)))
+
+    def zadd_many(self, key, pairs):
+        self._add_args([bulk_string(x) for pair in pairs for x in pair])
 
     def end_sorted_set(self, key):
-        self.post_expiry(key)
+        self._end_elements(key)
 
     # Other misc commands
 
+    def restore(self, key, payload, expiry):
+        self.send(key, self.command('RESTORE', key, expiry or 0, payload, 'REPLACE', 'ABSTTL'))
+
     def select(self, db_number):
         self.emit('SELECT', db_number)
 
     def expireat(self, key, timestamp):
-        self.emit('EXPIREAT', key, timestamp)
+        self.send(key, self.command('EXPIREAT', key, timestamp))
+
+class RestoreCallback(ProtocolCallback):
+    '''
+    Writes the dump as RESTORE commands, in the redis protocol, to be replayed with redis-cli --pipe.
+
+    Values are copied from the dump as they are, ziplists and compressed strings included, and
+    sent as DUMP payloads, so every key takes a single command however many elements it holds.
+    Keys that exist are replaced, and expiries are sent as they are in the dump with ABSTTL,
+    which needs redis 5.0 or later. The server must support the RDB version of the dump.
+    '''
+    wants_dump_payloads = True
+
+INVENTORY_COLUMNS = ("database", "type", "key", "encoding", "expiry", "size_in_dump", "num_elements")
+INVENTORY_FORMATS = ('csv', 'ndjson')
+
+def write_key_inventory(key_infos, out, output_format='csv'):
+    '''
+    Writes the `KeyInfo` tuples yielded by `RdbParser.iter_key_info` to `out`, as CSV with 
+    a header line, or as newline delimited JSON with an object per key. Keys are JSON 
+    encoded in both, and expiries are in ISO 8601 format, whether the parser gave them 
+    as datetimes or as milliseconds with `raw_expiry`.
+    '''
+    if output_format == 'csv':
+        out.write("%s\n" % ",".join(INVENTORY_COLUMNS))
+        line = "%d,%s,%s,%s,%s,%d,%d\n"
+        no_expiry = ''
+    elif output_format == 'ndjson':
+        line = '{"database":%d,"type":"%s","key":%s,"encoding":"%s","expiry":%s,"size_in_dump":%d,"num_elements":%d}\n'
+        no_expiry = 'null'
+    else:
+        raise Exception('write_key_inventory', 'Invalid format %s, expected one of %s' % (output_format, ", ".join(INVENTORY_FORMATS)))
+    write = out.write
+    for info in key_infos:
+        expiry = info.expiry
+        if expiry is None:
+            expiry = no_expiry
+        elif output_format == 'csv':
+            expiry = _expiry_isoformat(expiry)
+        else:
+            expiry = '"%s"' % _expiry_isoformat(expiry)
+        write(line % (info.db_number, info.type, encode_key(info.key), info.encoding, expiry, info.size, info.length))
@@ -1,33 +1,168 @@
 #!/usr/bin/env python
 import os
 import sys
+import time
+from functools import partial
 from optparse import OptionParser
-from rdbtools import RdbParser, JSONCallback, DiffCallback, MemoryCallback, ProtocolCallback, PrintAllKeys
+from rdbtools import RdbParser, RdbCallback, JSONCallback, DiffCallback, NDJSONCallback, MemoryCallback, ProtocolCallback, RestoreCallback, PrintAllKeys
+from rdbtools.callbacks import write_key_inventory, INVENTORY_FORMATS
+from rdbtools.parallel import ParallelRdbParser
+from rdbtools.index import build_index, index_path
+from rdbtools.replication import open_snapshot
+from rdbtools.crc64 import read_checksums, verify_checksum
+from rdbtools.shards import open_shards, parse_size
+from rdbtools.loader import Loader, LoadCallback, LoadRestoreCallback, MAX_IN_FLIGHT
 
 VALID_TYPES = ("hash", "set", "string", "list", "sortedset")
 def main():
     usage = """usage: %prog [options] /path/to/dump.rdb
+       %prog index [options] /path/to/dump.rdb
+       %prog get [options] /path/to/dump.rdb key
+       %prog verify /path/to/dump.rdb
+       %prog [options] --from-server host:port
 
-Example : %prog --command json -k "user.*" /var/redis/6379/dump.rdb"""
+Use - as the dump file to read it from standard input.
+
+Example : %prog --command json -k "user.*" /var/redis/6379/dump.rdb
+          %prog --command json -k "user:" -k "session:" -x ".*:tmp$" /var/redis/6379/dump.rdb
+          ssh redis-host cat /var/redis/6379/dump.rdb | %prog --command json -
+          %prog --command json --keys-from user-keys.txt /var/redis/6379/dump.rdb
+          %prog --command protocol --as-of now --ttl-min 60 /var/redis/6379/dump.rdb
+          %prog --command restore /var/redis/6379/dump.rdb | redis-cli --pipe
+          %prog --command keys --format ndjson /var/redis/6379/dump.rdb
+          %prog --command ndjson --shard-size 256M -f /exports/dump.json /var/redis/6379/dump.rdb
+          %prog index /var/redis/6379/dump.rdb
+          %prog get -n 2 /var/redis/6379/dump.rdb user:1000
+          %prog verify /backups/dump.rdb.gz
+          %prog --command json --verify-checksum /var/redis/6379/dump.rdb
+          %prog --command json --from-server redis-host:6379
+          %prog --command load --target redis-cluster-node:7000 --cluster --rate 50000 /var/redis/6379/dump.rdb"""
 
     parser = OptionParser(usage=usage)
     parser.add_option("-c", "--command", dest="command",
-                  help="Command to execute. Valid commands are json, diff, and protocol", metavar="FILE")
+                  help="Command to execute. Valid commands are json, ndjson, diff, protocol, restore, load, memory, keys, index and verify", metavar="FILE")
     parser.add_option("-f", "--file", dest="output",
                   help="Output file", metavar="FILE")
+    parser.add_option("--shard-size", dest="shard_size", default=None,
+                  help="Split the output of the ndjson command into files of about this size, named after --file. Takes a number of bytes, or K, M or G", metavar="SIZE")
+    parser.add_option("--shards", dest="shards", default=None, type="int",
+                  help="Split the output of the ndjson command into this many files named after --file, each key going to the file picked by a hash of it")
+    parser.add_option("--batch-size", dest="batch_size", default=None, type="int",
+                  help="Elements of a hash, set, list or sorted set sent in each command by the protocol command. Defaults to 100")
+    parser.add_option("--format", dest="output_format", default="csv",
+                  help="Output format of the keys command, csv or ndjson. Defaults to csv")
     parser.add_option("-n", "--db", dest="dbs", action="append",
                   help="Database Number. Multiple databases can be provided. If not specified, all databases will be included.")
-    parser.add_option("-k", "--key", dest="keys", default=None,
-                  help="Keys to export. This can be a regular expression")
+    parser.add_option("-k", "--key", dest="keys", action="append",
+                  help="Keys to export. This can be a regular expression. Multiple regexes can be provided, keys matching any of them are exported")
+    parser.add_option("-x", "--exclude-key", dest="exclude_keys", action="append",
+                  help="Keys to leave out, even if they match --key. This can be a regular expression. Multiple regexes can be provided")
+    parser.add_option("--keys-from", dest="keys_from", default=None,
+                  help="Only export the keys listed in this file, one per line. A key set file is built next to it to look keys up quickly", metavar="FILE")
+    parser.add_option("--exclude-keys-from", dest="exclude_keys_from", default=None,
+                  help="Leave out the keys listed in this file, one per line", metavar="FILE")
     parser.add_option("-t", "--type", dest="types", action="append",
                   help="""Data types to include. Possible values are string, hash, set, sortedset, list. Multiple typees can be provided. 
                     If not specified, all data types will be returned""")
+    parser.add_option("--as-of", dest="as_of", default=None,
+                  help="Time at which to evaluate key expiries, a unix timestamp in seconds or now. Keys that have expired by then are left out", metavar="TIMESTAMP|now")
+    parser.add_option("--ttl-min", dest="ttl_min", default=None, type="float",
+                  help="Only include keys that live at least this many seconds after --as-of", metavar="SECONDS")
+    parser.add_option("--ttl-max", dest="ttl_max", default=None, type="float",
+                  help="Only include keys that expire at most this many seconds after --as-of. Keys without an expiry are left out", metavar="SECONDS")
+    parser.add_option("-j", "--jobs", dest="jobs", default=1, type="int",
+                  help="Number of processes to parse the file with. Defaults to 1")
+    parser.add_option("-g", "--get", dest="get_key", default=None,
+                  help="Decode only this key, found through the index of the dump file. Uses the first database given with --db, or 0")
+    parser.add_option("-i", "--index", dest="index", default=None,
+                  help="Index file written by the index command. Defaults to the dump file name followed by .idx", metavar="FILE")
+    parser.add_option("--from-server", dest="server", default=None,
+                  help="Read a snapshot from a running redis server, connecting to it like a replica", metavar="HOST:PORT")
+    parser.add_option("-a", "--password", dest="password", default=None,
+                  help="Password to use when connecting to the server given with --from-server")
+    parser.add_option("--target", dest="target", default=None,
+                  help="Redis server the load command sends keys to. With --cluster, any node of the cluster", metavar="HOST:PORT")
+    parser.add_option("--target-password", dest="target_password", default=None,
+                  help="Password of the server given with --target")
+    parser.add_option("--cluster", dest="cluster", action="store_true", default=False,
+                  help="Load into the redis cluster that --target is a node of, sending each key to the master of its hash slot")
+    parser.add_option("--connections", dest="connections", default=1, type="int",
+                  help="Connections the load command opens to each server. Defaults to 1")
+    parser.add_option("--max-in-flight", dest="max_in_flight", default=MAX_IN_FLIGHT, type="int",
+                  help="Commands the load command sends on a connection before waiting for their replies. Defaults to %d" % MAX_IN_FLIGHT)
+    parser.add_option("--restore", dest="restore", action="store_true", default=False,
+                  help="Make the load command send each key in a RESTORE command, as the restore command writes them")
+    parser.add_option("--rate", dest="rate", default=None, type="float",
+                  help="Most commands the load command sends a second, over all servers", metavar="COMMANDS")
+    parser.add_option("--verify-checksum", dest="verify_checksum", action="store_true", default=False,
+                  help="Verify the CRC64 checksum at the end of the dump while parsing it, and fail if it does not match")
     
     (options, args) = parser.parse_args()
     
-    if len(args) == 0:
+    # rdb index dump.rdb and rdb get dump.rdb key are shorthands for -c index and --get
+    if len(args) > 1 and args[0] in ('index', 'verify'):
+        options.command = args.pop(0)
+    elif len(args) > 2 and args[0] == 'get':
+        args.pop(0)
+        options.get_key = args.pop()
+        options.command = options.command or 'json'
+    
+    if options.server:
+        if len(args) > 0:
+            parser.error("Either a Redis RDB file or --from-server can be given, not both")
+        dump_file = None
+    elif len(args) == 0:
         parser.error("Redis RDB file not specified")
-    dump_file = args[0]
+    else:
+        dump_file = args[0]
+    
+    if options.command == 'keys' and not options.output_format in INVENTORY_FORMATS:
+        parser.error("Invalid format %s. Expected one of %s" % (options.output_format, ", ".join(INVENTORY_FORMATS)))
+    if options.command == 'keys' and (options.jobs > 1 or options.get_key is not None):
+        parser.error("The keys command reads keys only, and does not use --jobs or --get")
+    
+    if (dump_file == '-' or dump_file is None) and (options.command == 'index' or options.get_key is not None or options.jobs > 1):
+        parser.error("index, get and --jobs need a dump file that can be seeked, not a stream")
+    
+    if options.verify_checksum and (options.command in ('keys', 'index') or options.get_key is not None or options.jobs > 1):
+        parser.error("--verify-checksum reads the whole dump in order, and does not work with keys, index, get or --jobs")
+    
+    if options.shard_size is not None or options.shards is not None:
+        if options.command != 'ndjson' or not options.output:
+            parser.error("--shard-size and --shards split the output of the ndjson command, and need --file")
+        if options.shard_size is not None and options.shards is not None:
+            parser.error("Either --shard-size or --shards can be given, not both")
+        if options.jobs > 1 or options.get_key is not None:
+            parser.error("--shard-size and --shards do not work with --jobs or --get")
+        if options.shard_size is not None:
+            try:
+                options.shard_size = parse_size(options.shard_size)
+            except ValueError:
+                parser.error("Invalid --shard-size %s" % options.shard_size)
+        if (options.shard_size or options.shards) <= 0:
+            parser.error("--shard-size and --shards must be more than 0")
+    
+    if options.batch_size is not None and (not options.command in ('protocol', 'load') or options.batch_size <= 0):
+        parser.error("--batch-size is a number of elements per command, for the protocol and load commands")
+    
+    if options.command == 'load':
+        if not options.target:
+            parser.error("The load command needs the server to load into, given with --target")
+        if options.jobs > 1 or options.get_key is not None or options.output:
+            parser.error("The load command sends keys to --target, and does not use --jobs, --get or --file")
+        if options.restore and options.batch_size is not None:
+            parser.error("--restore sends each key in a single command, and does not use --batch-size")
+        if options.connections <= 0 or options.max_in_flight <= 0 or (options.rate is not None and options.rate <= 0):
+            parser.error("--connections, --max-in-flight and --rate must be more than 0")
+        target = parse_address(parser, options.target)
+    
+    if options.restore and options.command != 'load':
+        parser.error("--restore is an option of the load command. Use the restore command to write RESTORE commands")
+    
+    if options.command == 'index':
+        count = build_index(dump_file, options.index)
+        sys.stderr.write("Indexed %d keys in %s\n" % (count, options.index or index_path(dump_file)))
+        return
     
     filters = {}
     if options.dbs:
@@ -41,6 +176,15 @@ Example : %prog --command json -k "user.*" /var/redis/6379/dump.rdb"""
     if options.keys:
         filters['keys'] = options.keys
     
+    if options.exclude_keys:
+        filters['exclude_keys'] = options.exclude_keys
+    
+    if options.keys_from:
+        filters['key_set'] = options.keys_from
+    
+    if options.exclude_keys_from:
+        filters['exclude_key_set'] = options.exclude_keys_from
+    
     if options.types:
         filters['types'] = []
         for x in options.types:
@@ -49,38 +193,156 @@ Example : %prog --command json -k "user.*" /var/redis/6379/dump.rdb"""
             else:
                 filters['types'].append(x)
     
-    # TODO : Fix this ugly if-else code
-    if options.output:
-        with open(options.output, "wb") as f:
-            if 'diff' == options.command:
-                callback = DiffCallback(f)
-            elif 'json' == options.command:
-                callback = JSONCallback(f)
-            elif 'memory' == options.command:
-                reporter = PrintAllKeys(f)
-                callback = MemoryCallback(reporter, 64)
-            elif 'protocol' == options.command:
-                callback = ProtocolCallback(f)
-            else:
-                raise Exception('Invalid Command %s' % options.command)
-            parser = RdbParser(callback)
-            parser.parse(dump_file)
-    else:
-        if 'diff' == options.command:
-            callback = DiffCallback(sys.stdout)
-        elif 'json' == options.command:
-            callback = JSONCallback(sys.stdout)
-        elif 'memory' == options.command:
-            reporter = PrintAllKeys(sys.stdout)
-            callback = MemoryCallback(reporter, 64)
-        elif 'protocol' == options.command:
-            callback = ProtocolCallback(sys.stdout)
+    if options.as_of is not None or options.ttl_min is not None or options.ttl_max is not None:
+        # now is taken once, so that every process of --jobs uses the same time
+        if options.as_of is None or options.as_of == 'now':
+            filters['as_of'] = time.time()
+        else:
+            try:
+                filters['as_of'] = float(options.as_of)
+            except ValueError:
+                parser.error("Invalid --as-of %s. Expected a unix timestamp in seconds or now" % options.as_of)
+        filters['ttl_min'] = options.ttl_min
+        filters['ttl_max'] = options.ttl_max
+    
+    if options.get_key is not None:
+        db_number = filters['dbs'][0] if options.dbs else 0
+        if options.output:
+            with open(options.output, "wb") as f:
+                found = get(options.command, dump_file, f, db_number, options.get_key, options.index, options.batch_size)
+        else:
+            found = get(options.command, dump_file, sys.stdout, db_number, options.get_key, options.index, options.batch_size)
+        if not found:
+            sys.stderr.write("Key %s not found in database %d\n" % (options.get_key, db_number))
+            sys.exit(1)
+        return
+    
+    if options.server:
+        host, port = parse_address(parser, options.server)
+        dump_file = open_snapshot(host, port, options.password)
+    elif dump_file == '-':
+        dump_file = getattr(sys.stdin, 'buffer', sys.stdin)
+    
+    try:
+        if options.command == 'verify':
+            verify(dump_file)
+        elif options.command == 'load':
+            load(dump_file, filters, target, options.target_password, options.cluster, options.connections, 
+                 options.max_in_flight, options.rate, options.batch_size, options.verify_checksum, options.restore)
+        elif options.shard_size or options.shards:
+            with open_shards(options.output, options.shard_size, options.shards) as shards:
+                run(options.command, dump_file, shards, filters, options.jobs, options.output_format, options.verify_checksum,
+                    options.batch_size)
+            sys.stderr.write("Wrote %d shards of %s\n" % (len(shards.paths), options.output))
+        elif options.output:
+            with open(options.output, "wb") as f:
+                run(options.command, dump_file, f, filters, options.jobs, options.output_format, options.verify_checksum,
+                    options.batch_size)
         else:
-            raise Exception('Invalid Command %s' % options.command)
+            run(options.command, dump_file, sys.stdout, filters, options.jobs, options.output_format, options.verify_checksum,
+                    options.batch_size)
+    finally:
+        if options.server:
+            dump_file.close()
+
+def parse_address(parser, address):
+    host, _, port = address.rpartition(':')
+    if not port.isdigit():
+        parser.error("Invalid server %s, expected host:port" % address)
+    return host or 'localhost', int(port)
 
-        parser = RdbParser(callback, filters=filters)
+def memory_callback(out):
+    return MemoryCallback(PrintAllKeys(out), 64)
+
+# For every command, the callback factory, parser options, and the separator 
+# between keys that parallel parsing has to add when joining the output of workers
+COMMANDS = {
+    'diff' : (DiffCallback, {}, ''),
+    'json' : (JSONCallback, {}, ','),
+    'ndjson' : (NDJSONCallback, {}, ''),
+    # The memory report only needs lengths, so values are never decompressed
+    'memory' : (memory_callback, {'lazy_values' : True}, ''),
+    'protocol' : (ProtocolCallback, {}, ''),
+    # Values are sliced out of the mapped dump file, instead of read and kept a piece at a time
+    'restore' : (RestoreCallback, {'use_mmap' : True}, ''),
+}
+
+def command_callback(command, batch_size=None):
+    '''The callback factory, parser options and separator of `command`, as in COMMANDS'''
+    if not command in COMMANDS:
+        raise Exception('Invalid Command %s' % command)
+    make_callback, parser_options, separator = COMMANDS[command]
+    if batch_size:
+        # a partial can still be sent to the processes of --jobs
+        make_callback = partial(make_callback, batch_size=batch_size)
+    return make_callback, parser_options, separator
+
+def run(command, dump_file, out, filters, jobs=1, output_format='csv', verify_checksum=False, batch_size=None):
+    if command == 'keys':
+        keys(dump_file, out, filters, output_format)
+        return
+    make_callback, parser_options, separator = command_callback(command, batch_size)
+    callback = make_callback(out)
+    if verify_checksum:
+        parser_options = dict(parser_options, verify_checksum=True)
+    if jobs > 1:
+        parser = ParallelRdbParser(callback, make_callback, out, filters=filters, jobs=jobs, 
+                                   separator=separator, **parser_options)
+    else:
+        parser = RdbParser(callback, filters=filters, **parser_options)
+    if hasattr(dump_file, 'read'):
+        parser.parse_stream(dump_file)
+    else:
         parser.parse(dump_file)
+
+def load(dump_file, filters, target, password=None, cluster=False, connections=1, max_in_flight=MAX_IN_FLIGHT,
+         rate=None, batch_size=None, verify_checksum=False, restore=False):
+    host, port = target
+    with Loader(host, port, password, cluster, connections, max_in_flight, rate) as loader:
+        if restore:
+            callback = LoadRestoreCallback(loader)
+        elif batch_size:
+            callback = LoadCallback(loader, batch_size)
+        else:
+            callback = LoadCallback(loader)
+        parser = RdbParser(callback, filters=filters, verify_checksum=verify_checksum)
+        if hasattr(dump_file, 'read'):
+            parser.parse_stream(dump_file)
+        else:
+            parser.parse(dump_file)
+    for line in loader.report():
+        sys.stderr.write("%s\n" % line)
+    if loader.errors:
+        sys.exit(1)
+
+def keys(dump_file, out, filters, output_format='csv'):
+    parser = RdbParser(RdbCallback(), filters=filters)
+    if hasattr(dump_file, 'read'):
+        key_infos = parser.iter_key_info_stream(dump_file)
+    else:
+        key_infos = parser.iter_key_info(dump_file)
+    write_key_inventory(key_infos, out, output_format)
+
+def verify(dump_file):
+    if hasattr(dump_file, 'read'):
+        version, stored, computed = read_checksums(dump_file)
+    else:
+        with open(dump_file, 'rb') as f:
+            version, stored, computed = read_checksums(f)
+    if stored is None:
+        sys.stderr.write("RDB version %d dump has no checksum, its CRC64 is %016x\n" % (version, computed))
+        return
+    try:
+        verify_checksum(stored, computed)
+    except Exception as e:
+        sys.stderr.write("%s\n" % e.args[-1])
+        sys.exit(1)
+    sys.stderr.write("RDB version %d dump checksum %016x is correct\n" % (version, computed))
+
+def get(command, dump_file, out, db_number, key, index_file=None, batch_size=None):
+    make_callback, parser_options, separator = command_callback(command, batch_size)
+    parser = RdbParser(make_callback(out), **parser_options)
+    return parser.get(dump_file, db_number, key, index_file)
     
 if __name__ == '__main__':
     main()
-
@@ -1,13 +1,7 @@
 #!/usr/bin/env python
-import struct
 import os
 import sys
 
-try :
-    from StringIO import StringIO
-except ImportError:
-    from io import StringIO
-    
 from optparse import OptionParser
 from rdbtools import RdbParser, JSONCallback, MemoryCallback
 from rdbtools.callbacks import encode_key
@@ -44,17 +38,14 @@ def print_memory_for_key(key, host='localhost', port=6379, db=0, password=None):
     redis = connect_to_redis(host, port, db, password)
     reporter = PrintMemoryUsage()
     callback = MemoryCallback(reporter, 64)
-    parser = RdbParser(callback, filters={})
-    parser._key = key
+    parser = RdbParser(callback, filters={}, lazy_values=True)
 
     raw_dump = redis.execute_command('dump', key)
     if not raw_dump:
         sys.stderr.write('Key %s does not exist\n' % key)
         sys.exit(-1)
     
-    stream = StringIO(raw_dump)
-    data_type = read_unsigned_char(stream)
-    parser.read_object(stream, data_type)
+    parser.parse_dump_payload(key, raw_dump)
 
 def connect_to_redis(host, port, db, password):
     try:
@@ -80,9 +71,6 @@ def check_redis_version(redis):
     else:
         return False
 
-def read_unsigned_char(f) :
-    return struct.unpack('B', f.read(1))[0]
-
 class PrintMemoryUsage():
     def next_record(self, record) :
         print("%s\t\t\t\t%s" % ("Key", encode_key(record.key)))
@@ -4,12 +4,21 @@ import sys
 from string import Template
 from optparse import OptionParser
 from rdbtools import RdbParser, MemoryCallback, PrintAllKeys, StatsAggregator
+from rdbtools.parallel import ParallelRdbParser
+
+def memory_callback(out):
+    return MemoryCallback(StatsAggregator(), 64)
+
+def stats_of(callback):
+    return callback._stream
 
 def main(): 
     usage = """usage: %prog [options] /path/to/dump.rdb
 
 Example 1 : %prog -k "user.*" -k "friends.*" -f memoryreport.html /var/redis/6379/dump.rdb
-Example 2 : %prog /var/redis/6379/dump.rdb"""
+Example 2 : %prog /var/redis/6379/dump.rdb
+Example 3 : %prog --include-key "user:" -x "user:.*:sessions$" /var/redis/6379/dump.rdb
+Example 4 : ssh redis-host cat /var/redis/6379/dump.rdb | %prog -"""
 
     parser = OptionParser(usage=usage)
 
@@ -17,6 +26,12 @@ Example 2 : %prog /var/redis/6379/dump.rdb"""
                   help="Output file", metavar="FILE")
     parser.add_option("-k", "--key", dest="keys", action="append",
                   help="Keys that should be grouped together. Multiple regexes can be provided")
+    parser.add_option("--include-key", dest="include_keys", action="append",
+                  help="Only profile keys matching this regex. Multiple regexes can be provided, keys matching any of them are profiled")
+    parser.add_option("-x", "--exclude-key", dest="exclude_keys", action="append",
+                  help="Leave out keys matching this regex from the report. Multiple regexes can be provided")
+    parser.add_option("-j", "--jobs", dest="jobs", default=1, type="int",
+                  help="Number of processes to parse the file with. Defaults to 1")
     
     (options, args) = parser.parse_args()
     
@@ -29,10 +44,25 @@ Example 2 : %prog /var/redis/6379/dump.rdb"""
     else:
         output = options.output
 
+    filters = {}
+    if options.include_keys:
+        filters['keys'] = options.include_keys
+    if options.exclude_keys:
+        filters['exclude_keys'] = options.exclude_keys
+
     stats = StatsAggregator()
     callback = MemoryCallback(stats, 64)
-    parser = RdbParser(callback)
-    parser.parse(dump_file)
+    if dump_file == '-' and options.jobs > 1:
+        parser.error("--jobs needs a dump file that can be seeked, not standard input")
+    if options.jobs > 1:
+        parser = ParallelRdbParser(callback, memory_callback, filters=filters, jobs=options.jobs, collect=stats_of, 
+                                   merge=stats.merge, lazy_values=True)
+    else:
+        parser = RdbParser(callback, filters=filters, lazy_values=True)
+    if dump_file == '-':
+        parser.parse_stream(getattr(sys.stdin, 'buffer', sys.stdin))
+    else:
+        parser.parse(dump_file)
     stats_as_json = stats.get_json()
     
     t = open(os.path.join(os.path.dirname(__file__),"report.html.template")).read()
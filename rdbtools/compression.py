@@ -0,0 +1,150 @@
+import bz2
+import zlib
+import tarfile
+
+try :
+    import lzma
+except ImportError:
+    try :
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+try :
+    import zstandard
+except ImportError:
+    zstandard = None
+
+RDB_MAGIC = 'REDIS'
+GZIP_MAGIC = '\x1f\x8b'
+BZIP2_MAGIC = 'BZh'
+XZ_MAGIC = '\xfd7zXZ\x00'
+ZSTD_MAGIC = '\x28\xb5\x2f\xfd'
+TAR_MAGIC = 'ustar'
+TAR_MAGIC_OFFSET = 257
+
+# Enough of the start of a file to tell all of the formats above apart
+HEADER_SIZE = 512
+# Compressed bytes read at a time
+READ_SIZE = 1024 * 1024
+
+def open_dump_stream(f):
+    '''
+    Returns a file object that reads the redis dump in `f`, which may be
+    compressed with gzip, bzip2, xz or zstd, archived with tar, or both.
+
+    The format is recognised from the first bytes of `f`, and decompression is
+    done as the dump is read, so `f` can be a pipe and is read only once.
+    The dump in an archive is the first regular file that holds one.
+    xz needs the lzma module, and zstd the zstandard package.
+    '''
+    header = read_fully(f, HEADER_SIZE)
+    stream = PrefixedStream(header, f)
+    if header.startswith(RDB_MAGIC):
+        return stream
+    if header.startswith(GZIP_MAGIC):
+        # 16 + MAX_WBITS expects a gzip header and trailer around the deflate stream
+        return open_dump_stream(DecompressingStream(stream, lambda: zlib.decompressobj(16 + zlib.MAX_WBITS)))
+    if header.startswith(BZIP2_MAGIC):
+        return open_dump_stream(DecompressingStream(stream, bz2.BZ2Decompressor))
+    if header.startswith(XZ_MAGIC):
+        if lzma is None:
+            raise Exception('open_dump_stream', 'Reading xz compressed dumps needs the lzma module')
+        return open_dump_stream(DecompressingStream(stream, lzma.LZMADecompressor))
+    if header.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise Exception('open_dump_stream', 'Reading zstd compressed dumps needs the zstandard package')
+        return open_dump_stream(DecompressingStream(stream, lambda: zstandard.ZstdDecompressor().decompressobj()))
+    if header[TAR_MAGIC_OFFSET:TAR_MAGIC_OFFSET + len(TAR_MAGIC)] == TAR_MAGIC:
+        return open_archived_dump(stream)
+    raise Exception('open_dump_stream', 'Not a redis dump file, or a compressed or archived one')
+
+def open_archived_dump(stream):
+    # 'r|' reads the archive front to back, without seeking
+    archive = tarfile.open(fileobj=stream, mode='r|')
+    for member in archive:
+        if not member.isfile():
+            continue
+        try:
+            return open_dump_stream(archive.extractfile(member))
+        except Exception as e:
+            if e.args[:1] != ('open_dump_stream',):
+                raise
+    raise Exception('open_dump_stream', 'No redis dump file in the archive')
+
+def read_fully(f, size):
+    '''Reads `size` bytes from `f`, or fewer only at the end of the file'''
+    chunks = []
+    while size > 0:
+        data = f.read(size)
+        if not data:
+            break
+        chunks.append(data)
+        size -= len(data)
+    return ''.join(chunks)
+
+class PrefixedStream(object):
+    '''Reads `prefix`, then the rest of `f`. Puts back the bytes read to recognise a format'''
+    def __init__(self, prefix, f):
+        self._prefix = prefix
+        self._f = f
+
+    def read(self, size=-1):
+        if not self._prefix:
+            return self._f.read(size)
+        if size < 0:
+            data = self._prefix + self._f.read()
+            self._prefix = ''
+            return data
+        data = self._prefix[:size]
+        self._prefix = self._prefix[size:]
+        return data
+
+class DecompressingStream(object):
+    '''
+    Decompresses `f` as it is read, `READ_SIZE` compressed bytes at a time
+
+    `make_decompressor` returns a new decompressor object. Files made of several
+    compressed streams one after the other, like those of pigz or pbzip2, are read whole.
+    '''
+    def __init__(self, f, make_decompressor):
+        self._f = f
+        self._make_decompressor = make_decompressor
+        self._decompressor = make_decompressor()
+        self._buffer = ''
+        self._offset = 0
+        self._eof = False
+
+    def read(self, size=-1):
+        while not self._eof and (size < 0 or len(self._buffer) - self._offset < size):
+            self._fill()
+        if size < 0:
+            size = len(self._buffer) - self._offset
+        data = self._buffer[self._offset:self._offset + size]
+        self._offset += len(data)
+        return data
+
+    def _fill(self):
+        compressed = self._f.read(READ_SIZE)
+        if not compressed:
+            self._eof = True
+            return
+        data = self._decompress(compressed)
+        if data:
+            self._buffer = self._buffer[self._offset:] + data
+            self._offset = 0
+
+    def _decompress(self, compressed):
+        chunks = []
+        while compressed:
+            try:
+                chunks.append(self._decompressor.decompress(compressed))
+            except EOFError:
+                # bz2 refuses more input once its stream has ended
+                self._decompressor = self._make_decompressor()
+                continue
+            # Whatever follows the end of a compressed stream starts the next one
+            compressed = getattr(self._decompressor, 'unused_data', '')
+            if compressed:
+                self._decompressor = self._make_decompressor()
+        return ''.join(chunks)
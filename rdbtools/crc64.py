@@ -0,0 +1,120 @@
+import struct
+
+from rdbtools.compression import open_dump_stream
+
+try :
+    import crcmod
+except ImportError:
+    crcmod = None
+
+# The Jones polynomial 0xad93d23594c935a9 used by redis, bit reversed as the CRC is computed
+# least significant bit first. The CRC starts at 0 and is not inverted at the end.
+POLY = 0x95ac9329ac4bc9b5
+
+# Bytes read at a time by `read_checksums`
+READ_SIZE = 8 * 1024 * 1024
+# Bytes unpacked into 64 bit words at a time by `python_crc64`
+WORDS_SIZE = 64 * 1024
+
+# Version of the dump format that added the checksum after the EOF opcode
+CHECKSUM_VERSION = 5
+CHECKSUM_SIZE = 8
+
+def _build_tables():
+    '''
+    Returns the tables of the slicing by 8 algorithm. The first is the usual table of the CRC
+    of each byte, and table k holds the CRC of each byte followed by k zero bytes, so that
+    8 bytes are folded into the CRC at a time, with a lookup for each of them.
+    '''
+    table = []
+    for byte in range(0, 256):
+        crc = byte
+        for x in range(0, 8):
+            crc = (crc >> 1) ^ POLY if crc & 1 else crc >> 1
+        table.append(crc)
+    tables = [table]
+    for k in range(1, 8):
+        previous = tables[-1]
+        tables.append([(x >> 8) ^ table[x & 0xff] for x in previous])
+    return [tuple(x) for x in tables]
+
+TABLES = _build_tables()
+
+def python_crc64(data, crc=0):
+    '''
+    Returns the CRC64 of the string `data` as redis computes it, continuing from `crc`,
+    the CRC64 of the bytes before `data`.
+    '''
+    t0, t1, t2, t3, t4, t5, t6, t7 = TABLES
+    length = len(data)
+    words_end = length - length % 8
+    for start in xrange(0, words_end, WORDS_SIZE):
+        count = min(WORDS_SIZE, words_end - start) // 8
+        for word in struct.unpack_from('<%dQ' % count, data, start):
+            crc ^= word
+            crc = t7[crc & 0xff] ^ t6[(crc >> 8) & 0xff] ^ t5[(crc >> 16) & 0xff] ^ t4[(crc >> 24) & 0xff] ^ \
+                  t3[(crc >> 32) & 0xff] ^ t2[(crc >> 40) & 0xff] ^ t1[(crc >> 48) & 0xff] ^ t0[crc >> 56]
+    for byte in bytearray(data[words_end:length]):
+        crc = t0[(crc ^ byte) & 0xff] ^ (crc >> 8)
+    return crc
+
+if crcmod is not None:
+    # The C extension of crcmod is about 50 times faster than python_crc64
+    crc64 = crcmod.mkCrcFun((1 << 64) | 0xad93d23594c935a9, initCrc=0, rev=True, xorOut=0)
+else:
+    crc64 = python_crc64
+
+class ChecksumReader(object):
+    '''
+    Computes the CRC64 of a dump file as it is read from the file object `f`
+
+    Every chunk read is folded into `crc` once, except for the last 8 bytes read so far,
+    which are held back in `trailer`: once `f` is read to the end, `crc` is the checksum
+    of the dump and `trailer` the checksum stored after it.
+    '''
+    def __init__(self, f):
+        self._f = f
+        self.crc = 0
+        self.trailer = ''
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        if data:
+            self.size += len(data)
+            pending = self.trailer + data
+            self.crc = crc64(pending[:-CHECKSUM_SIZE], self.crc)
+            self.trailer = pending[-CHECKSUM_SIZE:]
+        return data
+
+    def read_to_end(self, read_size=READ_SIZE):
+        while self.read(read_size):
+            pass
+
+    def stored_checksum(self):
+        '''The checksum stored at the end of the dump, or None if the dump was saved without one'''
+        if self.size < 9 + 1 + CHECKSUM_SIZE:
+            raise Exception('verify_checksum', 'Dump file is truncated, it ends after %d bytes' % self.size)
+        return struct.unpack('<Q', self.trailer)[0] or None
+
+def read_checksums(f, read_size=READ_SIZE):
+    '''
+    Reads the dump in the file object `f` from start to end, `read_size` bytes at a time,
+    and returns (version, stored, computed) : the version of the dump format, the checksum
+    at its end, and the CRC64 of everything before that. Compressed and archived dumps are
+    decompressed as they are read, as by `open_dump_stream`.
+
+    Dumps before version 5 have no checksum, and dumps saved with rdbchecksum off store
+    0 instead, in which case `stored` is None.
+    '''
+    reader = ChecksumReader(open_dump_stream(f))
+    version = int(reader.read(9)[5:9])
+    reader.read_to_end(read_size)
+    if version < CHECKSUM_VERSION:
+        return version, None, crc64(reader.trailer, reader.crc)
+    return version, reader.stored_checksum(), reader.crc
+
+def verify_checksum(stored, computed):
+    '''Raises an exception if the checksum `stored` in a dump is not the CRC64 `computed` over it'''
+    if stored is not None and stored != computed:
+        raise Exception('verify_checksum', 'Checksum mismatch, the dump stores %016x but its CRC64 is %016x' % (stored, computed))
@@ -0,0 +1,213 @@
+import re
+import sre_parse
+from sre_constants import LITERAL, ANY, AT, AT_END, MAX_REPEAT, MIN_REPEAT, MAXREPEAT, SRE_FLAG_UNICODE
+
+# Up to this many prefixes are tried one after the other by str.startswith,
+# more than that are looked up in sets of prefixes of the same length
+PREFIX_TUPLE_LIMIT = 16
+
+# Kinds of patterns, by what the regex matches at the start of a key
+EXACT, PREFIX, SUFFIX, SUBSTRING, REGEX = 'exact', 'prefix', 'suffix', 'substring', 'regex'
+
+def compile_key_filter(keys=None, exclude_keys=None, key_set=None, exclude_key_set=None):
+    '''
+    Returns a `KeyFilter` for keys that match one of the regexes in `keys` and
+    none of those in `exclude_keys`, or None if every key passes.
+
+    Each argument is a regex or a list of them, and is matched like `re.match`,
+    at the start of the key. `key_set` and `exclude_key_set` restrict keys further
+    to those in, or not in, a set of keys. They are either a container like a `set`
+    or a `KeySet`, or the path of a key set file or a list of keys, opened with `open_key_set`.
+    '''
+    keys = pattern_list(keys)
+    exclude_keys = pattern_list(exclude_keys)
+    if any(classify(x) == (PREFIX, '') for x in keys):
+        # A pattern like .* lets everything through, whatever the others are
+        keys = []
+    if not keys and not exclude_keys and key_set is None and exclude_key_set is None:
+        return None
+    return KeyFilter(keys, exclude_keys, as_key_set(key_set), as_key_set(exclude_key_set))
+
+def pattern_list(patterns):
+    if not patterns:
+        return []
+    if isinstance(patterns, (list, tuple)):
+        return [x for x in patterns if x is not None]
+    return [patterns]
+
+def as_key_set(key_set):
+    if isinstance(key_set, basestring):
+        # Imported here, as most filters do not need it
+        from rdbtools.keyset import open_key_set
+        return open_key_set(key_set)
+    return key_set
+
+class KeyFilter(object):
+    '''
+    Tells whether a key passes the include and exclude patterns and key sets it was made with.
+
+    Patterns that are a literal string, optionally after .* and followed by .* or $,
+    are matched with set lookups, str.startswith and str.endswith. The remaining
+    patterns are joined into a single regex, so each key is matched once however
+    many patterns there are.
+    '''
+    def __init__(self, keys, exclude_keys=(), key_set=None, exclude_key_set=None) :
+        self.keys = list(keys)
+        self.exclude_keys = list(exclude_keys)
+        self.key_set = key_set
+        self.exclude_key_set = exclude_key_set
+        # (test, result the test must have for the key to pass), cheapest tests first
+        checks = []
+        if self.keys :
+            checks.append((compile_matcher(self.keys), True))
+        if self.exclude_keys :
+            checks.append((compile_matcher(self.exclude_keys), False))
+        if key_set is not None :
+            checks.append((key_set.__contains__, True))
+        if exclude_key_set is not None :
+            checks.append((exclude_key_set.__contains__, False))
+
+        if len(checks) == 1 :
+            test, wanted = checks[0]
+            if wanted :
+                def match(key) :
+                    if not isinstance(key, str) :
+                        key = str(key)
+                    return bool(test(key))
+            else :
+                def match(key) :
+                    if not isinstance(key, str) :
+                        key = str(key)
+                    return not test(key)
+        else :
+            def match(key) :
+                if not isinstance(key, str) :
+                    key = str(key)
+                for test, wanted in checks :
+                    if bool(test(key)) != wanted :
+                        return False
+                return True
+        self.match = match
+
+def compile_matcher(patterns):
+    '''Returns a function that is true for the keys matching any of `patterns`'''
+    exact = set()
+    prefixes = set()
+    suffixes = set()
+    substrings = set()
+    regexes = []
+    for pattern in patterns :
+        kind, literal = classify(pattern)
+        if kind == PREFIX and literal == '' :
+            return lambda key : True
+        if kind == EXACT :
+            # $ also matches before a newline that ends the key
+            exact.add(literal)
+            exact.add(literal + '\n')
+        elif kind == PREFIX :
+            prefixes.add(literal)
+        elif kind == SUFFIX :
+            suffixes.add(literal)
+        elif kind == SUBSTRING :
+            substrings.add(literal)
+        else :
+            regexes.append(pattern)
+
+    tests = []
+    if exact :
+        tests.append(frozenset(exact).__contains__)
+    if prefixes :
+        tests.append(prefix_matcher(prefixes))
+    if suffixes :
+        suffixes = tuple(suffixes)
+        tests.append(lambda key : key.endswith(suffixes))
+    if substrings :
+        substrings = tuple(substrings)
+        tests.append(lambda key : any(x in key for x in substrings))
+    if regexes :
+        tests.append(join_regexes(regexes))
+
+    if len(tests) == 1 :
+        matcher = tests[0]
+    else :
+        def matcher(key) :
+            for test in tests :
+                if test(key) :
+                    return True
+            return False
+
+    if not (suffixes or substrings) :
+        return matcher
+    # A leading .* does not match across newlines, which the str methods do not know
+    # about. The few keys with a newline are matched against the patterns themselves.
+    fallback = join_regexes(patterns)
+    def match(key) :
+        if '\n' in key :
+            return fallback(key)
+        return matcher(key)
+    return match
+
+def prefix_matcher(prefixes):
+    if len(prefixes) <= PREFIX_TUPLE_LIMIT :
+        prefixes = tuple(prefixes)
+        return lambda key : key.startswith(prefixes)
+    by_length = {}
+    for prefix in prefixes :
+        by_length.setdefault(len(prefix), set()).add(prefix)
+    by_length = sorted(by_length.items())
+    def match(key) :
+        for length, candidates in by_length :
+            if key[:length] in candidates :
+                return True
+        return False
+    return match
+
+def join_regexes(patterns):
+    '''Returns the `match` method of one regex matching any of `patterns`'''
+    if len(patterns) == 1 :
+        return re.compile(patterns[0]).match
+    compiled = [re.compile(x) for x in patterns]
+    if any(x.groups or x.flags & ~re.UNICODE for x in compiled) :
+        # Back references count groups from the start of the whole regex,
+        # so patterns with groups are not joined, nor are those with flags
+        matchers = [x.match for x in compiled]
+        return lambda key : any(m(key) for m in matchers)
+    return re.compile('|'.join('(?:%s)' % x.pattern for x in compiled)).match
+
+def classify(pattern):
+    '''
+    Returns (kind, literal) for a key regex. The kind is EXACT for literal$, PREFIX
+    for literal or literal.*, SUFFIX for .*literal$, SUBSTRING for .*literal, and
+    REGEX, with a literal of None, for anything else.
+    '''
+    try :
+        parsed = sre_parse.parse(pattern)
+    except Exception :
+        return REGEX, None
+    if parsed.pattern.flags & ~SRE_FLAG_UNICODE :
+        return REGEX, None
+    items = list(parsed)
+    leading_any = bool(items) and is_any_repeat(items[0])
+    if leading_any :
+        items = items[1:]
+    at_end = bool(items) and items[-1] == (AT, AT_END)
+    if at_end :
+        items = items[:-1]
+    elif items and is_any_repeat(items[-1]) :
+        # The match is not anchored at the end, so a trailing .* changes nothing
+        items = items[:-1]
+    if not all(op == LITERAL and value < 256 for op, value in items) :
+        return REGEX, None
+    literal = ''.join(chr(value) for op, value in items)
+    if leading_any :
+        if not literal :
+            # .* or .*$, where .*$ cannot match keys with a newline before their last character
+            return (PREFIX, '') if not at_end else (REGEX, None)
+        return (SUFFIX if at_end else SUBSTRING), literal
+    return (EXACT if at_end else PREFIX), literal
+
+def is_any_repeat(item):
+    '''True for .* and .*?'''
+    op, value = item
+    return op in (MAX_REPEAT, MIN_REPEAT) and value[0] == 0 and value[1] == MAXREPEAT and \
+        list(value[2]) == [(ANY, None)]
@@ -0,0 +1,110 @@
+import os
+import mmap
+import struct
+
+from rdbtools.parser import RdbParser, RdbCallback, DumpEntry
+
+INDEX_MAGIC = 'RDBIDX01'
+# magic, size and modification time of the dump file, number of records
+HEADER = struct.Struct('<8sQQQ')
+# db number, offset, end, data type, expiry (-1 if none), key offset, key length
+RECORD = struct.Struct('<IQQBqQI')
+
+def index_path(dump_file):
+    '''The default location of the index of `dump_file`'''
+    return dump_file + '.idx'
+
+def build_index(dump_file, index_file=None):
+    '''
+    Write a sidecar index of `dump_file` that maps (db number, key) to the
+    position of the key in the dump, and return the number of keys indexed.
+
+    The index is a table of fixed size records sorted by database and key, followed
+    by the keys themselves, so lookups can binary search a memory map of it.
+    Integer encoded keys are indexed by their decimal string.
+    '''
+    index_file = index_file or index_path(dump_file)
+    parser = RdbParser(RdbCallback())
+    entries = [x._replace(key=str(x.key)) for x in parser.iter_entries(dump_file, read_keys=True)
+               if x.key is not None]
+    entries.sort(key=lambda x: (x.db_number, x.key))
+
+    stat = os.stat(dump_file)
+    tmp_file = index_file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(HEADER.pack(INDEX_MAGIC, stat.st_size, int(stat.st_mtime), len(entries)))
+        key_offset = HEADER.size + RECORD.size * len(entries)
+        for entry in entries:
+            expiry = -1 if entry.expiry is None else entry.expiry
+            f.write(RECORD.pack(entry.db_number, entry.offset, entry.end, entry.data_type, expiry,
+                                key_offset, len(entry.key)))
+            key_offset += len(entry.key)
+        for entry in entries:
+            f.write(entry.key)
+    os.rename(tmp_file, index_file)
+    return len(entries)
+
+class RdbIndex(object):
+    '''
+    A read only view of an index written by `build_index`
+
+    Typical usage :
+        with RdbIndex('/var/redis/6379/dump.rdb.idx') as index:
+            entry = index.lookup(0, 'user:1000')
+    '''
+    def __init__(self, index_file):
+        with open(index_file, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map.size() < HEADER.size:
+            self.close()
+            raise Exception('RdbIndex', 'Index file %s is truncated' % index_file)
+        magic, self.dump_size, self.dump_mtime, self._count = HEADER.unpack_from(self._map, 0)
+        if magic != INDEX_MAGIC:
+            self.close()
+            raise Exception('RdbIndex', 'Invalid index file %s' % index_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for x in xrange(0, self._count):
+            yield self._entry(x)
+
+    def close(self):
+        self._map.close()
+
+    def matches(self, dump_file):
+        '''True if the index was built from `dump_file` as it is now'''
+        stat = os.stat(dump_file)
+        return stat.st_size == self.dump_size and int(stat.st_mtime) == self.dump_mtime
+
+    def lookup(self, db_number, key):
+        '''Returns the `DumpEntry` of `key` in database `db_number`, or None if it is not in the dump'''
+        target = (db_number, str(key))
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._sort_key(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and self._sort_key(lo) == target:
+            return self._entry(lo)
+        return None
+
+    def _sort_key(self, i):
+        db_number, offset, end, data_type, expiry, key_offset, key_length = \
+            RECORD.unpack_from(self._map, HEADER.size + i * RECORD.size)
+        return (db_number, self._map[key_offset:key_offset + key_length])
+
+    def _entry(self, i):
+        db_number, offset, end, data_type, expiry, key_offset, key_length = \
+            RECORD.unpack_from(self._map, HEADER.size + i * RECORD.size)
+        key = self._map[key_offset:key_offset + key_length]
+        return DumpEntry(offset, end, db_number, data_type, key, None if expiry < 0 else expiry)
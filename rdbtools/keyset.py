@@ -0,0 +1,217 @@
+import os
+import math
+import mmap
+import heapq
+import struct
+import hashlib
+import tempfile
+
+KEY_SET_MAGIC = 'RDBKSET1'
+# magic, size and modification time of the key list, number of keys,
+# bits in the bloom filter, hashes per key
+HEADER = struct.Struct('<8sQQQQI')
+HASHES = struct.Struct('<QQ')
+
+# Keys sorted in memory at a time while building, the rest is merged from temporary files
+SORT_RUN_SIZE = 1000000
+# Binary search stops at ranges of the key file this small, which are scanned with a single find
+SCAN_SIZE = 4096
+FALSE_POSITIVE_RATE = 0.01
+
+def key_set_path(keys_file):
+    '''The default location of the key set built from `keys_file`'''
+    return keys_file + '.keyset'
+
+def open_key_set(path):
+    '''
+    Returns a `KeySet` for `path`, which is either a key set written by `build_key_set`
+    or a list of keys, one per line. The key set of a list is built next to it the
+    first time, and again whenever the list changes.
+    '''
+    with open(path, 'rb') as f:
+        is_key_set = f.read(len(KEY_SET_MAGIC)) == KEY_SET_MAGIC
+    if is_key_set:
+        return KeySet(path)
+    key_set_file = key_set_path(path)
+    if os.path.exists(key_set_file):
+        key_set = KeySet(key_set_file)
+        if key_set.matches(path):
+            return key_set
+        key_set.close()
+    build_key_set(path, key_set_file)
+    return KeySet(key_set_file)
+
+def build_key_set(keys_file, key_set_file=None, false_positive_rate=FALSE_POSITIVE_RATE):
+    '''
+    Write a key set of the keys in `keys_file`, one per line, and return the number of distinct keys.
+
+    The key set is a bloom filter followed by the keys in sorted order, one per line,
+    so that most keys that are not in the set are ruled out without a lookup, and the
+    others are confirmed by binary searching a memory map of the file. Lists that do
+    not fit in memory are sorted in runs of `SORT_RUN_SIZE` keys, merged from disk.
+    '''
+    key_set_file = key_set_file or key_set_path(keys_file)
+    tmp_file = key_set_file + '.tmp'
+    runs = []
+    try:
+        with open(keys_file, 'rb') as f:
+            chunk = []
+            for line in f:
+                key = line.rstrip('\r\n')
+                if not key:
+                    continue
+                chunk.append(key)
+                if len(chunk) == SORT_RUN_SIZE:
+                    runs.append(write_run(chunk))
+                    chunk = []
+        chunk.sort()
+        sources = [iter(chunk)] + [read_run(x) for x in runs]
+
+        # The bloom filter goes before the keys, and is sized by their number,
+        # so the sorted keys are written to a file of their own first
+        fd, sorted_file = tempfile.mkstemp(suffix='.keys', dir=os.path.dirname(os.path.abspath(key_set_file)))
+        runs.append(sorted_file)
+        count = 0
+        with os.fdopen(fd, 'wb') as out:
+            previous = None
+            for key in heapq.merge(*sources):
+                if key != previous:
+                    out.write(key + '\n')
+                    count += 1
+                    previous = key
+
+        bits, hashes = bloom_size(count, false_positive_rate)
+        bloom = bytearray(bits // 8)
+        with open(sorted_file, 'rb') as f:
+            for line in f:
+                for position in bloom_positions(line[:-1], bits, hashes):
+                    bloom[position >> 3] |= 1 << (position & 7)
+
+        stat = os.stat(keys_file)
+        with open(tmp_file, 'wb') as out:
+            out.write(HEADER.pack(KEY_SET_MAGIC, stat.st_size, int(stat.st_mtime), count, bits, hashes))
+            out.write(bloom)
+            with open(sorted_file, 'rb') as f:
+                while True:
+                    data = f.read(1024 * 1024)
+                    if not data:
+                        break
+                    out.write(data)
+        os.rename(tmp_file, key_set_file)
+    finally:
+        for run in runs:
+            os.remove(run)
+    return count
+
+def write_run(keys):
+    keys.sort()
+    fd, path = tempfile.mkstemp(suffix='.keys')
+    with os.fdopen(fd, 'wb') as f:
+        for key in keys:
+            f.write(key + '\n')
+    return path
+
+def read_run(path):
+    with open(path, 'rb') as f:
+        for line in f:
+            yield line[:-1]
+
+def bloom_size(count, false_positive_rate):
+    '''Returns the number of bits, a multiple of 8, and of hashes per key for a bloom filter of `count` keys'''
+    bits = int(math.ceil(-max(count, 1) * math.log(false_positive_rate) / (math.log(2) ** 2)))
+    bits = max(64, (bits + 7) // 8 * 8)
+    hashes = max(1, int(round(float(bits) / max(count, 1) * math.log(2))))
+    return bits, hashes
+
+def bloom_positions(key, bits, hashes):
+    # Double hashing, the i-th position is h1 + i * h2
+    h1, h2 = HASHES.unpack(hashlib.md5(key).digest())
+    return [(h1 + i * h2) % bits for i in xrange(0, hashes)]
+
+class KeySet(object):
+    '''
+    A read only view of a key set written by `build_key_set`, with `key in key_set` lookups
+
+    Typical usage :
+        with KeySet('/data/gdpr-users.txt.keyset') as key_set:
+            parser = RdbParser(callback, filters={'key_set' : key_set})
+    '''
+    def __init__(self, key_set_file):
+        self.path = key_set_file
+        with open(key_set_file, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map.size() < HEADER.size:
+            self.close()
+            raise Exception('KeySet', 'Key set file %s is truncated' % key_set_file)
+        magic, self.keys_size, self.keys_mtime, self._count, self._bits, self._hashes = \
+            HEADER.unpack_from(self._map, 0)
+        if magic != KEY_SET_MAGIC:
+            self.close()
+            raise Exception('KeySet', 'Invalid key set file %s' % key_set_file)
+        # A bloom filter of 10 bits per key is small enough to copy out of the map, and is faster to index
+        self._bloom = bytearray(self._map[HEADER.size:HEADER.size + self._bits // 8])
+        self._keys_start = HEADER.size + self._bits // 8
+        self._keys_end = self._map.size()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        start = self._keys_start
+        while start < self._keys_end:
+            end = self._map.find('\n', start)
+            yield self._map[start:end]
+            start = end + 1
+
+    def __contains__(self, key):
+        h1, h2 = HASHES.unpack(hashlib.md5(key).digest())
+        bloom = self._bloom
+        bits = self._bits
+        position = h1 % bits
+        h2 %= bits
+        for i in xrange(0, self._hashes):
+            if not bloom[position >> 3] & (1 << (position & 7)):
+                return False
+            position = (position + h2) % bits
+        return self._search(key)
+
+    def __getstate__(self):
+        # Parallel workers open the file again instead of receiving the map
+        return self.path
+
+    def __setstate__(self, path):
+        self.__init__(path)
+
+    def close(self):
+        self._map.close()
+
+    def matches(self, keys_file):
+        '''True if the key set was built from `keys_file` as it is now'''
+        stat = os.stat(keys_file)
+        return stat.st_size == self.keys_size and int(stat.st_mtime) == self.keys_mtime
+
+    def _search(self, key):
+        '''Binary search of the sorted keys, by byte offset, moving to the start of the line around the middle'''
+        data = self._map
+        lo, hi = self._keys_start, self._keys_end
+        # lo and hi are always at the start of a line
+        while hi - lo > SCAN_SIZE:
+            mid = (lo + hi) // 2
+            start = max(data.rfind('\n', lo, mid) + 1, lo)
+            end = data.find('\n', start)
+            line = data[start:end]
+            if line == key:
+                return True
+            if line < key:
+                lo = end + 1
+            else:
+                hi = start
+        if data[lo:lo + len(key) + 1] == key + '\n':
+            return True
+        return data.find('\n' + key + '\n', lo, hi) >= 0
@@ -0,0 +1,301 @@
+import socket
+import time
+
+from rdbtools.callbacks import ProtocolCallback, PROTOCOL_BATCH_SIZE
+from rdbtools.replication import send_command, read_line, read_status
+
+# Commands sent on a connection before waiting for their replies
+MAX_IN_FLIGHT = 1000
+# Bytes of commands collected for a connection before they are sent
+SEND_SIZE = 64 * 1024
+# Error replies kept for the report of each server
+MAX_ERROR_MESSAGES = 5
+
+# Number of hash slots of a redis cluster
+CLUSTER_SLOTS = 16384
+
+def _crc16_table():
+    # CRC16-CCITT (XMODEM) as used by redis cluster : polynomial 0x1021, starting at 0
+    table = []
+    for byte in range(0, 256):
+        crc = byte << 8
+        for x in range(0, 8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else crc << 1
+        table.append(crc & 0xffff)
+    return tuple(table)
+
+CRC16_TABLE = _crc16_table()
+
+def crc16(data):
+    crc = 0
+    for byte in bytearray(data):
+        crc = ((crc << 8) & 0xffff) ^ CRC16_TABLE[((crc >> 8) ^ byte) & 0xff]
+    return crc
+
+def key_slot(key):
+    '''
+    The hash slot of `key` in a redis cluster. If the key holds a {hash tag} that is not
+    empty, only the tag is hashed, so that keys with the same tag share a slot.
+    '''
+    key = str(key)
+    start = key.find('{')
+    if start >= 0:
+        end = key.find('}', start + 1)
+        if end > start + 1:
+            key = key[start + 1:end]
+    return crc16(key) % CLUSTER_SLOTS
+
+class ErrorReply(str):
+    '''An error sent by the server in reply to a command'''
+
+def read_reply(f):
+    '''Reads a reply in the redis protocol. Errors are returned as `ErrorReply` instead of being raised'''
+    line = read_line(f)
+    prefix, rest = line[:1], line[1:]
+    if prefix == '+':
+        return rest
+    if prefix == '-':
+        return ErrorReply(rest)
+    if prefix == ':':
+        return int(rest)
+    if prefix == '$':
+        if int(rest) < 0:
+            return None
+        data = f.read(int(rest) + 2)
+        if len(data) < int(rest) + 2:
+            raise Exception('read_reply', 'Connection closed by the server')
+        return data[:-2]
+    if prefix == '*':
+        if int(rest) < 0:
+            return None
+        return [read_reply(f) for x in xrange(0, int(rest))]
+    raise Exception('read_reply', 'Invalid reply %s' % line)
+
+class NodeConnection(object):
+    '''
+    A pipelined connection to a redis server. Commands are collected and sent SEND_SIZE
+    bytes at a time, and their replies read once `max_in_flight` commands are waiting for
+    one, so that the commands of a load keep the connection busy without flooding the server.
+    '''
+    def __init__(self, host, port, password=None, timeout=None, max_in_flight=MAX_IN_FLIGHT):
+        self.name = '%s:%d' % (host, port)
+        self._sock = socket.create_connection((host, port), timeout)
+        self._f = self._sock.makefile('rb')
+        self._max_in_flight = max_in_flight
+        self._pending = []
+        self._pending_size = 0
+        self._in_flight = 0
+        self.db_number = 0
+        self.commands = 0
+        self.bytes = 0
+        self.errors = 0
+        self.error_messages = []
+        try:
+            if password:
+                send_command(self._sock, 'AUTH', password)
+                read_status(self._f, 'AUTH')
+        except:
+            self.close()
+            raise
+
+    def send(self, command):
+        '''Queues `command`, which must be a single command in the redis protocol'''
+        self._pending.append(command)
+        self._pending_size += len(command)
+        self._in_flight += 1
+        self.commands += 1
+        self.bytes += len(command)
+        if self._pending_size >= SEND_SIZE:
+            self.flush()
+        if self._in_flight >= self._max_in_flight:
+            # Read replies until half the window is free, so that reads are not one at a time
+            self.read_replies(self._in_flight - self._max_in_flight // 2)
+
+    def flush(self):
+        if self._pending:
+            self._sock.sendall(''.join(self._pending))
+            self._pending = []
+            self._pending_size = 0
+
+    def read_replies(self, count):
+        self.flush()
+        for x in xrange(0, count):
+            reply = read_reply(self._f)
+            self._in_flight -= 1
+            if isinstance(reply, ErrorReply):
+                self.errors += 1
+                if len(self.error_messages) < MAX_ERROR_MESSAGES:
+                    self.error_messages.append(str(reply))
+
+    def finish(self):
+        '''Sends whatever is queued, and waits for every reply'''
+        self.read_replies(self._in_flight)
+
+    def call(self, *args):
+        '''Sends a command once every other reply has been read, and returns its reply'''
+        self.finish()
+        send_command(self._sock, *[str(x) for x in args])
+        return read_reply(self._f)
+
+    def close(self):
+        self._f.close()
+        self._sock.close()
+
+def cluster_nodes(host, port, password=None, timeout=None):
+    '''
+    Asks the cluster node at host:port for the slots of every master with CLUSTER SLOTS, and
+    returns (nodes, slots) : the (host, port) of each master, and the index in `nodes` of the
+    master that serves each slot, or None for slots that no master serves.
+    '''
+    conn = NodeConnection(host, port, password, timeout)
+    try:
+        reply = conn.call('CLUSTER', 'SLOTS')
+    finally:
+        conn.close()
+    if isinstance(reply, ErrorReply):
+        raise Exception('cluster_nodes', '%s:%d is not a cluster node : %s' % (host, port, reply))
+    nodes = []
+    slots = [None] * CLUSTER_SLOTS
+    for slot_range in reply:
+        start, end, master = slot_range[0], slot_range[1], slot_range[2]
+        # an empty host is the one the question was asked to
+        node = (master[0] or host, int(master[1]))
+        if not node in nodes:
+            nodes.append(node)
+        for slot in xrange(start, end + 1):
+            slots[slot] = nodes.index(node)
+    return nodes, slots
+
+class Loader(object):
+    '''
+    Sends the commands of a dump to the redis server at host:port, or to the masters of the
+    redis cluster it is a node of, over `connections` pipelined connections to each server.
+
+    In a cluster, every key is sent to the master that serves its hash slot, as given by
+    CLUSTER SLOTS when the load starts. Slots should not move while the dump is loaded :
+    commands sent to a server that no longer serves their slot fail, and are counted as errors.
+    All the commands of a key go over the same connection, so that they are run in order.
+
+    If `rate` is given, no more than `rate` commands a second are sent, over all servers.
+    Error replies are counted for each server, and do not stop the load.
+
+    Typical usage :
+        with Loader('localhost', 7000, cluster=True) as loader:
+            RdbParser(LoadCallback(loader)).parse('/var/redis/6379/dump.rdb')
+        for line in loader.report():
+            print(line)
+    '''
+    def __init__(self, host, port, password=None, cluster=False, connections=1, max_in_flight=MAX_IN_FLIGHT,
+                 rate=None, timeout=None):
+        if cluster:
+            nodes, self._slots = cluster_nodes(host, port, password, timeout)
+        else:
+            nodes, self._slots = [(host, port)], None
+        self._cluster = cluster
+        self._nodes = []
+        try:
+            for node_host, node_port in nodes:
+                self._nodes.append([])
+                for x in xrange(0, connections):
+                    self._nodes[-1].append(NodeConnection(node_host, node_port, password, timeout, max_in_flight))
+        except:
+            self.close()
+            raise
+        self._rate = rate
+        self._db_number = 0
+        self._sent = 0
+        self._start = time.time()
+        self._elapsed = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def select(self, db_number):
+        '''Sends the keys that follow to database `db_number`'''
+        if self._cluster and db_number != 0:
+            raise Exception('select', 'Redis cluster only has database 0, the dump has keys in database %d' % db_number)
+        self._db_number = db_number
+
+    def connection(self, key):
+        '''The connection that the commands of `key` are sent over'''
+        slot = key_slot(key)
+        if self._slots is None:
+            connections = self._nodes[0]
+        else:
+            node = self._slots[slot]
+            if node is None:
+                raise Exception('connection', 'No node of the cluster serves slot %d of key %s' % (slot, key))
+            connections = self._nodes[node]
+        return connections[slot % len(connections)]
+
+    def send(self, key, command):
+        '''Sends one `command` about `key` to the server of the key'''
+        conn = self.connection(key)
+        if conn.db_number != self._db_number:
+            conn.send('*2\r\n$6\r\nSELECT\r\n$%d\r\n%d\r\n' % (len(str(self._db_number)), self._db_number))
+            conn.db_number = self._db_number
+        conn.send(command)
+        if self._rate:
+            self._sent += 1
+            ahead = self._sent / float(self._rate) - (time.time() - self._start)
+            if ahead > 0.01:
+                # send what was held back before waiting, so the server is not left idle
+                for x in self.connections():
+                    x.flush()
+                time.sleep(ahead)
+
+    def connections(self):
+        return [conn for connections in self._nodes for conn in connections]
+
+    def finish(self):
+        '''Sends every queued command, and waits for all the replies'''
+        for conn in self.connections():
+            conn.finish()
+        self._elapsed = time.time() - self._start
+
+    def report(self):
+        '''A line for each server with the commands and bytes sent, and errors, then the errors themselves'''
+        elapsed = self._elapsed or (time.time() - self._start)
+        lines = []
+        for connections in self._nodes:
+            commands = sum(x.commands for x in connections)
+            size = sum(x.bytes for x in connections)
+            errors = sum(x.errors for x in connections)
+            lines.append('%s : %d commands, %d commands/sec, %.1f MB, %d errors' % (connections[0].name, commands,
+                         commands / max(elapsed, 0.001), size / (1024.0 * 1024.0), errors))
+            for conn in connections:
+                lines.extend('  %s' % x for x in conn.error_messages)
+        return lines
+
+    @property
+    def errors(self):
+        return sum(x.errors for x in self.connections())
+
+    def close(self):
+        for conn in self.connections():
+            conn.close()
+
+class LoadCallback(ProtocolCallback):
+    '''
+    Sends the commands that ProtocolCallback would write to the servers of `loader`, a `Loader`.
+    The commands of each key go to the server that serves it.
+    '''
+    def __init__(self, loader, batch_size=PROTOCOL_BATCH_SIZE):
+        ProtocolCallback.__init__(self, None, batch_size)
+        self._loader = loader
+
+    def send(self, key, command):
+        self._loader.send(key, command)
+
+    def start_database(self, db_number):
+        self._loader.select(db_number)
+
+    def end_rdb(self):
+        self._loader.finish()
+
+class LoadRestoreCallback(LoadCallback):
+    '''Sends every key to the servers of `loader` in a RESTORE command, as RestoreCallback writes them'''
+    wants_dump_payloads = True
@@ -0,0 +1,137 @@
+import ctypes
+import ctypes.util
+
+_library = None
+_library_loaded = False
+
+def load_library():
+    '''Returns the system liblzf through ctypes, or None if it cannot be found'''
+    global _library, _library_loaded
+    if not _library_loaded:
+        _library_loaded = True
+        try:
+            path = ctypes.util.find_library('lzf')
+            if path:
+                library = ctypes.CDLL(path)
+                library.lzf_decompress.argtypes = [ctypes.c_char_p, ctypes.c_uint, ctypes.c_void_p, ctypes.c_uint]
+                library.lzf_decompress.restype = ctypes.c_uint
+                _library = library
+        except (OSError, AttributeError):
+            _library = None
+    return _library
+
+class LzfDecompressor(object):
+    '''Decompresses the LZF strings found in redis dump files
+
+    The output buffer is preallocated from the expected length and reused
+    across calls, so decompressing many small strings does not allocate a
+    new buffer for each of them. Literal runs and back references are copied
+    with slices rather than a byte at a time.
+
+    If `use_library` is True and liblzf is installed, decompression is
+    done by liblzf, otherwise by the pure python implementation.
+    '''
+    def __init__(self, use_library=True):
+        self._buffer = bytearray()
+        self._library = load_library() if use_library else None
+        self._library_buffer = None
+        if self._library is not None:
+            self.decompress = self._decompress_with_library
+        else:
+            self.decompress = self._decompress
+
+    def decompress_prefix(self, compressed, size):
+        '''
+        Returns at least the first `size` bytes `compressed` decompresses to, or as many as
+        it holds if it is cut short. Decoding stops once `size` bytes are out, so the header
+        of a large compressed string costs a few operations instead of the whole string.
+        '''
+        in_stream = bytearray(compressed)
+        in_len = len(in_stream)
+        in_index = 0
+        out_stream = bytearray()
+        while in_index < in_len and len(out_stream) < size:
+            ctrl = in_stream[in_index]
+            in_index = in_index + 1
+            if ctrl < 32:
+                out_stream += in_stream[in_index:in_index + ctrl + 1]
+                in_index = in_index + ctrl + 1
+                continue
+            length = ctrl >> 5
+            if length == 7:
+                if in_index >= in_len:
+                    break
+                length = length + in_stream[in_index]
+                in_index = in_index + 1
+            if in_index >= in_len:
+                break
+            ref = len(out_stream) - ((ctrl & 0x1f) << 8) - in_stream[in_index] - 1
+            in_index = in_index + 1
+            if ref < 0:
+                raise Exception('lzf_decompress', 'Invalid back reference at offset %d' % len(out_stream))
+            for x in xrange(0, length + 2):
+                out_stream.append(out_stream[ref + x])
+        return bytes(out_stream)
+
+    def _decompress_with_library(self, compressed, expected_length):
+        if expected_length == 0:
+            return self._decompress(compressed, expected_length)
+        if not isinstance(compressed, bytes):
+            compressed = bytes(compressed)
+        if self._library_buffer is None or len(self._library_buffer) < expected_length:
+            self._library_buffer = ctypes.create_string_buffer(max(expected_length, 2 * len(self._library_buffer or '')))
+        out_len = self._library.lzf_decompress(compressed, len(compressed), self._library_buffer, expected_length)
+        if out_len != expected_length:
+            raise Exception('lzf_decompress', 'Expected lengths do not match %d != %d' % (out_len, expected_length))
+        return ctypes.string_at(self._library_buffer, out_len)
+
+    def _decompress(self, compressed, expected_length):
+        in_stream = bytearray(compressed)
+        in_len = len(in_stream)
+        in_index = 0
+        if len(self._buffer) < expected_length:
+            self._buffer = bytearray(max(expected_length, 2 * len(self._buffer)))
+        out_stream = self._buffer
+        out_index = 0
+
+        while in_index < in_len:
+            ctrl = in_stream[in_index]
+            in_index = in_index + 1
+            if ctrl < 32:
+                # A literal run of ctrl + 1 bytes
+                length = ctrl + 1
+                if out_index + length > expected_length or in_index + length > in_len:
+                    raise Exception('lzf_decompress', 'Literal run of %d bytes overflows the output' % length)
+                out_stream[out_index:out_index + length] = in_stream[in_index:in_index + length]
+                in_index = in_index + length
+                out_index = out_index + length
+            else:
+                # A back reference to data that was already decompressed
+                length = ctrl >> 5
+                if length == 7:
+                    length = length + in_stream[in_index]
+                    in_index = in_index + 1
+                ref = out_index - ((ctrl & 0x1f) << 8) - in_stream[in_index] - 1
+                in_index = in_index + 1
+                length = length + 2
+                if ref < 0 or out_index + length > expected_length:
+                    raise Exception('lzf_decompress', 'Invalid back reference at offset %d' % out_index)
+                distance = out_index - ref
+                if distance >= length:
+                    out_stream[out_index:out_index + length] = out_stream[ref:ref + length]
+                elif distance == 1:
+                    out_stream[out_index:out_index + length] = out_stream[ref:out_index] * length
+                else:
+                    # The reference overlaps the output, so the last `distance` bytes repeat
+                    end = out_index + length
+                    while out_index < end:
+                        chunk = min(distance, end - out_index)
+                        out_stream[out_index:out_index + chunk] = out_stream[ref:ref + chunk]
+                        out_index = out_index + chunk
+                        ref = ref + chunk
+                    continue
+                out_index = out_index + length
+
+        if out_index != expected_length:
+            raise Exception('lzf_decompress', 'Expected lengths do not match %d != %d' % (out_index, expected_length))
+        return memoryview(out_stream)[:out_index].tobytes()
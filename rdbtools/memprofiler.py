@@ -1,9 +1,11 @@
 from collections import namedtuple
 import random
 import json
+import sys
 
-from rdbtools.parser import RdbCallback
+from rdbtools.parser import RdbCallback, LazyValue
 from rdbtools.callbacks import encode_key
+from rdbtools.arrays import is_array
 
 ZSKIPLIST_MAXLEVEL=32
 ZSKIPLIST_P=0.25
@@ -64,6 +66,21 @@ class StatsAggregator():
             self.scatters[heading] = []
         self.scatters[heading].append([x, y])
   
+    def merge(self, other):
+        '''Adds the records seen by another StatsAggregator, as if they had been seen after our own'''
+        for heading, values in other.aggregates.items():
+            for subheading, metric in values.items():
+                self.add_aggregate(heading, subheading, metric)
+        for heading, values in other.histograms.items():
+            for metric, count in values.items():
+                if not heading in self.histograms:
+                    self.histograms[heading] = {}
+                self.histograms[heading][metric] = self.histograms[heading].get(metric, 0) + count
+        for heading, points in other.scatters.items():
+            if not heading in self.scatters:
+                self.scatters[heading] = []
+            self.scatters[heading].extend(points)
+
     def get_json(self):
         return json.dumps({"aggregates":self.aggregates, "scatters":self.scatters, "histograms":self.histograms})
         
@@ -81,6 +98,11 @@ class MemoryCallback(RdbCallback):
     '''Calculates the memory used if this rdb file were loaded into RAM
         The memory usage is approximate, and based on heuristics.
     '''
+    # intsets and integer ziplists only count towards the largest element, which an array tells at once
+    wants_arrays = True
+    # only whether keys expire matters
+    wants_raw_expiry = True
+
     def __init__(self, stream, architecture):
         self._stream = stream
         self._dbnum = 0
@@ -145,6 +167,15 @@ class MemoryCallback(RdbCallback):
             self._current_size += self.hashtable_entry_overhead()
             self._current_size += 2*self.robj_overhead()
     
+    def hset_many(self, key, pairs):
+        if not pairs:
+            return
+        self.update_largest_element(max(max(element_length(field), element_length(value)) for field, value in pairs))
+        if self._current_encoding == 'hashtable':
+            sizeof_string = self.sizeof_string
+            self._current_size += sum(sizeof_string(field) + sizeof_string(value) for field, value in pairs)
+            self._current_size += len(pairs) * (self.hashtable_entry_overhead() + 2*self.robj_overhead())
+    
     def end_hash(self, key):
         record = MemoryRecord(self._dbnum, "hash", key, self._current_size, self._current_encoding, self._current_length, self._len_largest_element)
         self._stream.next_record(record)
@@ -163,6 +194,18 @@ class MemoryCallback(RdbCallback):
             self._current_size += self.hashtable_entry_overhead()
             self._current_size += self.robj_overhead()
     
+    def sadd_many(self, key, members):
+        if is_array(members):
+            self.update_largest_element(array_element_length(members))
+            return
+        if not members:
+            return
+        self.update_largest_element(max(element_length(member) for member in members))
+        if self._current_encoding == 'hashtable':
+            sizeof_string = self.sizeof_string
+            self._current_size += sum(sizeof_string(member) for member in members)
+            self._current_size += len(members) * (self.hashtable_entry_overhead() + self.robj_overhead())
+    
     def end_set(self, key):
         record = MemoryRecord(self._dbnum, "set", key, self._current_size, self._current_encoding, self._current_length, self._len_largest_element)
         self._stream.next_record(record)
@@ -193,6 +236,18 @@ class MemoryCallback(RdbCallback):
             self._current_size += self.linkedlist_entry_overhead()
             self._current_size += self.robj_overhead()
     
+    def rpush_many(self, key, values):
+        if is_array(values):
+            self.update_largest_element(array_element_length(values))
+            return
+        if not values:
+            return
+        self.update_largest_element(max(element_length(value) for value in values))
+        if self._current_encoding == 'linkedlist':
+            sizeof_string = self.sizeof_string
+            self._current_size += sum(sizeof_string(value) for value in values)
+            self._current_size += len(values) * (self.linkedlist_entry_overhead() + self.robj_overhead())
+    
     def end_list(self, key):
         record = MemoryRecord(self._dbnum, "list", key, self._current_size, self._current_encoding, self._current_length, self._len_largest_element)
         self._stream.next_record(record)
@@ -224,11 +279,27 @@ class MemoryCallback(RdbCallback):
             self._current_size += 2*self.robj_overhead()
             self._current_size += self.skiplist_entry_overhead()
     
+    def zadd_many(self, key, pairs):
+        if not pairs:
+            return
+        self.update_largest_element(max(element_length(member) for score, member in pairs))
+        if self._current_encoding == 'skiplist':
+            sizeof_string = self.sizeof_string
+            self._current_size += sum(sizeof_string(member) for score, member in pairs)
+            self._current_size += len(pairs) * (8 + 2*self.robj_overhead())
+            # Each entry draws its own random skiplist level
+            for x in xrange(0, len(pairs)):
+                self._current_size += self.skiplist_entry_overhead()
+    
     def end_sorted_set(self, key):
         record = MemoryRecord(self._dbnum, "sortedset", key, self._current_size, self._current_encoding, self._current_length, self._len_largest_element)
         self._stream.next_record(record)
         self.end_key()
         
+    def update_largest_element(self, length):
+        if length > self._len_largest_element:
+            self._len_largest_element = length
+    
     def end_key(self):
         self._current_encoding = None
         self._current_size = 0
@@ -242,6 +313,10 @@ class MemoryCallback(RdbCallback):
         # 1 extra byte is used to store the null character at the end of the string
         # Redis internally stores integers as a long
         #  Integers less than REDIS_SHARED_INTEGERS are stored in a shared memory pool
+        # Redis only compresses strings longer than 20 bytes, which are too long to be 
+        # stored as integers, so a compressed LazyValue never needs to be decompressed
+        if isinstance(string, LazyValue) and string.encoding == 'lzf':
+            return len(string) + 8 + 1 + self.malloc_overhead()
         try:
             num = int(string)
             if num < REDIS_SHARED_INTEGERS :
@@ -259,7 +334,7 @@ class MemoryCallback(RdbCallback):
 
     def key_expiry_overhead(self, expiry):
         # If there is no expiry, there isn't any overhead
-        if not expiry:
+        if expiry is None:
             return 0
         # Key expiry is stored in a hashtable, so we have to pay for the cost of a hashtable entry
         # The timestamp itself is stored as an int64, which is a 8 bytes
@@ -336,4 +411,11 @@ def element_length(element):
         return 16
     else:
         return len(element)
-    
+
+def array_element_length(values):
+    '''The largest `element_length` of the numbers in the numpy array `values`'''
+    if not len(values):
+        return 0
+    if values.dtype.kind == 'u' and values.max() > sys.maxint:
+        return 16
+    return 8
@@ -0,0 +1,171 @@
+import os
+import shutil
+import tempfile
+from multiprocessing import Pool, cpu_count
+
+from rdbtools.parser import RdbParser, RdbCallback, REDIS_RDB_OPCODE_SELECTDB
+from rdbtools.compression import RDB_MAGIC
+
+MIN_CHUNK_SIZE = 1024 * 1024
+CHUNKS_PER_JOB = 4
+
+class ParallelRdbParser(object):
+    '''
+    Parses one dump file with a pool of worker processes
+
+    A first pass walks the file without decoding any values, and splits it into
+    contiguous ranges of keys that never cross a database. Each range is parsed in
+    a worker with its own callback, built by `make_callback(out)`, which writes to a
+    temporary file. The main process sends the database level events (start_rdb,
+    start_database, end_database and end_rdb) to `callback`, and copies the output of
+    the workers to `out` in file order, so the output is the same as a serial parse.
+
+    `separator` is written between the outputs of two ranges of the same database,
+    for formats like JSON that separate keys with commas.
+
+    If `collect` is given, it is called in the worker with the callback once its range
+    has been parsed, and `merge` is called in the main process with each result, in file order.
+
+    Callbacks that buffer their output, like JSONCallback, have their `flush` method
+    called once their range has been parsed.
+
+    `make_callback` and `collect` are sent to the workers, so they must be classes or
+    top level functions. `parser_options` are passed on to each worker's RdbParser.
+    Compressed dumps cannot be split, and are parsed in the main process.
+
+    Typical usage :
+        callback = JSONCallback(out)
+        parser = ParallelRdbParser(callback, JSONCallback, out, jobs=8, separator=',')
+        parser.parse('/var/redis/6379/dump.rdb')
+    '''
+    def __init__(self, callback, make_callback, out=None, filters=None, jobs=None, chunk_size=None,
+                 separator='', collect=None, merge=None, **parser_options):
+        self._callback = callback
+        self._make_callback = make_callback
+        self._out = out
+        self._filters = filters
+        self._jobs = jobs or cpu_count()
+        self._chunk_size = chunk_size
+        self._separator = separator
+        self._collect = collect
+        self._merge = merge
+        self._parser_options = parser_options
+        # Splitting the file reads the auxiliary fields before start_rdb, so they are not passed on
+        self._parser = RdbParser(RdbCallback(), filters)
+
+    def split(self, filename):
+        '''
+        Yields ('database', db_number) for every database selector and
+        ('range', start, end, db_number) for every range of keys, in file order
+        '''
+        chunk_size = self._chunk_size
+        if not chunk_size:
+            chunk_size = max(MIN_CHUNK_SIZE, os.path.getsize(filename) // (self._jobs * CHUNKS_PER_JOB))
+        start = end = None
+        db_number = 0
+        for entry in self._parser.iter_entries(filename):
+            if entry.data_type == REDIS_RDB_OPCODE_SELECTDB:
+                if start is not None:
+                    yield ('range', start, end, db_number)
+                    start = None
+                db_number = entry.db_number
+                yield ('database', db_number)
+                continue
+            if start is None:
+                start = entry.offset
+            end = entry.end
+            if end - start >= chunk_size:
+                yield ('range', start, end, db_number)
+                start = None
+        if start is not None:
+            yield ('range', start, end, db_number)
+
+    def parse(self, filename):
+        with open(filename, 'rb') as f:
+            is_compressed = f.read(len(RDB_MAGIC)) != RDB_MAGIC
+        if is_compressed:
+            # A compressed dump cannot be split without decompressing all of it first
+            RdbParser(self._callback, self._filters, **self._parser_options).parse(filename)
+            return
+        plan = [x for x in self.split(filename)
+                if x[0] == 'database' or self._parser.matches_filter(x[3])]
+        tasks = [(filename, x[1], x[2], x[3], self._make_callback, self._collect, self._filters,
+                  self._parser_options, self._out is not None) for x in plan if x[0] == 'range']
+        pool = Pool(self._jobs)
+        try:
+            results = pool.imap(_parse_range, tasks)
+            self._merge_results(plan, results)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _merge_results(self, plan, results):
+        callback = self._callback
+        # what the callback has written so far goes before the output of the workers
+        flush = getattr(callback, 'flush', None)
+        callback.start_rdb()
+        is_first_database = True
+        db_number = 0
+        has_output = False
+        for item in plan:
+            if item[0] == 'database':
+                if not is_first_database:
+                    callback.end_database(db_number)
+                is_first_database = False
+                db_number = item[1]
+                callback.start_database(db_number)
+                has_output = False
+                continue
+            path, result = next(results)
+            if path is not None:
+                try:
+                    if os.path.getsize(path) > 0:
+                        if flush is not None:
+                            flush()
+                        if has_output and self._separator:
+                            self._out.write(self._separator)
+                        with open(path, 'rb') as f:
+                            shutil.copyfileobj(f, self._out)
+                        has_output = True
+                finally:
+                    os.remove(path)
+            if self._merge is not None:
+                self._merge(result)
+        callback.end_database(db_number)
+        callback.end_rdb()
+
+def _parse_range(task):
+    filename, start, end, db_number, make_callback, collect, filters, parser_options, to_file = task
+    if to_file:
+        out = tempfile.NamedTemporaryFile(prefix='rdbtools-', delete=False)
+    else:
+        out = None
+    try:
+        callback = make_callback(out)
+        # Put the callback in the state it would be in within this database,
+        # and throw away whatever it writes for the database level events
+        callback.start_rdb()
+        callback.start_database(db_number)
+        flush = getattr(callback, 'flush', None)
+        if out is not None:
+            if flush is not None:
+                flush()
+            out.seek(0)
+            out.truncate()
+        parser = RdbParser(callback, filters, **parser_options)
+        parser.parse_range(filename, start, end, db_number)
+        if flush is not None:
+            flush()
+        result = None
+        if collect is not None:
+            result = collect(callback)
+    except:
+        if out is not None:
+            out.close()
+            os.remove(out.name)
+        raise
+    if out is not None:
+        out.close()
+        return out.name, result
+    return None, result
@@ -2,18 +2,56 @@ import struct
 import io
 import sys
 import datetime
-import re
+import time
+import mmap
+import itertools
+from collections import namedtuple
+from rdbtools.lzf import LzfDecompressor
+from rdbtools.compression import open_dump_stream, RDB_MAGIC
+from rdbtools.filters import compile_key_filter
+from rdbtools.arrays import numpy, intset_array, integer_ziplist_array
+from rdbtools.crc64 import ChecksumReader, CHECKSUM_VERSION, crc64, verify_checksum
 
 try :
-    from StringIO import StringIO
-except ImportError:
-    from io import StringIO
+    _buffer = buffer
+except NameError:
+    def _buffer(obj, offset, size):
+        return memoryview(obj)[offset:offset + size]
     
+# Bytes read at a time from streams that are not regular files
+STREAM_BUFFER_SIZE = 1024 * 1024
+
+# Elements of hashtables, linked lists and skiplists handed to the batch callback methods at a time
+ELEMENT_BATCH_SIZE = 1024
+
+# Skipped strings at least this long are seeked over in regular files. Shorter ones are
+# read, which is faster than a seek that throws away the file object's buffer.
+SKIP_SEEK_SIZE = 4096
+
+# Ziplists of integers are decoded with numpy from this many entries. Walking 
+# smaller ones entry by entry is faster than setting up the arrays.
+ARRAY_MIN_ENTRIES = 32
+
+# Compressed bytes read to decode the header of an LZF compressed ziplist, intset or zipmap.
+# A literal run holds up to 32 bytes, so this is a few runs or back references.
+LZF_HEADER_INPUT = 64
+
 REDIS_RDB_6BITLEN = 0
 REDIS_RDB_14BITLEN = 1
 REDIS_RDB_32BITLEN = 2
 REDIS_RDB_ENCVAL = 3
 
+# First bytes of 32 and 64 bit lengths
+REDIS_RDB_32BITLEN_PREFIX = 0x80
+REDIS_RDB_64BITLEN_PREFIX = 0x81
+
+REDIS_RDB_OPCODE_FUNCTION2 = 245
+REDIS_RDB_OPCODE_FUNCTION = 246
+REDIS_RDB_OPCODE_MODULE_AUX = 247
+REDIS_RDB_OPCODE_IDLE = 248
+REDIS_RDB_OPCODE_FREQ = 249
+REDIS_RDB_OPCODE_AUX = 250
+REDIS_RDB_OPCODE_RESIZEDB = 251
 REDIS_RDB_OPCODE_EXPIRETIME_MS = 252
 REDIS_RDB_OPCODE_EXPIRETIME = 253
 REDIS_RDB_OPCODE_SELECTDB = 254
@@ -24,27 +62,118 @@ REDIS_RDB_TYPE_LIST = 1
 REDIS_RDB_TYPE_SET = 2
 REDIS_RDB_TYPE_ZSET = 3
 REDIS_RDB_TYPE_HASH = 4
+REDIS_RDB_TYPE_ZSET_2 = 5
+REDIS_RDB_TYPE_MODULE = 6
+REDIS_RDB_TYPE_MODULE_2 = 7
 REDIS_RDB_TYPE_HASH_ZIPMAP = 9
 REDIS_RDB_TYPE_LIST_ZIPLIST = 10
 REDIS_RDB_TYPE_SET_INTSET = 11
 REDIS_RDB_TYPE_ZSET_ZIPLIST = 12
 REDIS_RDB_TYPE_HASH_ZIPLIST = 13
+REDIS_RDB_TYPE_LIST_QUICKLIST = 14
+REDIS_RDB_TYPE_STREAM_LISTPACKS = 15
+REDIS_RDB_TYPE_HASH_LISTPACK = 16
+REDIS_RDB_TYPE_ZSET_LISTPACK = 17
+REDIS_RDB_TYPE_LIST_QUICKLIST_2 = 18
+REDIS_RDB_TYPE_STREAM_LISTPACKS_2 = 19
+REDIS_RDB_TYPE_SET_LISTPACK = 20
+REDIS_RDB_TYPE_STREAM_LISTPACKS_3 = 21
 
 REDIS_RDB_ENC_INT8 = 0
 REDIS_RDB_ENC_INT16 = 1
 REDIS_RDB_ENC_INT32 = 2
 REDIS_RDB_ENC_LZF = 3
 
+# Scores of skiplist sorted sets stored as strings use these lengths for the special values
+REDIS_RDB_DOUBLE_NAN = 253
+REDIS_RDB_DOUBLE_POS_INF = 254
+REDIS_RDB_DOUBLE_NEG_INF = 255
+
+# Values of module types are written as a sequence of these opcodes, up to EOF
+REDIS_RDB_MODULE_OPCODE_EOF = 0
+REDIS_RDB_MODULE_OPCODE_SINT = 1
+REDIS_RDB_MODULE_OPCODE_UINT = 2
+REDIS_RDB_MODULE_OPCODE_FLOAT = 3
+REDIS_RDB_MODULE_OPCODE_DOUBLE = 4
+REDIS_RDB_MODULE_OPCODE_STRING = 5
+
+# Nodes of a QUICKLIST_2 list hold either a single element or a listpack
+QUICKLIST_NODE_CONTAINER_PLAIN = 1
+QUICKLIST_NODE_CONTAINER_PACKED = 2
+
 DATA_TYPE_MAPPING = {
-    0 : "string", 1 : "list", 2 : "set", 3 : "sortedset", 4 : "hash", 
-    9 : "hash", 10 : "list", 11 : "set", 12 : "sortedset", 13 : "hash"}
+    0 : "string", 1 : "list", 2 : "set", 3 : "sortedset", 4 : "hash", 5 : "sortedset", 6 : "module", 7 : "module",
+    9 : "hash", 10 : "list", 11 : "set", 12 : "sortedset", 13 : "hash", 14 : "list", 15 : "stream",
+    16 : "hash", 17 : "sortedset", 18 : "list", 19 : "stream", 20 : "set", 21 : "stream"}
+
+# Streams and modules are walked over, but their values are not passed to the callback
+SKIPPED_TYPES = frozenset(x for x, name in DATA_TYPE_MAPPING.items() if name in ('stream', 'module'))
+
+# The first byte of a length decides how the rest is read. Lengths that fit in the 
+# first byte and special encodings are resolved up front to a (length, is_encoded) tuple,
+# 14 and 32 bit lengths are left as None and need more bytes from the stream.
+def _build_length_prefixes():
+    prefixes = []
+    for byte in range(0, 256) :
+        enc_type = (byte & 0xC0) >> 6
+        if enc_type == REDIS_RDB_6BITLEN :
+            prefixes.append((byte & 0x3F, False))
+        elif enc_type == REDIS_RDB_ENCVAL :
+            prefixes.append((byte & 0x3F, True))
+        else :
+            prefixes.append(None)
+    return tuple(prefixes)
+
+LENGTH_PREFIXES = _build_length_prefixes()
+
+# Shared `info` objects for encodings that carry no per key information
+STRING_INFO = {'encoding':'string'}
+LINKEDLIST_INFO = {'encoding':'linkedlist'}
+HASHTABLE_INFO = {'encoding':'hashtable'}
+SKIPLIST_INFO = {'encoding':'skiplist'}
+
+# A database selector or key found by RdbParser.iter_entries
+DumpEntry = namedtuple('DumpEntry', ['offset', 'end', 'db_number', 'data_type', 'key', 'expiry'])
+
+# A key and its value, yielded by RdbParser.iter_records
+RdbRecord = namedtuple('RdbRecord', ['db_number', 'key', 'type', 'encoding', 'expiry', 'length', 'value', 'chunks'])
+
+# A key without its value, yielded by RdbParser.iter_key_info. `size` is the number of bytes 
+# the value takes in the dump file, and `length` the number of elements, or of bytes in a string.
+KeyInfo = namedtuple('KeyInfo', ['db_number', 'key', 'type', 'encoding', 'expiry', 'size', 'length'])
 
 class RdbCallback:
     """
     A Callback to handle events as the Redis dump file is parsed.
     This callback provides a serial and fast access to the dump file.
     
+    Set `wants_buffers` to True to receive uncompressed string values as 
+    zero-copy buffers (`buffer` or `memoryview`) over the memory mapped file 
+    when the parser runs with `use_mmap=True`. Buffers are only valid until 
+    the parse completes; copy them with `str()` if they must be kept.
+    
+    Set `wants_arrays` to True to receive the members of intsets, and the elements of 
+    ziplist encoded lists that are all integers of one size, as a numpy array in a single 
+    `sadd_many` or `rpush_many` call. numpy must be installed, or lists and tuples are 
+    passed as usual.
+    
+    Set `wants_raw_expiry` to True to receive expiries as the number of milliseconds 
+    since the epoch, as they are stored in the dump file, instead of as `datetime` objects. 
+    `expiry_to_datetime` converts them when a datetime is needed.
+    
+    Set `wants_dump_payloads` to True to receive every key in a single `restore` call, with its 
+    value serialized as by the redis DUMP command, instead of in the calls for its type. Values 
+    are copied from the dump file as they are, and never decoded or decompressed.
+    
+    The `info` dictionaries passed to callbacks may be shared between keys, 
+    and must be treated as read only.
+    
     """
+    wants_buffers = False
+    wants_arrays = False
+    wants_raw_expiry = False
+    wants_dump_payloads = False
+    
     def start_rdb(self):
         """
         Called once we know we are dealing with a valid redis dump file
@@ -64,13 +193,33 @@ class RdbCallback:
         """     
         pass
     
+    def aux_field(self, key, value):
+        """
+        Called for each auxiliary field of the dump file, like the redis version or the time of the dump
+        
+        `key` and `value` are strings. Dump files of redis 3.2 and later have these fields 
+        between `start_rdb` and the first `start_database`.
+        
+        """
+        pass
+    
+    def db_size(self, db_size, expires_size):
+        """
+        Called after `start_database` in dump files of redis 3.2 and later
+        
+        `db_size` is the number of keys in the database, and `expires_size` the number 
+        of those that have an expiry, which is how big the server sizes its hashtables.
+        
+        """
+        pass
+    
     def set(self, key, value, expiry, info):
         """
         Callback to handle a key with a string value and an optional expiry
         
         `key` is the redis key
         `value` is a string or a number
-        `expiry` is a datetime object. None and can be None
+        `expiry` is a datetime object, or milliseconds since the epoch with `wants_raw_expiry`. None and can be None
         `info` is a dictionary containing additional information about this object.
         
         """
@@ -81,7 +230,7 @@ class RdbCallback:
         
         `key` is the redis key
         `length` is the number of elements in this hash. 
-        `expiry` is a `datetime` object. None means the object does not expire
+        `expiry` is a `datetime` object, or milliseconds since the epoch with `wants_raw_expiry`. None means the object does not expire
         `info` is a dictionary containing additional information about this object.
         
         After `start_hash`, the method `hset` will be called with this `key` exactly `length` times.
@@ -101,6 +250,21 @@ class RdbCallback:
         """
         pass
     
+    def hset_many(self, key, pairs):
+        """
+        Callback to insert several field=value pairs in an existing hash
+        
+        `key` is the redis key for this hash
+        `pairs` is a list of (field, value) tuples, in the order `hset` would be called with them
+        
+        The parser calls this instead of `hset`, once per ziplist or zipmap, and for chunks 
+        of a hashtable. Override it to handle the elements without a method call each.
+        
+        """
+        hset = self.hset
+        for field, value in pairs :
+            hset(key, field, value)
+    
     def end_hash(self, key):
         """
         Called when there are no more elements in the hash
@@ -116,7 +280,7 @@ class RdbCallback:
         
         `key` is the redis key
         `cardinality` is the number of elements in this set
-        `expiry` is a `datetime` object. None means the object does not expire
+        `expiry` is a `datetime` object, or milliseconds since the epoch with `wants_raw_expiry`. None means the object does not expire
         `info` is a dictionary containing additional information about this object.
         
         After `start_set`, the  method `sadd` will be called with `key` exactly `cardinality` times
@@ -137,6 +301,20 @@ class RdbCallback:
         """
         pass
     
+    def sadd_many(self, key, members):
+        """
+        Callback to insert several members to this set
+        
+        `key` is the redis key for this set
+        `members` is a list of members, in the order `sadd` would be called with them
+        
+        The parser calls this instead of `sadd`, once per intset, and for chunks of a hashtable.
+        
+        """
+        sadd = self.sadd
+        for member in members :
+            sadd(key, member)
+    
     def end_set(self, key):
         """
         Called when there are no more elements in this set 
@@ -152,7 +330,7 @@ class RdbCallback:
         
         `key` is the redis key for this list
         `length` is the number of elements in this list
-        `expiry` is a `datetime` object. None means the object does not expire
+        `expiry` is a `datetime` object, or milliseconds since the epoch with `wants_raw_expiry`. None means the object does not expire
         `info` is a dictionary containing additional information about this object.
         
         After `start_list`, the method `rpush` will be called with `key` exactly `length` times
@@ -175,6 +353,20 @@ class RdbCallback:
         """
         pass
     
+    def rpush_many(self, key, values):
+        """
+        Callback to insert several values into this list
+        
+        `key` is the redis key for this list
+        `values` is a list of values, in the order `rpush` would be called with them
+        
+        The parser calls this instead of `rpush`, once per ziplist, and for chunks of a linked list.
+        
+        """
+        rpush = self.rpush
+        for value in values :
+            rpush(key, value)
+    
     def end_list(self, key):
         """
         Called when there are no more elements in this list
@@ -190,7 +382,7 @@ class RdbCallback:
         
         `key` is the redis key for this sorted
         `length` is the number of elements in this sorted set
-        `expiry` is a `datetime` object. None means the object does not expire
+        `expiry` is a `datetime` object, or milliseconds since the epoch with `wants_raw_expiry`. None means the object does not expire
         `info` is a dictionary containing additional information about this object.
         
         After `start_sorted_set`, the method `zadd` will be called with `key` exactly `length` times. 
@@ -211,6 +403,20 @@ class RdbCallback:
         """
         pass
     
+    def zadd_many(self, key, pairs):
+        """
+        Callback to insert several values into this sorted set
+        
+        `key` is the redis key for this sorted set
+        `pairs` is a list of (score, member) tuples, in the order `zadd` would be called with them
+        
+        The parser calls this instead of `zadd`, once per ziplist, and for chunks of a skiplist.
+        
+        """
+        zadd = self.zadd
+        for score, member in pairs :
+            zadd(key, score, member)
+    
     def end_sorted_set(self, key):
         """
         Called when there are no more elements in this sorted set
@@ -220,6 +426,18 @@ class RdbCallback:
         """
         pass
     
+    def restore(self, key, payload, expiry):
+        """
+        Called for every key instead of the methods above, if the callback sets `wants_dump_payloads`.
+        
+        `key` is the redis key
+        `payload` is the value, as returned by the redis DUMP command : its type and encoding as they 
+            are in the dump file, followed by the RDB version of the dump and a CRC64 checksum
+        `expiry` is a `datetime` object, or milliseconds since the epoch with `wants_raw_expiry`. None means the object does not expire
+        
+        """
+        pass
+    
     def end_database(self, db_number):
         """
         Called when the current database ends
@@ -254,111 +472,674 @@ class RdbParser :
         
         If filter is None, results will not be filtered
         If dbs, keys or types is None or Empty, no filtering will be done on that axis
+
+        keys can also be a list of regexes, and keys matching any of them are included.
+        exclude_keys leaves out keys matching a regex or a list of them. key_set and
+        exclude_key_set include only the keys in, or leave out those in, a list of exact
+        keys : a set, a `KeySet`, or the path of a file with one key per line.
+
+        ttl_min and ttl_max, in seconds, include only the keys whose time to live at as_of
+        is within them, as_of being a unix timestamp in seconds, or 'now' (the default).
+        Keys that have expired at as_of are left out as soon as either is given, and keys
+        without an expiry are only left out by ttl_max. Keys are matched on their expiry
+        alone, so the ones left out are skipped before their key is read.
+
+    If use_mmap is True, the dump file is memory mapped instead of read through a file object. 
+    Skipped objects are then seeked over instead of read, and callbacks that set `wants_buffers` 
+    receive string values as zero-copy slices of the mapped file.
+    
+    If lazy_values is True, string values and the elements of linked lists, sets, sorted sets 
+    and hashes are passed to the callback as `LazyValue` handles instead of strings. Integer 
+    encoded values are still passed as numbers. Compressed strings are only decompressed 
+    if the callback asks for the handle's value, which is all a callback that only needs 
+    lengths (like MemoryCallback) saves.
+    
+    If raw_expiry is True, or the callback sets `wants_raw_expiry`, expiries are passed to 
+    the callback, and put in the records of `iter_records` and `iter_key_info`, as integer 
+    milliseconds since the epoch instead of `datetime` objects.
+    
+    If verify_checksum is True, the CRC64 of dumps from version 5 on is computed over the bytes 
+    as they are parsed, and an exception is raised before `end_rdb` if it does not match the 
+    checksum at the end of the dump. Dump files are then read sequentially in large chunks, 
+    or checksummed from the mapping once parsed with `use_mmap`.
     """
-    def __init__(self, callback, filters = None) :
+    def __init__(self, callback, filters = None, use_mmap = False, lazy_values = False, verify_checksum = False,
+                 raw_expiry = False) :
         """
             `callback` is the object that will receive parse events
         """
         self._callback = callback
         self._key = None
         self._expiry = None
+        self._expiry_ms = None
+        self._version = None
+        self._use_mmap = use_mmap
+        self._lazy_values = lazy_values
+        self._verify_checksum = verify_checksum
+        self._raw_expiry = raw_expiry
+        self._read_checksums = None
+        if lazy_values :
+            self._read_value = self.read_string_lazy
+        else :
+            self._read_value = self.read_string
+        self._lzf = LzfDecompressor()
+        self._object_readers = {
+            REDIS_RDB_TYPE_STRING : self.read_string_object,
+            REDIS_RDB_TYPE_LIST : self.read_list,
+            REDIS_RDB_TYPE_SET : self.read_set,
+            REDIS_RDB_TYPE_ZSET : self.read_zset,
+            REDIS_RDB_TYPE_HASH : self.read_hash,
+            REDIS_RDB_TYPE_HASH_ZIPMAP : self.read_zipmap,
+            REDIS_RDB_TYPE_LIST_ZIPLIST : self.read_ziplist,
+            REDIS_RDB_TYPE_SET_INTSET : self.read_intset,
+            REDIS_RDB_TYPE_ZSET_ZIPLIST : self.read_zset_from_ziplist,
+            REDIS_RDB_TYPE_HASH_ZIPLIST : self.read_hash_from_ziplist,
+            REDIS_RDB_TYPE_ZSET_2 : self.read_zset_2,
+            REDIS_RDB_TYPE_LIST_QUICKLIST : self.read_quicklist,
+            REDIS_RDB_TYPE_LIST_QUICKLIST_2 : self.read_quicklist_2,
+            REDIS_RDB_TYPE_HASH_LISTPACK : self.read_hash_from_listpack,
+            REDIS_RDB_TYPE_ZSET_LISTPACK : self.read_zset_from_listpack,
+            REDIS_RDB_TYPE_SET_LISTPACK : self.read_set_from_listpack,
+        }
+        for data_type in SKIPPED_TYPES :
+            self._object_readers[data_type] = lambda f, data_type=data_type : self.skip_object(f, data_type)
+        self.bind_callback()
         self.init_filter(filters)
 
+    def bind_callback(self):
+        """Looks up the callback methods once, instead of once per key or element"""
+        callback = self._callback
+        self._set = callback.set
+        self._start_hash = callback.start_hash
+        self._end_hash = callback.end_hash
+        self._start_set = callback.start_set
+        self._end_set = callback.end_set
+        self._start_list = callback.start_list
+        self._end_list = callback.end_list
+        self._start_sorted_set = callback.start_sorted_set
+        self._end_sorted_set = callback.end_sorted_set
+        # Callbacks that do not derive from RdbCallback may not have the batch methods
+        self._hset_many = getattr(callback, 'hset_many', None) or _call_each_pair(callback.hset)
+        self._sadd_many = getattr(callback, 'sadd_many', None) or _call_each(callback.sadd)
+        self._rpush_many = getattr(callback, 'rpush_many', None) or _call_each(callback.rpush)
+        self._zadd_many = getattr(callback, 'zadd_many', None) or _call_each_pair(callback.zadd)
+        self._aux_field = getattr(callback, 'aux_field', None) or _ignore
+        self._db_size = getattr(callback, 'db_size', None) or _ignore
+        if getattr(callback, 'wants_dump_payloads', False) :
+            self._restore = callback.restore
+        else :
+            self._restore = None
+        self._wants_raw_expiry = self._raw_expiry or getattr(callback, 'wants_raw_expiry', False)
+        # Arrays are only handed to the batch methods, never split into elements for sadd or rpush
+        self._wants_arrays = numpy is not None and getattr(callback, 'wants_arrays', False) and \
+            hasattr(callback, 'sadd_many') and hasattr(callback, 'rpush_many')
+
     def parse(self, filename):
         """
         Parse a redis rdb dump file, and call methods in the 
         callback object during the parsing operation.
+        
+        Dump files compressed with gzip, bzip2, xz or zstd, or archived with tar, are 
+        decompressed as they are parsed (see `parse_stream`), without `use_mmap`.
         """
         with open(filename, "rb") as f:
-            #读取“REDIS”，如果不是该值，则报错
-            self.verify_magic_string(f.read(5))
-            #读取数据库的版本号"001--006"
-            self.verify_version(f.read(4))
-            self._callback.start_rdb()
-            
-            is_first_database = True
-            db_number = 0
-            while True :
-                self._expiry = None
-                #读取下一个无符号字符,系统的一些常量使用的都是用无符号的字符表示的
-                data_type = read_unsigned_char(f)
-
-                ####下面的if-else用于获取过期时间，最终获取的过期时间的单位是微秒，如果过期时间是毫秒，则按long类型读取，
-                ####如果过期时间是秒，则按
-                #判断是否是“过期时间（毫秒）”的标识
-                if data_type == REDIS_RDB_OPCODE_EXPIRETIME_MS :
-                    #读取并设置过期时间
-                    self._expiry = to_datetime(read_unsigned_long(f) * 1000)
-                    #读取下一个数据类型（无符号字符）
-                    data_type = read_unsigned_char(f)
-                #判断是否是“过期时间(秒)”的标识
-                elif data_type == REDIS_RDB_OPCODE_EXPIRETIME :
-                    self._expiry = to_datetime(read_unsigned_int(f) * 1000000)
-                    data_type = read_unsigned_char(f)
-                
-
-                ####下面的if-else用户获取数据库选择，
-                if data_type == REDIS_RDB_OPCODE_SELECTDB :
-                    if not is_first_database :
-                        self._callback.end_database(db_number)
-                    is_first_database = False
-                    db_number = self.read_length(f)
-                    self._callback.start_database(db_number)
-                    continue
-                
-                ####用于判断读取rdb文件是否结束
-                if data_type == REDIS_RDB_OPCODE_EOF :
+            is_compressed = f.read(len(RDB_MAGIC)) != RDB_MAGIC
+            f.seek(0)
+            if is_compressed or (self._verify_checksum and not self._use_mmap) :
+                self.parse_stream(f)
+                return
+            if not self._use_mmap :
+                self._parse(f)
+                return
+            reader = MmapReader(f.fileno(), 0, access=mmap.ACCESS_READ)
+            read_value = self._read_value
+            try :
+                if not self._lazy_values and getattr(self._callback, 'wants_buffers', False) :
+                    self._read_value = self.read_string_buffer
+                self._read_checksums = read_mapped_checksums
+                self._parse(reader)
+            finally :
+                self._read_value = read_value
+                self._read_checksums = None
+                reader.close()
+
+    def parse_stream(self, f, buffer_size = STREAM_BUFFER_SIZE):
+        """
+        Parse a dump file from the file object `f`, and call methods in the 
+        callback object during the parsing operation.
+        
+        `f` only needs a `read` method, so it can be a pipe, sys.stdin, a socket's makefile() 
+        or a decompressor. It is read ahead `buffer_size` bytes at a time, and never seeked.
+        Compressed and archived dumps are recognised and decompressed on the fly, as by 
+        `rdbtools.compression.open_dump_stream`.
+        """
+        f = open_dump_stream(f)
+        if not self._verify_checksum :
+            self._parse(StreamReader(f, buffer_size))
+            return
+        checksum_reader = ChecksumReader(f)
+        self._read_checksums = lambda f : read_stream_checksums(f, checksum_reader)
+        try :
+            self._parse(StreamReader(checksum_reader, buffer_size))
+        finally :
+            self._read_checksums = None
+
+    def parse_bytes(self, data):
+        """Parse a dump file held in memory as a string, which may be compressed like in `parse_stream`"""
+        if data.startswith(RDB_MAGIC) and not self._verify_checksum :
+            self._parse(io.BytesIO(data))
+        else :
+            self.parse_stream(io.BytesIO(data))
+
+    def parse_dump_payload(self, key, payload):
+        """
+        Parse the value of a single key, as returned by the redis DUMP command.
+        
+        Only the key level methods of the callback are called, with no expiry. The RDB 
+        version and checksum at the end of the payload are not verified.
+        """
+        f = io.BytesIO(payload)
+        self._key = key
+        self._expiry = None
+        self._version = DUMP_PAYLOAD_VERSION.unpack_from(payload, len(payload) - 10)[0]
+        self.read_object(f, ord(f.read(1)))
+
+    def _parse(self, f):
+        #读取“REDIS”，如果不是该值，则报错
+        self.verify_magic_string(f.read(5))
+        #读取数据库的版本号"001--006"
+        self._version = version = self.verify_version(f.read(4))
+        self._callback.start_rdb()
+        
+        is_first_database = True
+        db_number = 0
+        while True :
+            data_type = self.read_data_type(f)
+
+            ####下面的if-else用户获取数据库选择，
+            if data_type == REDIS_RDB_OPCODE_SELECTDB :
+                if not is_first_database :
                     self._callback.end_database(db_number)
-                    self._callback.end_rdb()
-                    break
-
-                ####判断数据库编号(db_number)是否在类的dbs中
-                if self.matches_filter(db_number) :
-                    #读取key信息，key肯定是字符串
-                    self._key = self.read_string(f)
-                    if self.matches_filter(db_number, self._key, data_type):
-                        self.read_object(f, data_type)
-                    else:
-                        self.skip_object(f, data_type)
-                else :
-                    self.skip_key_and_object(f, data_type)
+                is_first_database = False
+                db_number = self.read_length(f)
+                self._callback.start_database(db_number)
+                continue
+            
+            ####用于判断读取rdb文件是否结束
+            if data_type == REDIS_RDB_OPCODE_EOF :
+                self._callback.end_database(db_number)
+                if self._verify_checksum and version >= CHECKSUM_VERSION :
+                    verify_checksum(*self._read_checksums(f))
+                self._callback.end_rdb()
+                break
+
+            self.read_key_and_object(f, db_number, data_type)
+
+    def parse_range(self, filename, start, end, db_number):
+        """
+        Parse the keys between the byte offsets `start` and `end` of a dump file.
+        
+        Both offsets must lie on key boundaries within database `db_number`, as reported 
+        by `iter_entries`. Only the key level methods of the callback are called; 
+        `start_rdb`, `start_database`, `end_database` and `end_rdb` are not.
+        """
+        with open(filename, "rb") as f:
+            if self._use_mmap :
+                reader = MmapReader(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else :
+                reader = f
+            try :
+                self.read_header(reader)
+                reader.seek(start)
+                while reader.tell() < end :
+                    data_type = self.read_data_type(reader)
+                    if data_type == REDIS_RDB_OPCODE_SELECTDB or data_type == REDIS_RDB_OPCODE_EOF :
+                        raise Exception('parse_range', 'Range %d-%d is not within database %d' % (start, end, db_number))
+                    self.read_key_and_object(reader, db_number, data_type)
+            finally :
+                if reader is not f :
+                    reader.close()
+
+    def iter_entries(self, filename, read_keys = False):
+        """
+        Walk a dump file without decoding any values, and yield a `DumpEntry` 
+        for every database selector and key.
+        
+        `offset` and `end` are the byte offsets at which the entry starts and ends, including 
+        the expiry. Keys are only read if `read_keys` is True, and `expiry` is in 
+        milliseconds since the epoch. Filters are not applied.
+        """
+        with open(filename, "rb") as f:
+            reader = MmapReader(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try :
+                self.verify_magic_string(reader.read(5))
+                self.verify_version(reader.read(4))
+                db_number = 0
+                while True :
+                    offset = reader.tell()
+                    data_type, expiry = self.read_data_type_with_expiry(reader)
+                    if data_type == REDIS_RDB_OPCODE_EOF :
+                        break
+                    if data_type == REDIS_RDB_OPCODE_SELECTDB :
+                        db_number = self.read_length(reader)
+                        yield DumpEntry(offset, reader.tell(), db_number, data_type, None, None)
+                        continue
+                    if read_keys :
+                        self._key = key = self.read_string(reader)
+                    else :
+                        key = None
+                        self.skip_string(reader)
+                    self.skip_object(reader, data_type)
+                    yield DumpEntry(offset, reader.tell(), db_number, data_type, key, expiry)
+            finally :
+                reader.close()
+
+    def get(self, filename, db_number, key, index_file = None):
+        """
+        Decode a single key of a dump file, using the index written by `rdbtools.index.build_index`.
+
+        The index is binary searched for `key` in database `db_number`, and only that object is
+        read from the dump. The callback sees `start_rdb` and `start_database`, the events of the
+        key, then `end_database` and `end_rdb`, as if the dump held nothing else. Filters are not applied.
+
+        Returns True if the key was found, and False otherwise.
+        """
+        from rdbtools.index import RdbIndex, index_path
+        with RdbIndex(index_file or index_path(filename)) as index :
+            if not index.matches(filename) :
+                raise Exception('get', 'Index %s is out of date for %s' % (index_file or index_path(filename), filename))
+            entry = index.lookup(db_number, key)
+        if entry is None :
+            return False
+        with open(filename, "rb") as f:
+            if self._use_mmap :
+                reader = MmapReader(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else :
+                reader = f
+            try :
+                self.read_header(reader)
+                reader.seek(entry.offset)
+                data_type = self.read_data_type(reader)
+                self._key = self.read_string(reader)
+                if str(self._key) != entry.key :
+                    raise Exception('get', 'Expected key %s at offset %d, found %s' % (entry.key, entry.offset, self._key))
+                self._callback.start_rdb()
+                self._callback.start_database(db_number)
+                self.read_object(reader, data_type)
+                self._callback.end_database(db_number)
+                self._callback.end_rdb()
+            finally :
+                if reader is not f :
+                    reader.close()
+        return True
+
+    def iter_records(self, filename, materialize_limit = ELEMENT_BATCH_SIZE):
+        """
+        Parse a dump file, and yield an `RdbRecord` for every key that matches the filters.
+        
+        `type` is the logical type (string, list, set, sortedset or hash), `encoding` is 
+        the encoding in the dump file, and `expiry` is a `datetime` or None, or milliseconds 
+        since the epoch with `raw_expiry`.
+        
+        Strings have their value in `value`. Collections of up to `materialize_limit` 
+        elements are read whole into `value`: a list, a set, a dict, or a list of 
+        (score, member) tuples for sorted sets, and `length` is the number of elements.
+        Larger linked lists, hashtables and skiplists are not read up front. Their `value` 
+        is None, and `chunks` iterates over lists of at most ELEMENT_BATCH_SIZE elements, 
+        shaped as above. The chunks must be used before the next record is asked for, 
+        and whatever was not used is then skipped.
+        
+        Reading stops as soon as the iteration does, for instance with `break`.
+        
+        Typical usage :
+            for record in parser.iter_records('/var/redis/6379/dump.rdb'):
+                if record.chunks is None:
+                    print(record.key, record.value)
+        """
+        # Strings and compact encodings are read through the usual callback 
+        # methods, into a collector, by a parser that shares this one's settings
+        collector = RecordCollector()
+        reader = RdbParser(collector, use_mmap = self._use_mmap, lazy_values = self._lazy_values, raw_expiry = self._raw_expiry)
+        reader._filters = self._filters
+        return reader._iter_records(filename, collector, materialize_limit)
+
+    def _iter_records(self, filename, collector, materialize_limit):
+        element_readers = {
+            REDIS_RDB_TYPE_LIST : ('list', LINKEDLIST_INFO, self.read_values, self.skip_string, list),
+            REDIS_RDB_TYPE_SET : ('set', HASHTABLE_INFO, self.read_values, self.skip_string, set),
+            REDIS_RDB_TYPE_ZSET : ('sortedset', SKIPLIST_INFO, self.read_zset_pairs, self.skip_zset_pair, list),
+            REDIS_RDB_TYPE_HASH : ('hash', HASHTABLE_INFO, self.read_hash_pairs, self.skip_hash_pair, dict),
+            REDIS_RDB_TYPE_ZSET_2 : ('sortedset', SKIPLIST_INFO, self.read_zset_2_pairs, self.skip_zset_2_pair, list),
+        }
+        with open(filename, "rb") as f:
+            is_compressed = f.read(len(RDB_MAGIC)) != RDB_MAGIC
+            f.seek(0)
+            if is_compressed :
+                reader = StreamReader(open_dump_stream(f))
+            elif self._use_mmap :
+                reader = MmapReader(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else :
+                reader = f
+            try :
+                self.verify_magic_string(reader.read(5))
+                self.verify_version(reader.read(4))
+                db_number = 0
+                while True :
+                    data_type = self.read_data_type(reader)
+                    if data_type == REDIS_RDB_OPCODE_SELECTDB :
+                        db_number = self.read_length(reader)
+                        continue
+                    if data_type == REDIS_RDB_OPCODE_EOF :
+                        break
+                    if not (self.matches_filter(db_number) and self.matches_expiry(self._expiry_ms)) :
+                        self.skip_key_and_object(reader, data_type)
+                        continue
+                    self._key = key = self.read_string(reader)
+                    if not (self._filters['all_keys'] or self.matches_filter(db_number, key, data_type)) or \
+                            data_type in SKIPPED_TYPES :
+                        self.skip_object(reader, data_type)
+                        continue
+                    if not data_type in element_readers :
+                        self.read_object(reader, data_type)
+                        yield collector.record(db_number)
+                        continue
+                    logical_type, info, read_elements, skip_element, materialize = element_readers[data_type]
+                    length = self.read_length(reader)
+                    if length <= materialize_limit :
+                        if length <= ELEMENT_BATCH_SIZE :
+                            value = materialize(read_elements(reader, length))
+                        else :
+                            chunks = ElementChunks(reader, length, read_elements, skip_element)
+                            value = materialize(itertools.chain.from_iterable(chunks))
+                        yield RdbRecord(db_number, key, logical_type, info['encoding'], self._expiry, length, value, None)
+                    else :
+                        chunks = ElementChunks(reader, length, read_elements, skip_element)
+                        yield RdbRecord(db_number, key, logical_type, info['encoding'], self._expiry, length, None, chunks)
+                        chunks.skip_rest()
+            finally :
+                if reader is not f :
+                    reader.close()
+
+    def iter_key_info(self, filename):
+        """
+        Walk a dump file without decoding values, and yield a `KeyInfo` for every key that 
+        matches the filters.
+        
+        Strings are seeked over, and the number of elements of ziplists, intsets and zipmaps 
+        is read from their header, decompressing no more of them than the header. Linked 
+        lists, hashtables and skiplists are walked, but their elements are skipped, not read.
+        Dump files are memory mapped, unless they are compressed.
+        """
+        with open(filename, "rb") as f:
+            is_compressed = f.read(len(RDB_MAGIC)) != RDB_MAGIC
+            f.seek(0)
+            if is_compressed :
+                reader = StreamReader(open_dump_stream(f))
+            else :
+                reader = MmapReader(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try :
+                for info in self._iter_key_info(reader) :
+                    yield info
+            finally :
+                reader.close()
+
+    def iter_key_info_stream(self, f, buffer_size = STREAM_BUFFER_SIZE):
+        """Like `iter_key_info`, but reads the dump from a file object, as `parse_stream` does"""
+        return self._iter_key_info(StreamReader(open_dump_stream(f), buffer_size))
+
+    def _iter_key_info(self, f):
+        length_readers = {
+            REDIS_RDB_TYPE_STRING : self.read_string_length,
+            REDIS_RDB_TYPE_LIST : self.read_list_length,
+            REDIS_RDB_TYPE_SET : self.read_set_length,
+            REDIS_RDB_TYPE_ZSET : self.read_zset_length,
+            REDIS_RDB_TYPE_HASH : self.read_hash_length,
+            REDIS_RDB_TYPE_HASH_ZIPMAP : self.read_zipmap_length,
+            REDIS_RDB_TYPE_LIST_ZIPLIST : self.read_ziplist_length,
+            REDIS_RDB_TYPE_SET_INTSET : self.read_intset_length,
+            REDIS_RDB_TYPE_ZSET_ZIPLIST : self.read_ziplist_pairs_length,
+            REDIS_RDB_TYPE_HASH_ZIPLIST : self.read_ziplist_pairs_length,
+            REDIS_RDB_TYPE_ZSET_2 : self.read_zset_2_length,
+            REDIS_RDB_TYPE_LIST_QUICKLIST : self.read_quicklist_length,
+            REDIS_RDB_TYPE_LIST_QUICKLIST_2 : self.read_quicklist_2_length,
+            REDIS_RDB_TYPE_HASH_LISTPACK : self.read_listpack_pairs_length,
+            REDIS_RDB_TYPE_ZSET_LISTPACK : self.read_listpack_pairs_length,
+            REDIS_RDB_TYPE_SET_LISTPACK : self.read_listpack_length,
+            REDIS_RDB_TYPE_MODULE_2 : self.read_module_length,
+        }
+        for data_type in (REDIS_RDB_TYPE_STREAM_LISTPACKS, REDIS_RDB_TYPE_STREAM_LISTPACKS_2, REDIS_RDB_TYPE_STREAM_LISTPACKS_3) :
+            length_readers[data_type] = lambda f, data_type=data_type : ('stream', self.skip_stream(f, data_type))
+        self.verify_magic_string(f.read(5))
+        self.verify_version(f.read(4))
+        db_number = 0
+        while True :
+            data_type = self.read_data_type(f)
+            if data_type == REDIS_RDB_OPCODE_SELECTDB :
+                db_number = self.read_length(f)
+                continue
+            if data_type == REDIS_RDB_OPCODE_EOF :
+                break
+            if not (self.matches_filter(db_number) and self.matches_expiry(self._expiry_ms)) :
+                self.skip_key_and_object(f, data_type)
+                continue
+            self._key = key = self.read_string(f)
+            if not (self._filters['all_keys'] or self.matches_filter(db_number, key, data_type)) :
+                self.skip_object(f, data_type)
+                continue
+            read_length = length_readers.get(data_type)
+            if read_length is None :
+                raise Exception('iter_key_info', 'Invalid object type %d for key %s' % (data_type, key))
+            start = f.tell()
+            encoding, length = read_length(f)
+            yield KeyInfo(db_number, key, DATA_TYPE_MAPPING[data_type], encoding, self._expiry, f.tell() - start, length)
+
+    def read_string_length(self, f) :
+        length, is_encoded = self.read_length_with_encoding(f)
+        if is_encoded :
+            if length == REDIS_RDB_ENC_INT8 :
+                return 'string', len(str(read_signed_char(f)))
+            elif length == REDIS_RDB_ENC_INT16 :
+                return 'string', len(str(read_signed_short(f)))
+            elif length == REDIS_RDB_ENC_INT32 :
+                return 'string', len(str(read_signed_int(f)))
+            elif length == REDIS_RDB_ENC_LZF :
+                clen = self.read_length(f)
+                l = self.read_length(f)
+                skip(f, clen)
+                return 'string', l
+            raise Exception('read_string_length', 'Invalid string encoding %d for key %s' % (length, self._key))
+        skip(f, length)
+        return 'string', length
+
+    def read_list_length(self, f) :
+        length = self.read_length(f)
+        self.skip_strings(f, length)
+        return 'linkedlist', length
+
+    def read_set_length(self, f) :
+        return 'hashtable', self.read_list_length(f)[1]
+
+    def read_zset_length(self, f) :
+        length = self.read_length(f)
+        for x in xrange(0, length) :
+            self.skip_zset_pair(f)
+        return 'skiplist', length
+
+    def read_hash_length(self, f) :
+        length = self.read_length(f)
+        self.skip_strings(f, length * 2)
+        return 'hashtable', length
+
+    def read_intset_length(self, f) :
+        # encoding, then the number of entries
+        header = lambda data : UNSIGNED_INT.unpack_from(data, 4)[0]
+        return 'intset', self.read_compact_length(f, 8, header, header)
+
+    def read_ziplist_length(self, f) :
+        return 'ziplist', self.read_compact_length(f, 10, ziplist_header_length, self.count_ziplist_entries)
+
+    def read_ziplist_pairs_length(self, f) :
+        return 'ziplist', self.read_compact_length(f, 10, ziplist_header_length, self.count_ziplist_entries) // 2
+
+    def read_zipmap_length(self, f) :
+        return 'zipmap', self.read_compact_length(f, 1, zipmap_header_length, self.count_zipmap_entries)
+
+    def read_zset_2_length(self, f) :
+        length = self.read_length(f)
+        for x in xrange(0, length) :
+            self.skip_zset_2_pair(f)
+        return 'skiplist', length
+
+    def read_quicklist_length(self, f) :
+        count = 0
+        for x in xrange(0, self.read_length(f)) :
+            count += self.read_compact_length(f, 10, ziplist_header_length, self.count_ziplist_entries)
+        return 'quicklist', count
+
+    def read_quicklist_2_length(self, f) :
+        count = 0
+        for x in xrange(0, self.read_length(f)) :
+            if self.read_length(f) == QUICKLIST_NODE_CONTAINER_PLAIN :
+                self.skip_string(f)
+                count += 1
+            else :
+                count += self.read_compact_length(f, 6, listpack_header_length, self.count_listpack_entries)
+        return 'quicklist', count
+
+    def read_listpack_length(self, f) :
+        return 'listpack', self.read_compact_length(f, 6, listpack_header_length, self.count_listpack_entries)
+
+    def read_listpack_pairs_length(self, f) :
+        return 'listpack', self.read_listpack_length(f)[1] // 2
+
+    def read_module_length(self, f) :
+        # modules do not tell how many elements they hold
+        self.skip_module(f)
+        return 'module', 0
+
+    def read_compact_length(self, f, header_size, read_header, count_entries) :
+        """
+        Returns the number of entries of a ziplist, intset or zipmap, from its first `header_size` bytes,
+        and skips the rest of it. `read_header` returns the number of entries from the header, or None 
+        if the header cannot tell, in which case the whole string is read and `count_entries` walks it.
+        """
+        length, is_encoded = self.read_length_with_encoding(f)
+        if is_encoded and length == REDIS_RDB_ENC_LZF :
+            clen = self.read_length(f)
+            l = self.read_length(f)
+            compressed = f.read(min(clen, LZF_HEADER_INPUT))
+            header = self._lzf.decompress_prefix(compressed, header_size)[:header_size]
+            count = read_header(header) if len(header) == header_size else None
+            if count is not None :
+                skip(f, clen - len(compressed))
+                return count
+            return count_entries(self.lzf_decompress(compressed + f.read(clen - len(compressed)), l))
+        elif is_encoded :
+            raise Exception('read_compact_length', 'Invalid string encoding %d for key %s' % (length, self._key))
+        header = f.read(min(length, header_size))
+        count = read_header(header) if len(header) == header_size else None
+        if count is not None :
+            skip(f, length - len(header))
+            return count
+        return count_entries(header + f.read(length - len(header)))
+
+    def count_ziplist_entries(self, data) :
+        return len(self.decode_ziplist(data))
+
+    def count_listpack_entries(self, data) :
+        return len(self.decode_listpack(data))
+
+    def count_zipmap_entries(self, data) :
+        return len(self.decode_zipmap(data))
+
+    def read_data_type_with_expiry(self, f):
+        """
+        Read the next object type or opcode, along with the expiry in milliseconds 
+        since the epoch if the object has one.
+        
+        The opcodes in between are read as well : auxiliary fields and database sizes 
+        are passed to the callback, and the idle time or access frequency of the key is skipped.
+        """
+        expiry = None
+        while True :
+            #读取下一个无符号字符,系统的一些常量使用的都是用无符号的字符表示的
+            data_type = ord(f.read(1))
+            #对象类型，SELECTDB和EOF直接返回
+            if data_type < REDIS_RDB_OPCODE_FUNCTION2 or data_type >= REDIS_RDB_OPCODE_SELECTDB :
+                return data_type, expiry
+            ####下面的if-else用于获取过期时间，最终获取的过期时间的单位是毫秒，如果过期时间是毫秒，则按long类型读取，
+            #判断是否是“过期时间（毫秒）”的标识
+            if data_type == REDIS_RDB_OPCODE_EXPIRETIME_MS :
+                expiry = read_unsigned_long(f)
+            #判断是否是“过期时间(秒)”的标识
+            elif data_type == REDIS_RDB_OPCODE_EXPIRETIME :
+                expiry = read_unsigned_int(f) * 1000
+            else :
+                self.read_metadata(f, data_type)
+
+    def read_metadata(self, f, opcode):
+        """Read an opcode that comes before a key or a database, or at the start or end of the dump file"""
+        if opcode == REDIS_RDB_OPCODE_IDLE :
+            # seconds since the key was last used, for the LRU eviction policies
+            self.read_length(f)
+        elif opcode == REDIS_RDB_OPCODE_FREQ :
+            # logarithmic access counter, for the LFU eviction policies
+            skip(f, 1)
+        elif opcode == REDIS_RDB_OPCODE_AUX :
+            self._aux_field(self.read_string(f), self.read_string(f))
+        elif opcode == REDIS_RDB_OPCODE_RESIZEDB :
+            self._db_size(self.read_length(f), self.read_length(f))
+        elif opcode == REDIS_RDB_OPCODE_MODULE_AUX :
+            # module id, then when the module saves its data, as an unsigned int opcode and the value
+            for x in xrange(0, 3) :
+                self.read_length(f)
+            self.skip_module_value(f)
+        elif opcode == REDIS_RDB_OPCODE_FUNCTION2 :
+            # the code of a library of functions
+            self.skip_string(f)
+        else :
+            raise Exception('read_metadata', 'Unsupported opcode %d' % opcode)
+
+    def read_data_type(self, f):
+        """Read the next object type or opcode, and set the expiry of the object that follows"""
+        data_type, expiry = self.read_data_type_with_expiry(f)
+        self._expiry_ms = expiry
+        if expiry is None or self._wants_raw_expiry :
+            self._expiry = expiry
+        else :
+            self._expiry = to_datetime(expiry * 1000)
+        return data_type
+
+    def read_key_and_object(self, f, db_number, data_type):
+        ####判断数据库编号(db_number)是否在类的dbs中
+        if self.matches_filter(db_number) and self.matches_expiry(self._expiry_ms) :
+            #读取key信息，key肯定是字符串
+            self._key = self.read_string(f)
+            if self._filters['all_keys'] or self.matches_filter(db_number, self._key, data_type):
+                self.read_object(f, data_type)
+            else:
+                self.skip_object(f, data_type)
+        else :
+            self.skip_key_and_object(f, data_type)
 
     ####*****************************
     ####当读取的字符是db_number时，判断长度：0-63使用1个字节表示， 64-16383使用两个字节表示，16383-2^32-1使用5个直接表示
     ####*****************************
     def read_length_with_encoding(self, f) :
-        length = 0
-        is_encoded = False
-        bytes = []
-        #读取无符号字符：return struct.unpack('B', f.read(1))[0]
-        bytes.append(read_unsigned_char(f))
-        ####bytes[0] & 11000000 >> 6----就是用来获取bytes[0]的前两位，判断这两位的数值，可能是：01, 11, 10, 00
-        enc_type = (bytes[0] & 0xC0) >> 6
-        
-        #如果enc_type为 11==3， 则表示剩下的六位是一个特殊字符
-        ####由此处和read_string方法可以看出如果enc_type==3，那么后六位的值只可能是以下4种：00, 01, 10, 11
-        ####00代表：要读取的值为带符号的一个字节
-        ####01代表：要读取的值为带符号的两个字节
-        ####10代表：要读取的值为带符号的四个字节
-        ####11代表：要读取的数据是LZF压缩后的。压缩的格式遵循 compress_lenth origin_lenth str
-        if enc_type == REDIS_RDB_ENCVAL :
-            is_encoded = True
-            #0x3F的二进制表示为：111111，下面的操作是为了获取后6位
-            length = bytes[0] & 0x3F
-        #如果enc_type是 00==0，则表示剩下的六位是具体的长度
-        elif enc_type == REDIS_RDB_6BITLEN :
-            #0x3F的二进制表示为：111111，下面的操作是为了获取后6位
-            length = bytes[0] & 0x3F
+        first = ord(f.read(1))
+        prefix = LENGTH_PREFIXES[first]
+        if prefix is not None :
+            return prefix
         #如果enc_type是 01==1， 则表示再读取1个字节，加上前面的6位，一共14位表示具体的长度
-        elif enc_type == REDIS_RDB_14BITLEN :
-            #读取流中的下一位
-            bytes.append(read_unsigned_char(f))
-            #0x3F的二进制表示为：111111，和bytes[0]进行按位与，获取byte[0]的后6为，左移8位与byte[1]组成一个14位的数值
-            length = ((bytes[0]&0x3F)<<8)|bytes[1]
-        #如果enc_type是10==2， 则表示剩下六位废弃，再读取后面的4个字节，作为长度
-        else :
-            length = ntohl(f)
-        return (length, is_encoded)
+        if (first & 0xC0) >> 6 == REDIS_RDB_14BITLEN :
+            return (((first & 0x3F) << 8) | ord(f.read(1)), False)
+        #如果第一个字节是0x80，则再读取后面的4个字节，作为长度
+        if first == REDIS_RDB_32BITLEN_PREFIX :
+            return (read_big_endian_unsigned_int(f), False)
+        #如果第一个字节是0x81，则再读取后面的8个字节，作为长度
+        if first == REDIS_RDB_64BITLEN_PREFIX :
+            return (read_big_endian_unsigned_long(f), False)
+        raise Exception('read_length', 'Invalid length encoding %d for key %s' % (first, self._key))
 
     def read_length(self, f) :
         return self.read_length_with_encoding(f)[0]
@@ -368,11 +1149,8 @@ class RdbParser :
     ####非压缩字符串的结构：lenth  val
     ####压缩字符串的结构：  REDIS_RDB_ENC_LZF  compress_lenth  origin_lenth val
     def read_string(self, f) :
-        #tup是一个包含lenth和is_encoded的元组
-        tup = self.read_length_with_encoding(f)
         #获取长度和是否编码
-        length = tup[0]
-        is_encoded = tup[1]
+        length, is_encoded = self.read_length_with_encoding(f)
         val = None
         #is_encoded用来表示是否进行了编码处理
         if is_encoded :
@@ -391,74 +1169,185 @@ class RdbParser :
             val = f.read(length)
         return val
 
+    def read_string_buffer(self, f) :
+        """Like `read_string`, but returns uncompressed strings as a zero-copy buffer over a `MmapReader`"""
+        length, is_encoded = self.read_length_with_encoding(f)
+        if is_encoded :
+            if length == REDIS_RDB_ENC_INT8 :
+                return read_signed_char(f)
+            elif length == REDIS_RDB_ENC_INT16 :
+                return read_signed_short(f)
+            elif length == REDIS_RDB_ENC_INT32 :
+                return read_signed_int(f)
+            elif length == REDIS_RDB_ENC_LZF :
+                clen = self.read_length(f)
+                l = self.read_length(f)
+                return self.lzf_decompress(f.read(clen), l)
+            return None
+        return f.read_buffer(length)
+
+    def read_string_lazy(self, f) :
+        """Like `read_string`, but returns strings as a `LazyValue` that is decoded on access"""
+        length, is_encoded = self.read_length_with_encoding(f)
+        if isinstance(f, MmapReader) :
+            read = f.read_buffer
+        else :
+            read = f.read
+        if is_encoded :
+            if length == REDIS_RDB_ENC_INT8 :
+                return read_signed_char(f)
+            elif length == REDIS_RDB_ENC_INT16 :
+                return read_signed_short(f)
+            elif length == REDIS_RDB_ENC_INT32 :
+                return read_signed_int(f)
+            elif length == REDIS_RDB_ENC_LZF :
+                clen = self.read_length(f)
+                l = self.read_length(f)
+                return LazyValue('lzf', l, clen, read(clen), self.lzf_decompress)
+            return None
+        return LazyValue('raw', length, length, read(length))
+
     # Read an object for the stream
     # f is the redis file 
     # enc_type is the type of object
     ####读取对象，f是流， enc_type是对象的类型，对象的类型应该是
     def read_object(self, f, enc_type) :
-        #字符串类型
-        if enc_type == REDIS_RDB_TYPE_STRING :
-            val = self.read_string(f)
-            self._callback.set(self._key, val, self._expiry, info={'encoding':'string'})
-        #list类型
-        elif enc_type == REDIS_RDB_TYPE_LIST :
-            # A redis list is just a sequence of strings
-            # We successively read strings from the stream and create a list from it
-            # The lists are in order i.e. the first string is the head, 
-            # and the last string is the tail of the list
-            ####---------------------LIST的结构-------------------
-            ####| lenth  |  item1  |  item2  |  ...  |  item N  |
-            ####-------------------------------------------------
-            length = self.read_length(f)
-            self._callback.start_list(self._key, length, self._expiry, info={'encoding':'linkedlist' })
-            for count in xrange(0, length) :
-                val = self.read_string(f)
-                self._callback.rpush(self._key, val)
-            self._callback.end_list(self._key)
-        #set类型
-        elif enc_type == REDIS_RDB_TYPE_SET :
-            # A redis list is just a sequence of strings
-            # We successively read strings from the stream and create a set from it
-            # Note that the order of strings is non-deterministic
-            length = self.read_length(f)
-            self._callback.start_set(self._key, length, self._expiry, info={'encoding':'hashtable'})
-            for count in xrange(0, length) :
-                val = self.read_string(f)
-                self._callback.sadd(self._key, val)
-            self._callback.end_set(self._key)
-        #zset类型
-        elif enc_type == REDIS_RDB_TYPE_ZSET :
-            length = self.read_length(f)
-            self._callback.start_sorted_set(self._key, length, self._expiry, info={'encoding':'skiplist'})
-            for count in xrange(0, length) :
-                val = self.read_string(f)
-                dbl_length = read_unsigned_char(f)
-                score = f.read(dbl_length)
-                if isinstance(score, str):
-                    score = float(score)
-                self._callback.zadd(self._key, score, val)
-            self._callback.end_sorted_set(self._key)
-        #hash类型
-        elif enc_type == REDIS_RDB_TYPE_HASH :
-            length = self.read_length(f)
-            self._callback.start_hash(self._key, length, self._expiry, info={'encoding':'hashtable'})
-            for count in xrange(0, length) :
-                field = self.read_string(f)
-                value = self.read_string(f)
-                self._callback.hset(self._key, field, value)
-            self._callback.end_hash(self._key)
-        elif enc_type == REDIS_RDB_TYPE_HASH_ZIPMAP :
-            self.read_zipmap(f)
-        elif enc_type == REDIS_RDB_TYPE_LIST_ZIPLIST :
-            self.read_ziplist(f)
-        elif enc_type == REDIS_RDB_TYPE_SET_INTSET :
-            self.read_intset(f)
-        elif enc_type == REDIS_RDB_TYPE_ZSET_ZIPLIST :
-            self.read_zset_from_ziplist(f)
-        elif enc_type == REDIS_RDB_TYPE_HASH_ZIPLIST :
-            self.read_hash_from_ziplist(f)
-        else :
+        if self._restore is not None :
+            self._restore(self._key, self.read_dump_payload(f, enc_type), self._expiry)
+            return
+        reader = self._object_readers.get(enc_type)
+        if reader is None :
             raise Exception('read_object', 'Invalid object type %d for key %s' % (enc_type, self._key))
+        reader(f)
+
+    #字符串类型
+    def read_string_object(self, f) :
+        self._set(self._key, self._read_value(f), self._expiry, STRING_INFO)
+
+    #list类型
+    def read_list(self, f) :
+        # A redis list is just a sequence of strings
+        # We successively read strings from the stream and create a list from it
+        # The lists are in order i.e. the first string is the head, 
+        # and the last string is the tail of the list
+        ####---------------------LIST的结构-------------------
+        ####| lenth  |  item1  |  item2  |  ...  |  item N  |
+        ####-------------------------------------------------
+        key = self._key
+        rpush_many = self._rpush_many
+        length = self.read_length(f)
+        self._start_list(key, length, self._expiry, LINKEDLIST_INFO)
+        for batch in batch_sizes(length) :
+            rpush_many(key, self.read_values(f, batch))
+        self._end_list(key)
+
+    #set类型
+    def read_set(self, f) :
+        # A redis list is just a sequence of strings
+        # We successively read strings from the stream and create a set from it
+        # Note that the order of strings is non-deterministic
+        key = self._key
+        sadd_many = self._sadd_many
+        length = self.read_length(f)
+        self._start_set(key, length, self._expiry, HASHTABLE_INFO)
+        for batch in batch_sizes(length) :
+            sadd_many(key, self.read_values(f, batch))
+        self._end_set(key)
+
+    #zset类型
+    def read_zset(self, f) :
+        key = self._key
+        zadd_many = self._zadd_many
+        length = self.read_length(f)
+        self._start_sorted_set(key, length, self._expiry, SKIPLIST_INFO)
+        for batch in batch_sizes(length) :
+            zadd_many(key, self.read_zset_pairs(f, batch))
+        self._end_sorted_set(key)
+
+    #zset类型，分数是二进制的double
+    def read_zset_2(self, f) :
+        key = self._key
+        zadd_many = self._zadd_many
+        length = self.read_length(f)
+        self._start_sorted_set(key, length, self._expiry, SKIPLIST_INFO)
+        for batch in batch_sizes(length) :
+            zadd_many(key, self.read_zset_2_pairs(f, batch))
+        self._end_sorted_set(key)
+
+    #hash类型
+    def read_hash(self, f) :
+        key = self._key
+        hset_many = self._hset_many
+        length = self.read_length(f)
+        self._start_hash(key, length, self._expiry, HASHTABLE_INFO)
+        for batch in batch_sizes(length) :
+            hset_many(key, self.read_hash_pairs(f, batch))
+        self._end_hash(key)
+
+    def read_values(self, f, count) :
+        """Reads `count` strings, the elements of linked lists and hashtable sets"""
+        read_value = self._read_value
+        return [read_value(f) for x in xrange(0, count)]
+
+    def read_zset_pairs(self, f, count) :
+        """Reads `count` (score, member) pairs of a skiplist sorted set"""
+        read_value = self._read_value
+        pairs = []
+        for x in xrange(0, count) :
+            val = read_value(f)
+            dbl_length = ord(f.read(1))
+            if dbl_length >= REDIS_RDB_DOUBLE_NAN :
+                score = SPECIAL_DOUBLES[dbl_length]
+            else :
+                score = float(f.read(dbl_length))
+            pairs.append((score, val))
+        return pairs
+
+    def read_zset_2_pairs(self, f, count) :
+        """Reads `count` (score, member) pairs of a skiplist sorted set with binary scores"""
+        read_value = self._read_value
+        unpack = DOUBLE.unpack
+        pairs = []
+        for x in xrange(0, count) :
+            val = read_value(f)
+            pairs.append((unpack(f.read(8))[0], val))
+        return pairs
+
+    def read_hash_pairs(self, f, count) :
+        """Reads `count` (field, value) pairs of a hashtable"""
+        read_value = self._read_value
+        # the field is read before the value, as tuples are built from left to right
+        return [(read_value(f), read_value(f)) for x in xrange(0, count)]
+
+    def skip_zset_pair(self, f) :
+        self.skip_string(f)
+        dbl_length = ord(f.read(1))
+        if dbl_length < REDIS_RDB_DOUBLE_NAN :
+            skip(f, dbl_length)
+
+    def skip_zset_2_pair(self, f) :
+        self.skip_string(f)
+        skip(f, 8)
+
+    def skip_hash_pair(self, f) :
+        self.skip_string(f)
+        self.skip_string(f)
+
+    def read_dump_payload(self, f, enc_type) :
+        """
+        Reads an object without decoding it, and returns it as the redis DUMP command serializes it : 
+        its type and its bytes as they are in the dump, then the RDB version and the CRC64 of all of that.
+        """
+        if isinstance(f, MmapReader) :
+            start = f.tell()
+            self.skip_object(f, enc_type)
+            data = f[start:f.tell()]
+        else :
+            recorder = RecordingReader(f)
+            self.skip_object(recorder, enc_type)
+            data = recorder.getvalue()
+        payload = chr(enc_type) + data + DUMP_PAYLOAD_VERSION.pack(self._version)
+        return payload + DUMP_PAYLOAD_CHECKSUM.pack(crc64(payload))
 
     def skip_key_and_object(self, f, data_type):
         self.skip_string(f)
@@ -485,6 +1374,41 @@ class RdbParser :
         
         skip(f, bytes_to_skip)
 
+    def skip_strings(self, f, count):
+        """Skips `count` strings, like `skip_string` but with the length decoding inlined"""
+        read = f.read
+        if isinstance(f, MmapReader) :
+            seek = f.seek
+        else :
+            seek = None
+        prefixes = LENGTH_PREFIXES
+        for x in xrange(0, count) :
+            first = ord(read(1))
+            prefix = prefixes[first]
+            if prefix is None :
+                if (first & 0xC0) >> 6 == REDIS_RDB_14BITLEN :
+                    length = ((first & 0x3F) << 8) | ord(read(1))
+                elif first == REDIS_RDB_32BITLEN_PREFIX :
+                    length = read_big_endian_unsigned_int(f)
+                elif first == REDIS_RDB_64BITLEN_PREFIX :
+                    length = read_big_endian_unsigned_long(f)
+                else :
+                    raise Exception('skip_strings', 'Invalid length encoding %d for key %s' % (first, self._key))
+            else :
+                length, is_encoded = prefix
+                if is_encoded :
+                    if length == REDIS_RDB_ENC_LZF :
+                        length = self.read_length(f)
+                        self.read_length(f)
+                    else :
+                        length = ENCODED_INT_SIZES.get(length, 0)
+            if not length :
+                continue
+            if seek is not None :
+                seek(length, 1)
+            else :
+                skip(f, length)
+
     def skip_object(self, f, enc_type):
         skip_strings = 0
         if enc_type == REDIS_RDB_TYPE_STRING :
@@ -494,7 +1418,11 @@ class RdbParser :
         elif enc_type == REDIS_RDB_TYPE_SET :
             skip_strings = self.read_length(f)
         elif enc_type == REDIS_RDB_TYPE_ZSET :
-            skip_strings = self.read_length(f) * 2
+            for x in xrange(0, self.read_length(f)) :
+                self.skip_zset_pair(f)
+        elif enc_type == REDIS_RDB_TYPE_ZSET_2 :
+            for x in xrange(0, self.read_length(f)) :
+                self.skip_zset_2_pair(f)
         elif enc_type == REDIS_RDB_TYPE_HASH :
             skip_strings = self.read_length(f) * 2
         elif enc_type == REDIS_RDB_TYPE_HASH_ZIPMAP :
@@ -507,159 +1435,363 @@ class RdbParser :
             skip_strings = 1
         elif enc_type == REDIS_RDB_TYPE_HASH_ZIPLIST :
             skip_strings = 1
+        elif enc_type == REDIS_RDB_TYPE_LIST_QUICKLIST :
+            skip_strings = self.read_length(f)
+        elif enc_type == REDIS_RDB_TYPE_LIST_QUICKLIST_2 :
+            for x in xrange(0, self.read_length(f)) :
+                self.read_length(f)
+                self.skip_string(f)
+        elif enc_type in (REDIS_RDB_TYPE_HASH_LISTPACK, REDIS_RDB_TYPE_ZSET_LISTPACK, REDIS_RDB_TYPE_SET_LISTPACK) :
+            skip_strings = 1
+        elif enc_type in (REDIS_RDB_TYPE_STREAM_LISTPACKS, REDIS_RDB_TYPE_STREAM_LISTPACKS_2, REDIS_RDB_TYPE_STREAM_LISTPACKS_3) :
+            self.skip_stream(f, enc_type)
+        elif enc_type == REDIS_RDB_TYPE_MODULE_2 :
+            self.skip_module(f)
+        elif enc_type == REDIS_RDB_TYPE_MODULE :
+            # values of the first module API do not say where they end, only the module can read them
+            raise Exception('skip_object', 'Cannot skip the module value of key %s' % self._key)
         else :
             raise Exception('read_object', 'Invalid object type %d for key %s' % (enc_type, self._key))
-        for x in xrange(0, skip_strings):
+        self.skip_strings(f, skip_strings)
+
+    def skip_stream(self, f, enc_type):
+        """Skips a stream, and returns its number of entries"""
+        # the listpacks of entries, each after the id of its first entry
+        self.skip_strings(f, self.read_length(f) * 2)
+        length = self.read_length(f)
+        # the last id, as milliseconds and sequence number
+        self.read_length(f)
+        self.read_length(f)
+        if enc_type != REDIS_RDB_TYPE_STREAM_LISTPACKS :
+            # the first id, the largest deleted id and the number of entries ever added
+            for x in xrange(0, 5) :
+                self.read_length(f)
+        for x in xrange(0, self.read_length(f)) :
+            # a consumer group, its name and last delivered id
             self.skip_string(f)
+            self.read_length(f)
+            self.read_length(f)
+            if enc_type != REDIS_RDB_TYPE_STREAM_LISTPACKS :
+                # entries read
+                self.read_length(f)
+            # pending entries : a 128 bit id, the delivery time in milliseconds and the number of deliveries
+            for y in xrange(0, self.read_length(f)) :
+                skip(f, 24)
+                self.read_length(f)
+            # consumers : a name, the times they were last seen and active, and their pending ids
+            for y in xrange(0, self.read_length(f)) :
+                self.skip_string(f)
+                skip(f, 16 if enc_type == REDIS_RDB_TYPE_STREAM_LISTPACKS_3 else 8)
+                skip(f, 16 * self.read_length(f))
+        return length
+
+    def skip_module(self, f):
+        # the id of the module type, then the value as a sequence of opcodes
+        self.read_length(f)
+        self.skip_module_value(f)
+
+    def skip_module_value(self, f):
+        while True :
+            opcode = self.read_length(f)
+            if opcode == REDIS_RDB_MODULE_OPCODE_EOF :
+                return
+            elif opcode == REDIS_RDB_MODULE_OPCODE_SINT or opcode == REDIS_RDB_MODULE_OPCODE_UINT :
+                self.read_length(f)
+            elif opcode == REDIS_RDB_MODULE_OPCODE_FLOAT :
+                skip(f, 4)
+            elif opcode == REDIS_RDB_MODULE_OPCODE_DOUBLE :
+                skip(f, 8)
+            elif opcode == REDIS_RDB_MODULE_OPCODE_STRING :
+                self.skip_string(f)
+            else :
+                raise Exception('skip_module', 'Invalid module opcode %d for key %s' % (opcode, self._key))
 
 
     def read_intset(self, f) :
+        key = self._key
         raw_string = self.read_string(f)
-        buff = StringIO(raw_string)
-        encoding = read_unsigned_int(buff)
-        num_entries = read_unsigned_int(buff)
-        self._callback.start_set(self._key, num_entries, self._expiry, info={'encoding':'intset', 'sizeof_value':len(raw_string)})
-        for x in xrange(0, num_entries) :
-            if encoding == 8 :
-                entry = read_unsigned_long(buff)
-            elif encoding == 4 :
-                entry = read_unsigned_int(buff)
-            elif encoding == 2 :
-                entry = read_unsigned_short(buff)
-            else :
-                raise Exception('read_intset', 'Invalid encoding %d for key %s' % (encoding, self._key))
-            self._callback.sadd(self._key, entry)
-        self._callback.end_set(self._key)
+        encoding, num_entries = INTSET_HEADER.unpack_from(raw_string, 0)
+        entry_format = INTSET_ENCODINGS.get(encoding)
+        if entry_format is None :
+            raise Exception('read_intset', 'Invalid encoding %d for key %s' % (encoding, key))
+        self._start_set(key, num_entries, self._expiry, {'encoding':'intset', 'sizeof_value':len(raw_string)})
+        # The entries are an array of integers of the same size, unpacked in one call
+        if self._wants_arrays :
+            members = intset_array(raw_string, encoding, num_entries)
+        else :
+            members = struct.unpack_from('<%d%s' % (num_entries, entry_format), raw_string, INTSET_HEADER.size)
+        self._sadd_many(key, members)
+        self._end_set(key)
 
     def read_ziplist(self, f) :
+        key = self._key
         raw_string = self.read_string(f)
-        buff = StringIO(raw_string)
-        zlbytes = read_unsigned_int(buff)
-        tail_offset = read_unsigned_int(buff)
-        num_entries = read_unsigned_short(buff)
-        self._callback.start_list(self._key, num_entries, self._expiry, info={'encoding':'ziplist', 'sizeof_value':len(raw_string)})
-        for x in xrange(0, num_entries) :
-            val = self.read_ziplist_entry(buff)
-            self._callback.rpush(self._key, val)
-        zlist_end = read_unsigned_char(buff)
-        if zlist_end != 255 : 
-            raise Exception('read_ziplist', "Invalid zip list end - %d for key %s" % (zlist_end, self._key))
-        self._callback.end_list(self._key)
+        entries = self.decode_list_ziplist(raw_string)
+        self._start_list(key, len(entries), self._expiry, {'encoding':'ziplist', 'sizeof_value':len(raw_string)})
+        self._rpush_many(key, entries)
+        self._end_list(key)
 
     def read_zset_from_ziplist(self, f) :
+        key = self._key
         raw_string = self.read_string(f)
-        buff = StringIO(raw_string)
-        zlbytes = read_unsigned_int(buff)
-        tail_offset = read_unsigned_int(buff)
-        num_entries = read_unsigned_short(buff)
-        if (num_entries % 2) :
-            raise Exception('read_zset_from_ziplist', "Expected even number of elements, but found %d for key %s" % (num_entries, self._key))
-        num_entries = num_entries /2
-        self._callback.start_sorted_set(self._key, num_entries, self._expiry, info={'encoding':'ziplist', 'sizeof_value':len(raw_string)})
-        for x in xrange(0, num_entries) :
-            member = self.read_ziplist_entry(buff)
-            score = self.read_ziplist_entry(buff)
-            if isinstance(score, str) :
-                score = float(score)
-            self._callback.zadd(self._key, score, member)
-        zlist_end = read_unsigned_char(buff)
-        if zlist_end != 255 : 
-            raise Exception('read_zset_from_ziplist', "Invalid zip list end - %d for key %s" % (zlist_end, self._key))
-        self._callback.end_sorted_set(self._key)
+        entries = self.decode_ziplist(raw_string)
+        if len(entries) % 2 :
+            raise Exception('read_zset_from_ziplist', "Expected even number of elements, but found %d for key %s" % (len(entries), key))
+        self._start_sorted_set(key, len(entries) // 2, self._expiry, {'encoding':'ziplist', 'sizeof_value':len(raw_string)})
+        self._zadd_many(key, [(float(score) if isinstance(score, str) else score, member)
+                              for member, score in zip(entries[0::2], entries[1::2])])
+        self._end_sorted_set(key)
 
     def read_hash_from_ziplist(self, f) :
+        key = self._key
         raw_string = self.read_string(f)
-        buff = StringIO(raw_string)
-        zlbytes = read_unsigned_int(buff)
-        tail_offset = read_unsigned_int(buff)
-        num_entries = read_unsigned_short(buff)
-        if (num_entries % 2) :
-            raise Exception('read_hash_from_ziplist', "Expected even number of elements, but found %d for key %s" % (num_entries, self._key))
-        num_entries = num_entries /2
-        self._callback.start_hash(self._key, num_entries, self._expiry, info={'encoding':'ziplist', 'sizeof_value':len(raw_string)})
-        for x in xrange(0, num_entries) :
-            field = self.read_ziplist_entry(buff)
-            value = self.read_ziplist_entry(buff)
-            self._callback.hset(self._key, field, value)
-        zlist_end = read_unsigned_char(buff)
-        if zlist_end != 255 : 
-            raise Exception('read_hash_from_ziplist', "Invalid zip list end - %d for key %s" % (zlist_end, self._key))
-        self._callback.end_hash(self._key)
-    
-    
-    def read_ziplist_entry(self, f) :
+        entries = self.decode_ziplist(raw_string)
+        if len(entries) % 2 :
+            raise Exception('read_hash_from_ziplist', "Expected even number of elements, but found %d for key %s" % (len(entries), key))
+        self._start_hash(key, len(entries) // 2, self._expiry, {'encoding':'ziplist', 'sizeof_value':len(raw_string)})
+        self._hset_many(key, zip(entries[0::2], entries[1::2]))
+        self._end_hash(key)
+
+    def read_quicklist(self, f) :
+        # A list of ziplists, all of them are read before the list starts as its length is their total length
+        key = self._key
+        nodes = [self.read_string(f) for x in xrange(0, self.read_length(f))]
         length = 0
-        value = None
-        prev_length = read_unsigned_char(f)
-        if prev_length == 254 :
-            prev_length = read_unsigned_int(f)
-        entry_header = read_unsigned_char(f)
-        if (entry_header >> 6) == 0 :
-            length = entry_header & 0x3F
-            value = f.read(length)
-        elif (entry_header >> 6) == 1 :
-            length = ((entry_header & 0x3F) << 8) | read_unsigned_char(f)
-            value = f.read(length)
-        elif (entry_header >> 6) == 2 :
-            length = read_big_endian_unsigned_int(f)
-            value = f.read(length)
-        elif (entry_header >> 4) == 12 :
-            value = read_signed_short(f)
-        elif (entry_header >> 4) == 13 :
-            value = read_signed_int(f)
-        elif (entry_header >> 4) == 14 :
-            value = read_signed_long(f)
-        elif (entry_header == 240) :
-            value = read_24bit_signed_number(f)
-        elif (entry_header == 254) :
-            value = read_signed_char(f)
-        elif (entry_header >= 241 and entry_header <= 253) :
-            value = entry_header - 241
-        else :
-            raise Exception('read_ziplist_entry', 'Invalid entry_header %d for key %s' % (entry_header, self._key))
-        return value
+        for node in nodes :
+            count = ziplist_header_length(node)
+            length += count if count is not None else self.count_ziplist_entries(node)
+        info = {'encoding':'quicklist', 'zips':len(nodes), 'sizeof_value':sum(len(x) for x in nodes)}
+        self._start_list(key, length, self._expiry, info)
+        rpush_many = self._rpush_many
+        decode_list_ziplist = self.decode_list_ziplist
+        for node in nodes :
+            rpush_many(key, decode_list_ziplist(node))
+        self._end_list(key)
+
+    def read_quicklist_2(self, f) :
+        # A list of listpacks, and of single elements too large for one
+        key = self._key
+        nodes = []
+        for x in xrange(0, self.read_length(f)) :
+            container = self.read_length(f)
+            nodes.append((container, self.read_string(f)))
+        length = 0
+        size = 0
+        for container, node in nodes :
+            if container == QUICKLIST_NODE_CONTAINER_PLAIN :
+                length += 1
+                size += len(str(node))
+            elif container == QUICKLIST_NODE_CONTAINER_PACKED :
+                count = listpack_header_length(node)
+                length += count if count is not None else self.count_listpack_entries(node)
+                size += len(node)
+            else :
+                raise Exception('read_quicklist_2', 'Invalid quicklist node container %d for key %s' % (container, key))
+        self._start_list(key, length, self._expiry, {'encoding':'quicklist', 'zips':len(nodes), 'sizeof_value':size})
+        rpush_many = self._rpush_many
+        decode_listpack = self.decode_listpack
+        for container, node in nodes :
+            if container == QUICKLIST_NODE_CONTAINER_PLAIN :
+                rpush_many(key, [node])
+            else :
+                rpush_many(key, decode_listpack(node))
+        self._end_list(key)
+
+    def read_hash_from_listpack(self, f) :
+        key = self._key
+        raw_string = self.read_string(f)
+        entries = self.decode_listpack(raw_string)
+        if len(entries) % 2 :
+            raise Exception('read_hash_from_listpack', "Expected even number of elements, but found %d for key %s" % (len(entries), key))
+        self._start_hash(key, len(entries) // 2, self._expiry, {'encoding':'listpack', 'sizeof_value':len(raw_string)})
+        self._hset_many(key, zip(entries[0::2], entries[1::2]))
+        self._end_hash(key)
+
+    def read_zset_from_listpack(self, f) :
+        key = self._key
+        raw_string = self.read_string(f)
+        entries = self.decode_listpack(raw_string)
+        if len(entries) % 2 :
+            raise Exception('read_zset_from_listpack', "Expected even number of elements, but found %d for key %s" % (len(entries), key))
+        self._start_sorted_set(key, len(entries) // 2, self._expiry, {'encoding':'listpack', 'sizeof_value':len(raw_string)})
+        self._zadd_many(key, [(float(score) if isinstance(score, str) else score, member)
+                              for member, score in zip(entries[0::2], entries[1::2])])
+        self._end_sorted_set(key)
+
+    def read_set_from_listpack(self, f) :
+        key = self._key
+        raw_string = self.read_string(f)
+        entries = self.decode_listpack(raw_string)
+        self._start_set(key, len(entries), self._expiry, {'encoding':'listpack', 'sizeof_value':len(raw_string)})
+        self._sadd_many(key, entries)
+        self._end_set(key)
+
+    def decode_ziplist(self, data) :
+        """
+        Returns the entries of a ziplist, walking an offset over the string instead of reading from a stream.
         
+        The first byte of each entry's header is looked up in ZIPLIST_ENTRY_HEADERS, which tells 
+        how the entry is encoded and how many bytes it takes.
+        """
+        entries = []
+        append = entries.append
+        headers = ZIPLIST_ENTRY_HEADERS
+        # zlbytes, zltail and the number of entries
+        pos = 10
+        while True :
+            # the length of the previous entry, in 1 byte or 254 and 4 bytes, or 255 at the end
+            prev_length = ord(data[pos])
+            if prev_length == 255 :
+                return entries
+            pos += 1 if prev_length < 254 else 5
+            header = headers[ord(data[pos])]
+            kind = header[0]
+            if kind == ZIPLIST_STRING_6BIT :
+                end = pos + 1 + header[1]
+                append(data[pos + 1:end])
+                pos = end
+            elif kind == ZIPLIST_IMMEDIATE_INT :
+                append(header[1])
+                pos += 1
+            elif kind == ZIPLIST_INT :
+                append(header[1].unpack_from(data, pos + 1)[0])
+                pos += header[2]
+            elif kind == ZIPLIST_STRING_14BIT :
+                end = pos + 2 + (header[1] | ord(data[pos + 1]))
+                append(data[pos + 2:end])
+                pos = end
+            elif kind == ZIPLIST_STRING_32BIT :
+                end = pos + 5 + BIG_ENDIAN_UNSIGNED_INT.unpack_from(data, pos + 1)[0]
+                append(data[pos + 5:end])
+                pos = end
+            elif kind == ZIPLIST_INT_24BIT :
+                append(SIGNED_INT.unpack('\x00' + data[pos + 1:pos + 4])[0] >> 8)
+                pos += 4
+            else :
+                raise Exception('decode_ziplist', 'Invalid entry_header %d for key %s' % (header[1], self._key))
+
+    def decode_list_ziplist(self, data) :
+        """
+        Like `decode_ziplist`, for the elements of a list. When numpy is installed, ziplists that only 
+        hold integers of one size are decoded in bulk, and returned as an array if the callback wants one.
+        """
+        if numpy is not None and len(data) >= ARRAY_MIN_ENTRIES * 3 :
+            values = integer_ziplist_array(data)
+            if values is not None :
+                return values if self._wants_arrays else values.tolist()
+        return self.decode_ziplist(data)
+
+    def decode_listpack(self, data) :
+        """
+        Returns the entries of a listpack, walking an offset over the string.
+        
+        Each entry is an encoding byte, the data, and the length of both written backwards 
+        in 1 to 5 bytes, so that the listpack can be walked from its end too.
+        """
+        entries = []
+        append = entries.append
+        # the total number of bytes and the number of entries
+        pos = 6
+        while True :
+            encoding = ord(data[pos])
+            if encoding < 0x80 :
+                # 7 bit unsigned integer
+                append(encoding)
+                size = 1
+            elif encoding < 0xC0 :
+                # string of up to 63 bytes
+                size = 1 + (encoding & 0x3F)
+                append(data[pos + 1:pos + size])
+            elif encoding < 0xE0 :
+                # 13 bit signed integer
+                value = ((encoding & 0x1F) << 8) | ord(data[pos + 1])
+                append(value - 8192 if value >= 4096 else value)
+                size = 2
+            elif encoding < 0xF0 :
+                # string of up to 4095 bytes
+                size = 2 + (((encoding & 0x0F) << 8) | ord(data[pos + 1]))
+                append(data[pos + 2:pos + size])
+            elif encoding == 0xF0 :
+                size = 5 + UNSIGNED_INT.unpack_from(data, pos + 1)[0]
+                append(data[pos + 5:pos + size])
+            elif encoding == 0xF1 :
+                append(SIGNED_SHORT.unpack_from(data, pos + 1)[0])
+                size = 3
+            elif encoding == 0xF2 :
+                append(SIGNED_INT.unpack('\x00' + data[pos + 1:pos + 4])[0] >> 8)
+                size = 4
+            elif encoding == 0xF3 :
+                append(SIGNED_INT.unpack_from(data, pos + 1)[0])
+                size = 5
+            elif encoding == 0xF4 :
+                append(SIGNED_LONG.unpack_from(data, pos + 1)[0])
+                size = 9
+            elif encoding == 0xFF :
+                return entries
+            else :
+                raise Exception('decode_listpack', 'Invalid entry encoding %d for key %s' % (encoding, self._key))
+            if size < 128 :
+                pos += size + 1
+            else :
+                pos += size + listpack_backlen_size(size)
+
     def read_zipmap(self, f) :
         raw_string = self.read_string(f)
-        buff = io.BytesIO(bytearray(raw_string))
-        num_entries = read_unsigned_char(buff)
-        self._callback.start_hash(self._key, num_entries, self._expiry, info={'encoding':'zipmap', 'sizeof_value':len(raw_string)})
+        pairs = self.decode_zipmap(raw_string)
+        self._start_hash(self._key, len(pairs), self._expiry, {'encoding':'zipmap', 'sizeof_value':len(raw_string)})
+        self._hset_many(self._key, [(field, zipmap_value(value)) for field, value in pairs])
+        self._end_hash(self._key)
+
+    def decode_zipmap(self, data) :
+        """
+        Returns the (field, value) pairs of a zipmap, walking an offset over the string.
+        
+        Fields and values are preceded by their length, in 1 byte or 254 and 4 bytes, and 
+        values by a byte counting the free bytes left after them. 255 ends the zipmap.
+        """
+        pairs = []
+        append = pairs.append
+        # the number of entries, which is 254 and up when there are too many to count
+        pos = 1
         while True :
-            next_length = self.read_zipmap_next_length(buff)
-            if next_length is None :
-                break
-            key = buff.read(next_length)
-            next_length = self.read_zipmap_next_length(buff)
-            if next_length is None :
-                raise Exception('read_zip_map', 'Unexepcted end of zip map for key %s' % self._key)        
-            free = read_unsigned_char(buff)
-            value = buff.read(next_length)
-            try:
-                value = int(value)
-            except ValueError:
-                pass
-            
-            skip(buff, free)
-            self._callback.hset(self._key, key, value)
-        self._callback.end_hash(self._key)
-
-    def read_zipmap_next_length(self, f) :
-        num = read_unsigned_char(f)
-        if num < 254:
-            return num
-        elif num == 254:
-            return read_unsigned_int(f)
-        else:
-            return None
+            length = ord(data[pos])
+            if length == 255 :
+                return pairs
+            if length < 254 :
+                pos += 1
+            else :
+                length = UNSIGNED_INT.unpack_from(data, pos + 1)[0]
+                pos += 5
+            field = data[pos:pos + length]
+            pos += length
+            length = ord(data[pos])
+            if length < 254 :
+                pos += 1
+            elif length == 254 :
+                length = UNSIGNED_INT.unpack_from(data, pos + 1)[0]
+                pos += 5
+            else :
+                raise Exception('read_zip_map', 'Unexepcted end of zip map for key %s' % self._key)
+            free = ord(data[pos])
+            append((field, data[pos + 1:pos + 1 + length]))
+            pos += 1 + length + free
 
     def verify_magic_string(self, magic_string) :
         if magic_string != 'REDIS' :
             raise Exception('verify_magic_string', 'Invalid File Format')
 
+    def read_header(self, f) :
+        """Reads the magic string and version at the start of the dump file, and returns the version"""
+        f.seek(0)
+        self.verify_magic_string(f.read(5))
+        self._version = self.verify_version(f.read(4))
+        return self._version
+
     def verify_version(self, version_str) :
         version = int(version_str)
-        if version < 1 or version > 6 : 
+        if version < 1 or version > 11 : 
             raise Exception('verify_version', 'Invalid RDB version number %d' % version)
+        return version
 
     def init_filter(self, filters):
         self._filters = {}
@@ -675,19 +1807,22 @@ class RdbParser :
         else:
             raise Exception('init_filter', 'invalid value for dbs in filter %s' %filters['dbs'])
         
-        if not ('keys' in filters and filters['keys']):
-            self._filters['keys'] = re.compile(".*")
-        else:
-            self._filters['keys'] = re.compile(filters['keys'])
+        # None when every key passes, so that keys are not matched at all
+        self._filters['keys'] = compile_key_filter(filters.get('keys'), filters.get('exclude_keys'),
+                                                   filters.get('key_set'), filters.get('exclude_key_set'))
 
         if not 'types' in filters:
-            self._filters['types'] = ('set', 'hash', 'sortedset', 'string', 'list')
+            self._filters['types'] = ('set', 'hash', 'sortedset', 'string', 'list', 'stream', 'module')
         elif isinstance(filters['types'], str):
             self._filters['types'] = (filters['types'], )
         elif isinstance(filters['types'], list):
             self._filters['types'] = [str(x) for x in filters['types']]
         else:
             raise Exception('init_filter', 'invalid value for types in filter %s' %filters['types'])
+        # 当没有key过滤并且包含所有类型时，读取key之后不需要再次匹配
+        self._filters['all_keys'] = self._filters['keys'] is None and \
+            set(DATA_TYPE_MAPPING.values()) <= set(self._filters['types'])
+        self._filters['expiry'] = expiry_range(filters.get('as_of'), filters.get('ttl_min'), filters.get('ttl_max'))
     ####匹配过滤器--
     ####要求db_number在类的dbs中，key在类的keys中，data_type在类的types中
     ####
@@ -695,54 +1830,284 @@ class RdbParser :
         ##如果存在dbs，并且db_number不存在于dbs中，则返回false
         if self._filters['dbs'] and (not db_number in self._filters['dbs']):
             return False
-        ##如果key不为None，并且keys中不存在key，则返回false
-        if key and (not self._filters['keys'].match(str(key))):
+        ##如果key不为None，并且key没有通过keys和exclude_keys的过滤，则返回false
+        if key and self._filters['keys'] is not None and (not self._filters['keys'].match(key)):
             return False
         ##如果data_type不为None，并且types不存在于data_type中，则返回false
         if data_type is not None and (not self.get_logical_type(data_type) in self._filters['types']):
             return False
         return True
     
+    def matches_expiry(self, expiry):
+        """Whether a key that expires at `expiry`, in milliseconds since the epoch or None, passes the ttl filters"""
+        if self._filters['expiry'] is None :
+            return True
+        min_expiry, max_expiry = self._filters['expiry']
+        if expiry is None :
+            return max_expiry is None
+        return expiry >= min_expiry and (max_expiry is None or expiry <= max_expiry)
+
     def get_logical_type(self, data_type):
         return DATA_TYPE_MAPPING[data_type]
         
     def lzf_decompress(self, compressed, expected_length):
-        in_stream = bytearray(compressed)
-        in_len = len(in_stream)
-        in_index = 0
-        out_stream = bytearray()
-        out_index = 0
-    
-        while in_index < in_len :
-            ctrl = in_stream[in_index]
-            if not isinstance(ctrl, int) :
-                raise Exception('lzf_decompress', 'ctrl should be a number %s for key %s' % (str(ctrl), self._key))
-            in_index = in_index + 1
-            if ctrl < 32 :
-                for x in xrange(0, ctrl + 1) :
-                    out_stream.append(in_stream[in_index])
-                    #sys.stdout.write(chr(in_stream[in_index]))
-                    in_index = in_index + 1
-                    out_index = out_index + 1
-            else :
-                length = ctrl >> 5
-                if length == 7 :
-                    length = length + in_stream[in_index]
-                    in_index = in_index + 1
-                
-                ref = out_index - ((ctrl & 0x1f) << 8) - in_stream[in_index] - 1
-                in_index = in_index + 1
-                for x in xrange(0, length + 2) :
-                    out_stream.append(out_stream[ref])
-                    ref = ref + 1
-                    out_index = out_index + 1
-        if len(out_stream) != expected_length :
-            raise Exception('lzf_decompress', 'Expected lengths do not match %d != %d for key %s' % (len(out_stream), expected_length, self._key))
-        return str(out_stream)
+        try :
+            return self._lzf.decompress(compressed, expected_length)
+        except Exception as e :
+            raise Exception('lzf_decompress', '%s for key %s' % (e.args[-1], self._key))
+
+class ElementChunks(object):
+    """Reads the elements of a collection in lists of at most ELEMENT_BATCH_SIZE, as they are iterated over"""
+    def __init__(self, f, length, read_elements, skip_element) :
+        self._f = f
+        self.remaining = length
+        self._read_elements = read_elements
+        self._skip_element = skip_element
+
+    def __iter__(self) :
+        return self
+
+    def next(self) :
+        if self.remaining == 0 :
+            raise StopIteration
+        count = min(self.remaining, ELEMENT_BATCH_SIZE)
+        self.remaining -= count
+        return self._read_elements(self._f, count)
+
+    __next__ = next
+
+    def skip_rest(self) :
+        for x in xrange(0, self.remaining) :
+            self._skip_element(self._f)
+        self.remaining = 0
+
+class RecordCollector(RdbCallback):
+    """Collects the events of one key into an `RdbRecord`, for `RdbParser.iter_records`"""
+    def start(self, key, logical_type, length, expiry, info, value) :
+        self._key = key
+        self._type = logical_type
+        self._length = length
+        self._expiry = expiry
+        self._encoding = info['encoding']
+        self._value = value
+
+    def record(self, db_number) :
+        return RdbRecord(db_number, self._key, self._type, self._encoding, self._expiry, self._length, self._value, None)
+
+    def set(self, key, value, expiry, info) :
+        self.start(key, 'string', None, expiry, info, value)
+
+    def start_hash(self, key, length, expiry, info) :
+        self.start(key, 'hash', length, expiry, info, {})
+
+    def hset_many(self, key, pairs) :
+        self._value.update(pairs)
+
+    def start_set(self, key, cardinality, expiry, info) :
+        self.start(key, 'set', cardinality, expiry, info, set())
+
+    def sadd_many(self, key, members) :
+        self._value.update(members)
+
+    def start_list(self, key, length, expiry, info) :
+        self.start(key, 'list', length, expiry, info, [])
+
+    def rpush_many(self, key, values) :
+        self._value.extend(values)
+
+    def start_sorted_set(self, key, length, expiry, info) :
+        self.start(key, 'sortedset', length, expiry, info, [])
+
+    def zadd_many(self, key, pairs) :
+        self._value.extend(pairs)
+
+class LazyValue(object):
+    """
+    A string from the dump file that is only decoded when its `value` is used
+    
+    `encoding` is 'raw' for plain strings and 'lzf' for compressed strings
+    `length` is the length of the decoded string
+    `compressed_length` is the number of bytes the string takes up in the dump file
+    
+    `len()`, `str()` and `int()` work on the handle as they would on the string.
+    When parsing with `use_mmap`, the undecoded bytes are a view of the mapped file, 
+    so the value must be read before the parse completes.
+    """
+    __slots__ = ('encoding', 'length', 'compressed_length', '_data', '_decompress')
+    
+    def __init__(self, encoding, length, compressed_length, data, decompress = None) :
+        self.encoding = encoding
+        self.length = length
+        self.compressed_length = compressed_length
+        self._data = data
+        self._decompress = decompress
+    
+    @property
+    def value(self) :
+        if self._decompress is not None :
+            self._data = self._decompress(self._data, self.length)
+            self._decompress = None
+        elif not isinstance(self._data, bytes) :
+            self._data = bytes(self._data)
+        return self._data
+    
+    def __len__(self) :
+        return self.length
+    
+    def __str__(self) :
+        return self.value
+    
+    def __int__(self) :
+        return int(self.value)
+    
+    def __repr__(self) :
+        return 'LazyValue(%r, %d, %d)' % (self.encoding, self.length, self.compressed_length)
+
+class MmapReader(mmap.mmap):
+    """
+    A read only memory map of a dump file that can stand in for the file object.
+    
+    `read`, `seek` and `tell` are the native mmap methods, so the parser walks 
+    an offset over the mapped file instead of going through buffered file reads.
+    """
+    def skip(self, size):
+        self.seek(size, 1)
+
+    def read_buffer(self, size):
+        """Returns the next `size` bytes as a zero-copy buffer over the mapped file"""
+        offset = self.tell()
+        self.seek(size, 1)
+        return _buffer(self, offset, size)
+
+class StreamReader(io.BufferedReader):
+    """
+    Buffers a file object that may not support seeking, like a pipe or a socket.
+    
+    Reads from the parser are served from a buffer of `buffer_size` bytes, 
+    which is refilled with one `read` call on the file object when it runs out.
+    """
+    def __init__(self, f, buffer_size = STREAM_BUFFER_SIZE):
+        io.BufferedReader.__init__(self, StreamSource(f), buffer_size)
+
+class StreamSource(io.RawIOBase):
+    """Presents a file object with a `read` method as a raw stream, counting the bytes read for `tell`"""
+    # The buffered reader checks `closed` on every read. A plain attribute
+    # is much faster to look up than the property inherited from io.IOBase.
+    closed = False
+
+    def __init__(self, f):
+        io.RawIOBase.__init__(self)
+        self._f = f
+        self._position = 0
+
+    def close(self):
+        self.closed = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self._f.read(len(b))
+        size = len(data)
+        b[:size] = data
+        self._position += size
+        return size
+
+    def tell(self):
+        return self._position
+
+class RecordingReader(object):
+    """Reads from the file object `f`, and keeps every byte read, so that skipped objects can be copied as they are"""
+    def __init__(self, f):
+        self._f = f
+        self._chunks = []
+
+    def read(self, size):
+        data = self._f.read(size)
+        self._chunks.append(data)
+        return data
+
+    def getvalue(self):
+        return ''.join(self._chunks)
+
+def read_stream_checksums(f, checksum_reader):
+    """
+    Returns the checksum stored after the EOF opcode and the CRC64 of the dump up to it,
+    for a dump read from `checksum_reader` through the buffered stream `f`
+    """
+    # The buffer of `f` may not have reached the end of the dump yet
+    f.read()
+    checksum_reader.read_to_end()
+    return checksum_reader.stored_checksum(), checksum_reader.crc
+
+def read_mapped_checksums(f):
+    """Like `read_stream_checksums`, for a dump read through a `MmapReader`"""
+    end = f.tell()
+    trailer = f.read(8)
+    if len(trailer) < 8 :
+        raise Exception('verify_checksum', 'Dump file is truncated, it ends after %d bytes' % (end + len(trailer)))
+    return UNSIGNED_LONG.unpack(trailer)[0] or None, crc64(_buffer(f, 0, end))
+
+def batch_sizes(length):
+    """Splits `length` elements into batches of at most ELEMENT_BATCH_SIZE"""
+    while length > 0 :
+        batch = min(length, ELEMENT_BATCH_SIZE)
+        yield batch
+        length -= batch
+
+def _ignore(*args):
+    pass
+
+def _call_each(method):
+    def call_many(key, elements):
+        for element in elements :
+            method(key, element)
+    return call_many
+
+def _call_each_pair(method):
+    def call_many(key, pairs):
+        for first, second in pairs :
+            method(key, first, second)
+    return call_many
 
 def skip(f, free):
     if free :
-        f.read(free)
+        if isinstance(f, MmapReader) :
+            f.skip(free)
+        elif free >= SKIP_SEEK_SIZE and not isinstance(f, (StreamReader, RecordingReader)) :
+            f.seek(free, 1)
+        else :
+            f.read(free)
+
+def ziplist_header_length(header):
+    # zlbytes, zltail, then the number of entries, which is 65535 when there are too many to count
+    length = UNSIGNED_SHORT.unpack_from(header, 8)[0]
+    return None if length == 65535 else length
+
+def listpack_header_length(header):
+    # the total number of bytes, then the number of entries, which is 65535 when there are too many to count
+    length = UNSIGNED_SHORT.unpack_from(header, 4)[0]
+    return None if length == 65535 else length
+
+def listpack_backlen_size(size):
+    """The number of bytes that hold the length of a listpack entry of `size` bytes, at 7 bits a byte"""
+    backlen_size = 1
+    while size >= 128 :
+        size >>= 7
+        backlen_size += 1
+    return backlen_size
+
+def zipmap_header_length(header):
+    # the number of entries, or 254 and up when there are too many to count
+    length = ord(header[0])
+    return None if length >= 254 else length
+
+def zipmap_value(value):
+    # zipmaps store integers as strings, and they are passed to the callback as numbers
+    try:
+        return int(value)
+    except ValueError:
+        return value
 
 def ntohl(f) :
     #读取流中后面4位
@@ -754,6 +2119,27 @@ def ntohl(f) :
     new_val = new_val | ((val & 0x00ff0000) >> 8)
     return new_val
 
+def expiry_range(as_of, ttl_min, ttl_max):
+    '''
+    Returns (min_expiry, max_expiry), the expiries in milliseconds since the epoch of the keys
+    whose time to live at `as_of` is between `ttl_min` and `ttl_max` seconds, max_expiry
+    being None if there is no `ttl_max`. Returns None if neither ttl is given and `as_of` is None.
+    '''
+    if as_of is None and ttl_min is None and ttl_max is None :
+        return None
+    if as_of is None or as_of == 'now' :
+        as_of = time.time()
+    as_of = int(as_of * 1000)
+    # redis expires a key once the time is past its expiry, so keys expiring at as_of are still live
+    min_expiry = as_of + int(max(ttl_min or 0, 0) * 1000)
+    if ttl_max is None :
+        return min_expiry, None
+    return min_expiry, as_of + int(ttl_max * 1000)
+
+def expiry_to_datetime(expiry):
+    """Converts an expiry in milliseconds since the epoch, as passed with `wants_raw_expiry`, to a `datetime`"""
+    return to_datetime(expiry * 1000)
+
 def to_datetime(usecs_since_epoch):
     seconds_since_epoch = usecs_since_epoch / 1000000
     useconds = usecs_since_epoch % 1000000
@@ -761,37 +2147,103 @@ def to_datetime(usecs_since_epoch):
     delta = datetime.timedelta(microseconds = useconds)
     return dt + delta
     
+SIGNED_CHAR = struct.Struct('b')
+UNSIGNED_CHAR = struct.Struct('B')
+SIGNED_SHORT = struct.Struct('h')
+UNSIGNED_SHORT = struct.Struct('H')
+SIGNED_INT = struct.Struct('i')
+UNSIGNED_INT = struct.Struct('I')
+BIG_ENDIAN_UNSIGNED_INT = struct.Struct('>I')
+SIGNED_LONG = struct.Struct('q')
+UNSIGNED_LONG = struct.Struct('Q')
+# The footer of the payloads of the redis DUMP command
+DUMP_PAYLOAD_VERSION = struct.Struct('<H')
+DUMP_PAYLOAD_CHECKSUM = struct.Struct('<Q')
+BIG_ENDIAN_UNSIGNED_LONG = struct.Struct('>Q')
+DOUBLE = struct.Struct('<d')
+
+# Bytes taken by integer encoded strings, keyed by their encoding
+ENCODED_INT_SIZES = {REDIS_RDB_ENC_INT8 : 1, REDIS_RDB_ENC_INT16 : 2, REDIS_RDB_ENC_INT32 : 4}
+
+# Scores of skiplist sorted sets that are not written as a number, keyed by the length that stands for them
+SPECIAL_DOUBLES = {REDIS_RDB_DOUBLE_NAN : float('nan'), REDIS_RDB_DOUBLE_POS_INF : float('inf'), REDIS_RDB_DOUBLE_NEG_INF : float('-inf')}
+
+# The encoding of an intset, which is the size of its entries, then their number
+INTSET_HEADER = struct.Struct('<II')
+
+# Struct format of the entries of an intset, keyed by the intset encoding
+INTSET_ENCODINGS = {2 : 'H', 4 : 'I', 8 : 'Q'}
+
+# Ziplist entries, by how the first byte of their header encodes them
+ZIPLIST_STRING_6BIT = 0
+ZIPLIST_STRING_14BIT = 1
+ZIPLIST_STRING_32BIT = 2
+ZIPLIST_INT = 3
+ZIPLIST_INT_24BIT = 4
+ZIPLIST_IMMEDIATE_INT = 5
+ZIPLIST_INVALID = 6
+
+def _build_ziplist_entry_headers():
+    """
+    Returns what the first byte of a ziplist entry header tells, for each of its values : 
+    the kind of entry, then the length of 6 bit strings, the high bits of the length of 
+    14 bit strings, the struct and total size of integers, or the value of immediate integers.
+    """
+    int_structs = {0xC0 : (SIGNED_SHORT, 3), 0xD0 : (SIGNED_INT, 5), 0xE0 : (SIGNED_LONG, 9), 0xFE : (SIGNED_CHAR, 2)}
+    headers = []
+    for byte in range(0, 256) :
+        if byte >> 6 == 0 :
+            headers.append((ZIPLIST_STRING_6BIT, byte & 0x3F))
+        elif byte >> 6 == 1 :
+            headers.append((ZIPLIST_STRING_14BIT, (byte & 0x3F) << 8))
+        elif byte >> 6 == 2 :
+            headers.append((ZIPLIST_STRING_32BIT, None))
+        elif byte == 0xFE or byte >> 4 in (0xC, 0xD, 0xE) :
+            headers.append((ZIPLIST_INT,) + int_structs[byte if byte == 0xFE else byte & 0xF0])
+        elif byte == 0xF0 :
+            headers.append((ZIPLIST_INT_24BIT, None))
+        elif byte >= 0xF1 and byte <= 0xFD :
+            headers.append((ZIPLIST_IMMEDIATE_INT, byte - 0xF1))
+        else :
+            headers.append((ZIPLIST_INVALID, byte))
+    return tuple(headers)
+
+ZIPLIST_ENTRY_HEADERS = _build_ziplist_entry_headers()
+
 def read_signed_char(f) :
-    return struct.unpack('b', f.read(1))[0]
+    return SIGNED_CHAR.unpack(f.read(1))[0]
     
 def read_unsigned_char(f) :
-    return struct.unpack('B', f.read(1))[0]
+    return UNSIGNED_CHAR.unpack(f.read(1))[0]
 
 def read_signed_short(f) :
-    return struct.unpack('h', f.read(2))[0]
+    return SIGNED_SHORT.unpack(f.read(2))[0]
         
 def read_unsigned_short(f) :
-    return struct.unpack('H', f.read(2))[0]
+    return UNSIGNED_SHORT.unpack(f.read(2))[0]
 
 def read_signed_int(f) :
-    return struct.unpack('i', f.read(4))[0]
+    return SIGNED_INT.unpack(f.read(4))[0]
     
 def read_unsigned_int(f) :
-    return struct.unpack('I', f.read(4))[0]
+    return UNSIGNED_INT.unpack(f.read(4))[0]
 
 def read_big_endian_unsigned_int(f):
-    return struct.unpack('>I', f.read(4))[0]
+    return BIG_ENDIAN_UNSIGNED_INT.unpack(f.read(4))[0]
 
 def read_24bit_signed_number(f):
     s = '0' + f.read(3)
-    num = struct.unpack('i', s)[0]
+    num = SIGNED_INT.unpack(s)[0]
     return num >> 8
     
+def read_big_endian_unsigned_long(f):
+    return BIG_ENDIAN_UNSIGNED_LONG.unpack(f.read(8))[0]
+
 def read_signed_long(f) :
-    return struct.unpack('q', f.read(8))[0]
+    return SIGNED_LONG.unpack(f.read(8))[0]
     
 def read_unsigned_long(f) :
-    return struct.unpack('Q', f.read(8))[0]
+    return UNSIGNED_LONG.unpack(f.read(8))[0]
 
 def string_as_hexcode(string) :
     for s in string :
@@ -0,0 +1,88 @@
+import socket
+
+def open_snapshot(host, port, password=None, timeout=None):
+    '''
+    Connect to a redis server as a replica would, and return a file object that
+    reads the snapshot it sends, as the server sends it.
+
+    PSYNC is tried first, and SYNC if the server is older than 2.8. The server starts
+    a BGSAVE for the snapshot, so it can take a while before the first byte arrives.
+    Pass the result to `RdbParser.parse_stream`, and close it when done.
+
+    Typical usage :
+        snapshot = open_snapshot('localhost', 6379)
+        try:
+            parser.parse_stream(snapshot)
+        finally:
+            snapshot.close()
+    '''
+    sock = socket.create_connection((host, port), timeout)
+    f = sock.makefile('rb')
+    try:
+        if password:
+            send_command(sock, 'AUTH', password)
+            read_status(f, 'AUTH')
+        send_command(sock, 'PSYNC', '?', '-1')
+        reply = read_line(f)
+        if reply.startswith('-'):
+            # Servers before 2.8 do not know PSYNC, and send the snapshot straight after SYNC
+            send_command(sock, 'SYNC')
+            reply = read_line(f)
+        elif reply.startswith('+FULLRESYNC'):
+            reply = read_line(f)
+        elif reply.startswith('+'):
+            raise Exception('open_snapshot', 'Expected a full resync from %s:%d, got %s' % (host, port, reply))
+        # The server sends empty lines to keep the connection alive until the snapshot is ready
+        while reply == '':
+            reply = read_line(f)
+        if not reply.startswith('$'):
+            raise Exception('open_snapshot', 'Expected the snapshot from %s:%d, got %s' % (host, port, reply))
+        return SnapshotStream(sock, f, int(reply[1:]))
+    except:
+        f.close()
+        sock.close()
+        raise
+
+class SnapshotStream(object):
+    '''
+    The snapshot sent by a server after SYNC or PSYNC
+
+    Reads stop at the end of the snapshot, before the stream of
+    commands that the server sends replicas afterwards.
+    '''
+    def __init__(self, sock, f, length):
+        self._sock = sock
+        self._f = f
+        self.length = length
+        self._remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._f.read(size)
+        if len(data) < size:
+            raise Exception('SnapshotStream', 'Connection closed %d bytes before the end of the snapshot' % (self._remaining - len(data)))
+        self._remaining -= size
+        return data
+
+    def close(self):
+        self._f.close()
+        self._sock.close()
+
+def send_command(sock, *args):
+    command = ['*%d\r\n' % len(args)]
+    for x in args:
+        command.append('$%d\r\n%s\r\n' % (len(x), x))
+    sock.sendall(''.join(command))
+
+def read_line(f):
+    line = f.readline()
+    if not line:
+        raise Exception('read_line', 'Connection closed by the server')
+    return line.rstrip('\r\n')
+
+def read_status(f, command):
+    reply = read_line(f)
+    if not reply.startswith('+'):
+        raise Exception(command, reply)
+    return reply
@@ -0,0 +1,93 @@
+import os
+import zlib
+
+# Buffer of each shard file
+SHARD_BUFFER_SIZE = 1024 * 1024
+
+def shard_path(output, number):
+    '''The name of shard `number` of the output file `output` : dump.json gives dump-00000.json, dump-00001.json...'''
+    base, ext = os.path.splitext(output)
+    return '%s-%05d%s' % (base, number, ext)
+
+def parse_size(size):
+    '''Reads a number of bytes, followed by an optional K, M or G'''
+    size = size.strip().upper()
+    multiplier = 1
+    if size and size[-1] in 'KMG':
+        multiplier = 1024 ** ('KMG'.index(size[-1]) + 1)
+        size = size[:-1]
+    return int(size) * multiplier
+
+class _Shards(object):
+    '''
+    Shards are written as shard-00000.json.tmp, and renamed to shard-00000.json once
+    they are complete, so that a shard can be read as soon as it has its final name.
+    Shards that are left unfinished by an error keep the .tmp suffix.
+    '''
+    def __init__(self, output):
+        self._output = output
+        self._files = {}
+        self.paths = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(exc_type is None)
+
+    def _open(self, number):
+        path = shard_path(self._output, number)
+        self._files[number] = open(path + '.tmp', 'wb', SHARD_BUFFER_SIZE)
+        return self._files[number]
+
+    def _finish(self, number, complete=True):
+        f = self._files.pop(number)
+        f.close()
+        path = shard_path(self._output, number)
+        if complete:
+            os.rename(f.name, path)
+            self.paths.append(path)
+
+    def close(self, complete=True):
+        for number in sorted(self._files):
+            self._finish(number, complete)
+
+class RotatingShards(_Shards):
+    '''
+    Writes records to one shard after the other, starting a new shard once the current one
+    holds `shard_size` bytes. Records are never split, and keep the order in which they are written.
+    '''
+    def __init__(self, output, shard_size):
+        _Shards.__init__(self, output)
+        self._shard_size = shard_size
+        self._number = 0
+        self._size = 0
+        self._open(0)
+
+    def write_record(self, key, record):
+        if self._size >= self._shard_size:
+            self._finish(self._number)
+            self._number += 1
+            self._size = 0
+            self._open(self._number)
+        self._files[self._number].write(record)
+        self._size += len(record)
+
+class HashedShards(_Shards):
+    '''
+    Writes each record to one of `count` shards, picked from the CRC32 of its key, so that
+    all records of a key end up in the same shard from one dump to the next.
+    '''
+    def __init__(self, output, count):
+        _Shards.__init__(self, output)
+        self._count = count
+        self._shards = [self._open(x) for x in xrange(0, count)]
+
+    def write_record(self, key, record):
+        self._shards[(zlib.crc32(str(key)) & 0xffffffff) % self._count].write(record)
+
+def open_shards(output, shard_size=None, count=None):
+    '''Returns `RotatingShards` if a `shard_size` is given, or else `HashedShards` over `count` shards'''
+    if shard_size:
+        return RotatingShards(output, shard_size)
+    return HashedShards(output, count)
@@ -1,9 +1,33 @@
 import unittest
 from tests.parser_tests import RedisParserTestCase
 from tests.memprofiler_tests import MemoryCallbackTestCase
+from tests.lzf_tests import LzfDecompressorTestCase
+from tests.parallel_tests import ParallelParserTestCase
+from tests.index_tests import RdbIndexTestCase
+from tests.replication_tests import ReplicationTestCase
+from tests.compression_tests import CompressedDumpTestCase
+from tests.callbacks_tests import BatchCallbackTestCase
+from tests.filters_tests import KeyFilterTestCase
+from tests.keyset_tests import KeySetTestCase
+from tests.crc64_tests import Crc64TestCase
+from tests.arrays_tests import ArraysTestCase
+from tests.shards_tests import ShardsTestCase
+from tests.loader_tests import LoaderTestCase
 
 def all_tests():
     suite = unittest.TestSuite()
     suite.addTest(unittest.makeSuite(RedisParserTestCase))
     suite.addTest(unittest.makeSuite(MemoryCallbackTestCase))
+    suite.addTest(unittest.makeSuite(LzfDecompressorTestCase))
+    suite.addTest(unittest.makeSuite(ParallelParserTestCase))
+    suite.addTest(unittest.makeSuite(RdbIndexTestCase))
+    suite.addTest(unittest.makeSuite(ReplicationTestCase))
+    suite.addTest(unittest.makeSuite(CompressedDumpTestCase))
+    suite.addTest(unittest.makeSuite(BatchCallbackTestCase))
+    suite.addTest(unittest.makeSuite(KeyFilterTestCase))
+    suite.addTest(unittest.makeSuite(KeySetTestCase))
+    suite.addTest(unittest.makeSuite(Crc64TestCase))
+    suite.addTest(unittest.makeSuite(ArraysTestCase))
+    suite.addTest(unittest.makeSuite(ShardsTestCase))
+    suite.addTest(unittest.makeSuite(LoaderTestCase))
     return suite
@@ -0,0 +1,94 @@
+import unittest
+import os
+import random
+import struct
+
+from rdbtools import RdbParser, MemoryCallback
+from rdbtools import arrays
+from rdbtools import parser as parser_module
+from tests.parser_tests import MockRedis, ziplist, rdb_string, load_rdb
+from tests.memprofiler_tests import Stats
+
+class ArrayMockRedis(MockRedis):
+    '''Stores the arrays it is given, as well as their elements like MockRedis'''
+    wants_arrays = True
+
+    def __init__(self) :
+        MockRedis.__init__(self)
+        self.arrays = {}
+
+    def sadd_many(self, key, members) :
+        if arrays.is_array(members) :
+            self.arrays[key] = members
+        MockRedis.sadd_many(self, key, list(members))
+
+    def rpush_many(self, key, values) :
+        if arrays.is_array(values) :
+            self.arrays[key] = values
+        MockRedis.rpush_many(self, key, list(values))
+
+def integer_lists_dump() :
+    body = ''
+    for name, values in INTEGER_LISTS.items() :
+        body += '\x0a' + rdb_string(name) + rdb_string(ziplist(values))
+    body += '\x0e' + rdb_string('quicklist') + '\x02' + rdb_string(ziplist(range(0, 100))) + rdb_string(ziplist([2 ** 40] * 50))
+    return 'REDIS0007\xfe\x00' + body + '\xff' + '\x00' * 8
+
+INTEGER_LISTS = {
+    'int8' : [x % 90 - 100 for x in range(0, 300)],
+    'int16' : range(1000, 1100),
+    'int24' : [x * 1000 * (-1) ** x for x in range(40, 140)],
+    'int32' : [-2 ** 31 + x for x in range(0, 64)],
+    'int64' : [2 ** 40 + x for x in range(0, 200)],
+    'mixed' : range(0, 40) + [2 ** 20] * 40,
+    'strings' : ['x%d' % x for x in range(0, 50)],
+    'short' : [1000, 1001],
+}
+
+@unittest.skipIf(arrays.numpy is None, 'numpy is not installed')
+class ArraysTestCase(unittest.TestCase):
+    def test_integer_ziplist_array(self):
+        for name in ('int8', 'int16', 'int24', 'int32', 'int64') :
+            values = arrays.integer_ziplist_array(ziplist(INTEGER_LISTS[name]))
+            self.assertEquals(values.tolist(), INTEGER_LISTS[name])
+        for name in ('mixed', 'strings') :
+            self.assertEquals(arrays.integer_ziplist_array(ziplist(INTEGER_LISTS[name])), None)
+
+    def test_lists_as_arrays(self):
+        r = ArrayMockRedis()
+        RdbParser(r).parse_bytes(integer_lists_dump())
+        for name, values in INTEGER_LISTS.items() :
+            self.assertEquals(r.databases[0][name], values)
+        self.assertEquals(sorted(r.arrays.keys()), ['int16', 'int24', 'int32', 'int64', 'int8', 'quicklist'])
+        self.assertEquals(r.databases[0]['quicklist'], range(0, 100) + [2 ** 40] * 50)
+
+    def test_lists_without_arrays(self):
+        r = MockRedis()
+        RdbParser(r).parse_bytes(integer_lists_dump())
+        for name, values in INTEGER_LISTS.items() :
+            self.assertEquals(r.databases[0][name], values)
+            self.assert_(all(type(x) in (int, long, str) for x in r.databases[0][name]))
+
+    def test_intset_as_array(self):
+        r = ArrayMockRedis()
+        RdbParser(r).parse(os.path.join(os.path.dirname(__file__), 'dumps', 'intset_64.rdb'))
+        self.assertEquals(r.arrays['intset_64'].dtype, arrays.numpy.uint64)
+        self.assertEquals(r.databases[0], load_rdb('intset_64.rdb').databases[0])
+
+    def test_memory_report_without_numpy(self):
+        data = integer_lists_dump()
+        with_numpy = self.memory_report(data)
+        saved = parser_module.numpy
+        parser_module.numpy = None
+        try :
+            without_numpy = self.memory_report(data)
+        finally :
+            parser_module.numpy = saved
+        self.assertEquals(with_numpy, without_numpy)
+        self.assertEquals(with_numpy['int64'].len_largest_element, 8)
+
+    def memory_report(self, data):
+        random.seed(42)
+        stats = Stats()
+        RdbParser(MemoryCallback(stats, 64)).parse_bytes(data)
+        return stats.records
@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+"""
+Benchmarks for the rdb parser
+
+The fixtures in tests/dumps are tiny, so they are concatenated and repeated
+`--scale` times into one large dump before timing the parser over it.
+
+Run from the root of the repository :
+
+    python tests/benchmark.py
+    python tests/benchmark.py --scale 2000 linkedlist.rdb dictionary.rdb
+    python tests/benchmark.py --per-fixture linkedlist.rdb ziplist_with_integers.rdb intset_64.rdb
+
+Key filters are timed on their own, over generated key names instead of a dump :
+
+    python tests/benchmark.py --match-keys 100000000
+"""
+import os
+import re
+import sys
+import time
+import tempfile
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from rdbtools import RdbParser, RdbCallback
+from rdbtools.filters import compile_key_filter
+
+DUMPS = os.path.join(os.path.dirname(__file__), 'dumps')
+
+class CountingCallback(RdbCallback):
+    def __init__(self):
+        self.keys = 0
+        self.elements = 0
+
+    def set(self, key, value, expiry, info):
+        self.keys += 1
+
+    def start_hash(self, key, length, expiry, info):
+        self.keys += 1
+
+    def hset(self, key, field, value):
+        self.elements += 1
+
+    def start_set(self, key, cardinality, expiry, info):
+        self.keys += 1
+
+    def sadd(self, key, member):
+        self.elements += 1
+
+    def start_list(self, key, length, expiry, info):
+        self.keys += 1
+
+    def rpush(self, key, value):
+        self.elements += 1
+
+    def start_sorted_set(self, key, length, expiry, info):
+        self.keys += 1
+
+    def zadd(self, key, score, member):
+        self.elements += 1
+
+    def hset_many(self, key, pairs):
+        self.elements += len(pairs)
+
+    def sadd_many(self, key, members):
+        self.elements += len(members)
+
+    def rpush_many(self, key, values):
+        self.elements += len(values)
+
+    def zadd_many(self, key, pairs):
+        self.elements += len(pairs)
+
+class BufferCountingCallback(CountingCallback):
+    wants_buffers = True
+
+class CollectingCallback(CountingCallback):
+    '''Builds every value in memory, like iter_records does'''
+    def set(self, key, value, expiry, info):
+        self.keys += 1
+        self.value = value
+
+    def start_hash(self, key, length, expiry, info):
+        self.keys += 1
+        self.value = {}
+
+    def hset_many(self, key, pairs):
+        self.elements += len(pairs)
+        self.value.update(pairs)
+
+    def start_set(self, key, cardinality, expiry, info):
+        self.keys += 1
+        self.value = set()
+
+    def sadd_many(self, key, members):
+        self.elements += len(members)
+        self.value.update(members)
+
+    def start_list(self, key, length, expiry, info):
+        self.keys += 1
+        self.value = []
+
+    def rpush_many(self, key, values):
+        self.elements += len(values)
+        self.value.extend(values)
+
+    def start_sorted_set(self, key, length, expiry, info):
+        self.keys += 1
+        self.value = []
+
+    def zadd_many(self, key, pairs):
+        self.elements += len(pairs)
+        self.value.extend(pairs)
+
+def fixture_body(file_name):
+    '''Returns the bytes of a fixture between the header and the EOF opcode'''
+    with open(os.path.join(DUMPS, file_name), 'rb') as f:
+        data = f.read()
+    version = int(data[5:9])
+    if version >= 5:
+        # EOF opcode followed by the 8 byte checksum
+        return data[9:-9]
+    return data[9:-1]
+
+def fixture_version(file_name):
+    with open(os.path.join(DUMPS, file_name), 'rb') as f:
+        return int(f.read(9)[5:])
+
+def build_dump(file_names, scale, path):
+    bodies = ''.join(fixture_body(x) for x in file_names)
+    with open(path, 'wb') as f:
+        f.write('REDIS%04d' % max(fixture_version(x) for x in file_names))
+        for x in xrange(0, scale):
+            f.write(bodies)
+        f.write('\xff' + '\x00' * 8)
+
+def parse_with_callback(make_callback, **options):
+    def run(path):
+        callback = make_callback()
+        RdbParser(callback, **options).parse(path)
+        return callback.keys, callback.elements
+    return run
+
+def iterate_records(**options):
+    def run(path):
+        keys = elements = 0
+        for record in RdbParser(RdbCallback(), **options).iter_records(path):
+            keys += 1
+            if record.chunks is not None:
+                for chunk in record.chunks:
+                    elements += len(chunk)
+            elif record.length is not None:
+                elements += record.length
+        return keys, elements
+    return run
+
+def key_inventory(**options):
+    def run(path):
+        keys = elements = 0
+        for info in RdbParser(RdbCallback(), **options).iter_key_info(path):
+            keys += 1
+            if info.type != 'string':
+                elements += info.length
+        return keys, elements
+    return run
+
+def time_parse(path, run):
+    start = time.time()
+    keys, elements = run(path)
+    return time.time() - start, keys, elements
+
+def run_benchmarks(file_names, scale, selected):
+    fd, path = tempfile.mkstemp(suffix='.rdb')
+    os.close(fd)
+    try:
+        build_dump(file_names, scale, path)
+        size_mb = os.path.getsize(path) / (1024.0 * 1024.0)
+        print("%s x %d = %.1f MB" % (", ".join(file_names), scale, size_mb))
+        for name, run in BENCHMARKS:
+            if selected and name not in selected:
+                continue
+            elapsed, keys, elements = time_parse(path, run)
+            print("  %-16s %8.2fs %10d keys/sec %10d elements/sec %8.1f MB/sec" % (name, elapsed, 
+                    keys / elapsed, elements / elapsed, size_mb / elapsed))
+    finally:
+        os.remove(path)
+
+BENCHMARKS = [
+    ('file', parse_with_callback(CountingCallback)),
+    ('mmap', parse_with_callback(CountingCallback, use_mmap=True)),
+    ('mmap+buffers', parse_with_callback(BufferCountingCallback, use_mmap=True)),
+    ('collect', parse_with_callback(CollectingCallback)),
+    ('records', iterate_records()),
+    ('mmap+records', iterate_records(use_mmap=True)),
+    ('keys', key_inventory()),
+]
+
+# Patterns for the key filter benchmarks, as they would be given to rdb -k and -x
+FILTERS = [
+    ('prefix', ['user:'], []),
+    ('exact', ['user:40$'], []),
+    ('5 prefixes', ['user:', 'session:', 'cart:', 'feed:', 'lock:'], []),
+    ('100 prefixes', ['tenant%d:' % x for x in xrange(0, 100)], []),
+    ('suffix', ['.*:tmp$'], []),
+    ('regex', ['user:[0-9]+$'], []),
+    ('prefix-suffix', ['user:', 'session:'], ['.*:tmp$']),
+]
+
+# Distinct key names that are matched over and over
+KEY_POOL_SIZE = 100000
+
+def key_pool():
+    namespaces = ['user', 'session', 'cart', 'feed', 'lock', 'tenant17', 'tenant250', 'stats']
+    keys = []
+    for x in xrange(0, KEY_POOL_SIZE):
+        key = '%s:%d' % (namespaces[x % len(namespaces)], x)
+        if x % 3 == 0:
+            key += ':tmp'
+        keys.append(key)
+    return keys
+
+def count_regex_matches(patterns, exclude, keys, rounds):
+    # What matches_filter did before keys were compiled : one re.match per pattern
+    include = [re.compile(x).match for x in patterns]
+    exclude = [re.compile(x).match for x in exclude]
+    matched = 0
+    for x in xrange(0, rounds):
+        for key in keys:
+            if any(m(key) for m in include) and not any(m(key) for m in exclude):
+                matched += 1
+    return matched
+
+def count_filter_matches(patterns, exclude, keys, rounds):
+    match = compile_key_filter(patterns, exclude).match
+    matched = 0
+    for x in xrange(0, rounds):
+        for key in keys:
+            if match(key):
+                matched += 1
+    return matched
+
+def run_filter_benchmarks(count):
+    keys = key_pool()
+    rounds = max(1, count // len(keys))
+    count = rounds * len(keys)
+    print("%d keys" % count)
+    for name, patterns, exclude in FILTERS:
+        timings = []
+        for count_matches in (count_regex_matches, count_filter_matches):
+            start = time.time()
+            matched = count_matches(patterns, exclude, keys, rounds)
+            timings.append(time.time() - start)
+        print("  %-16s %8.2fs regex %8.2fs compiled %10d keys/sec %10d matched" % (name, timings[0], 
+                timings[1], count / timings[1], matched))
+
+def main():
+    usage = """usage: %prog [options] [fixture.rdb ...]"""
+    parser = OptionParser(usage=usage)
+    parser.add_option("-s", "--scale", dest="scale", default=500, type="int",
+                  help="Number of times the fixtures are repeated in the generated dump. Defaults to 500")
+    parser.add_option("-b", "--benchmark", dest="benchmarks", action="append",
+                  help="Benchmarks to run. Defaults to all of %s" % ", ".join(x[0] for x in BENCHMARKS))
+    parser.add_option("-p", "--per-fixture", dest="per_fixture", action="store_true", default=False,
+                  help="Time each fixture on its own instead of all of them together")
+    parser.add_option("-m", "--match-keys", dest="match_keys", default=0, type="int",
+                  help="Time the key filters over this many generated keys, instead of parsing dumps")
+    (options, args) = parser.parse_args()
+
+    if options.match_keys:
+        run_filter_benchmarks(options.match_keys)
+        return
+
+    file_names = args or sorted(x for x in os.listdir(DUMPS) if x.endswith('.rdb'))
+    if options.per_fixture:
+        for file_name in file_names:
+            run_benchmarks([file_name], options.scale, options.benchmarks)
+    else:
+        run_benchmarks(file_names, options.scale, options.benchmarks)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+import unittest
+import os
+import random
+import json
+import struct
+
+try :
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from rdbtools import RdbParser, RdbCallback, JSONCallback, DiffCallback, NDJSONCallback, ProtocolCallback, RestoreCallback
+from rdbtools.parser import ELEMENT_BATCH_SIZE
+from rdbtools.crc64 import crc64
+from rdbtools.callbacks import BufferedOutput, encode_key, encode_value, _encode
+from rdbtools.cli.rdb import memory_callback
+from tests.parser_tests import MockRedis, load_rdb, expiring_keys_dump
+
+class BatchCallbackTestCase(unittest.TestCase):
+    def test_json_batches_match_single_elements(self):
+        self.assert_batches_match(JSONCallback)
+
+    def test_diff_batches_match_single_elements(self):
+        self.assert_batches_match(DiffCallback)
+
+    def test_ndjson_batches_match_single_elements(self):
+        self.assert_batches_match(NDJSONCallback)
+
+    def test_ndjson_records(self):
+        out = StringIO()
+        RdbParser(NDJSONCallback(out)).parse(dump_path('keys_with_expiry.rdb'))
+        self.assertEquals(json.loads(out.getvalue()), {'db' : 0, 'key' : 'expires_ms_precision', 'type' : 'string',
+                          'expiry' : '2022-12-25T10:11:12.573000', 'value' : '2022-12-25 10:11:12.573 UTC'})
+        for file_name, data_type in (('parser_filters.rdb', None), ('regular_sorted_set.rdb', 'sortedset'),
+                                     ('dictionary.rdb', 'hash'), ('linkedlist.rdb', 'list'), ('regular_set.rdb', 'set')) :
+            out = StringIO()
+            RdbParser(NDJSONCallback(out)).parse(dump_path(file_name))
+            records = [json.loads(x) for x in out.getvalue().splitlines()]
+            expected = load_rdb(file_name).databases[0]
+            self.assertEquals(sorted(x['key'] for x in records), sorted(str(x) for x in expected))
+            for record in records :
+                self.assertEquals(record['expiry'], None)
+                if data_type is not None :
+                    self.assertEquals(record['type'], data_type)
+                    self.assertEquals(len(record['value']), len(expected[record['key']]))
+
+    def test_protocol_batches_match_single_elements(self):
+        self.assert_batches_match(ProtocolCallback)
+
+    def test_protocol_commands_hold_every_byte(self):
+        for file_name in dump_files() :
+            out = StringIO()
+            RdbParser(ProtocolCallback(out, batch_size=7)).parse(dump_path(file_name))
+            databases = {}
+            sorted_sets = set()
+            for command in read_commands(out.getvalue()) :
+                name, args = command[0], command[1:]
+                if name == 'SELECT' :
+                    db = databases.setdefault(int(args[0]), {})
+                elif name == 'SET' :
+                    db[args[0]] = args[1]
+                elif name == 'HSET' :
+                    self.assert_(len(args) <= 15)
+                    db.setdefault(args[0], {}).update(zip(args[1::2], args[2::2]))
+                elif name in ('SADD', 'RPUSH') :
+                    self.assert_(len(args) <= 8)
+                    db.setdefault(args[0], []).extend(args[1:])
+                elif name == 'ZADD' :
+                    db.setdefault(args[0], {}).update(zip(args[2::2], [float(x) for x in args[1::2]]))
+                    sorted_sets.add(args[0])
+            expected = load_rdb(file_name).databases
+            for db_number, keys in expected.items() :
+                self.assertEquals(sorted(databases.get(db_number, {}).keys()), sorted(str(x) for x in keys))
+                for key, value in keys.items() :
+                    self.assertEquals(databases[db_number][str(key)], as_strings(value, str(key) in sorted_sets), msg="%s differs in %s" % (key, file_name))
+
+    def test_protocol_expiries_are_per_key(self):
+        out = StringIO()
+        RdbParser(ProtocolCallback(out)).parse_bytes(expiring_keys_dump())
+        keys = [x[1] for x in read_commands(out.getvalue()) if x[0] != 'SELECT']
+        self.assertEquals(keys, ['persistent', 'a_minute_ago', 'a_minute_ago', 'at_as_of', 'at_as_of', 'in_a_second', 'in_a_second',
+                                 'in_a_minute', 'in_a_minute', 'in_an_hour', 'in_an_hour'])
+
+    def test_restore_payloads_hold_every_key(self):
+        for file_name in dump_files() :
+            expected = MockRedis()
+            RdbParser(expected, raw_expiry=True).parse(dump_path(file_name))
+            for read in ('file', 'mmap', 'stream') :
+                out = StringIO()
+                parser = RdbParser(RestoreCallback(out), use_mmap=(read == 'mmap'))
+                if read == 'stream' :
+                    with open(dump_path(file_name), 'rb') as f :
+                        parser.parse_stream(f)
+                else :
+                    parser.parse(dump_path(file_name))
+                r = MockRedis()
+                for command in read_commands(out.getvalue()) :
+                    if command[0] == 'SELECT' :
+                        r.start_database(int(command[1]))
+                        continue
+                    name, key, ttl, payload = command[:4]
+                    self.assertEquals((name, command[4:]), ('RESTORE', ['REPLACE', 'ABSTTL']))
+                    self.assertEquals(struct.unpack('<Q', payload[-8:])[0], crc64(payload[:-8]))
+                    self.assertEquals(struct.unpack('<H', payload[-10:-8])[0], parser._version)
+                    expiries = dict((str(k), v) for k, v in expected.expiry[r.dbnum].items())
+                    self.assertEquals(int(ttl), expiries.get(key, 0))
+                    RdbParser(r).parse_dump_payload(key, payload)
+                for db_number, keys in expected.databases.items() :
+                    self.assertEquals(r.databases[db_number], dict((str(k), v) for k, v in keys.items()),
+                                      msg="%s differs when read from a %s" % (file_name, read))
+
+    def test_restore_copies_compressed_values(self):
+        out = StringIO()
+        RdbParser(RestoreCallback(out)).parse(dump_path('ziplist_that_compresses_easily.rdb'))
+        payload = read_commands(out.getvalue())[-1][3]
+        with open(dump_path('ziplist_that_compresses_easily.rdb'), 'rb') as f :
+            # the LZF compressed ziplist, as it is in the dump
+            self.assert_(payload[1:-10] in f.read())
+
+    def test_memory_batches_match_single_elements(self):
+        self.assert_batches_match(memory_callback)
+
+    def test_protocol_expiries_without_raw_expiry(self):
+        raw = StringIO()
+        RdbParser(ProtocolCallback(raw)).parse(dump_path('keys_with_expiry.rdb'))
+        converted = StringIO()
+        RdbParser(DatetimeProtocolCallback(converted)).parse(dump_path('keys_with_expiry.rdb'))
+        self.assert_('EXPIREAT' in raw.getvalue())
+        self.assertEquals(raw.getvalue(), converted.getvalue())
+
+    def test_callbacks_without_batch_methods(self):
+        for file_name in ('dictionary.rdb', 'ziplist_with_integers.rdb', 'regular_sorted_set.rdb', 'intset_16.rdb') :
+            r = MockRedis()
+            RdbParser(PerElementProxy(r)).parse(dump_path(file_name))
+            self.assertEquals(r.databases, load_rdb(file_name).databases)
+
+    def test_ziplists_are_one_batch(self):
+        r = BatchRecorder()
+        RdbParser(r).parse(dump_path('ziplist_with_integers.rdb'))
+        self.assertEquals(r.batches, [('rpush_many', len(load_rdb('ziplist_with_integers.rdb').databases[0]['ziplist_with_integers']))])
+
+    def test_hashtables_are_split_into_batches(self):
+        r = BatchRecorder()
+        RdbParser(r).parse(dump_path('dictionary.rdb'))
+        sizes = [size for name, size in r.batches]
+        self.assertEquals(sum(sizes), 1000)
+        self.assert_(max(sizes) <= ELEMENT_BATCH_SIZE)
+        self.assert_(all(name == 'hset_many' for name, size in r.batches))
+
+    def test_encoding_of_plain_strings(self):
+        for s in ('user:1000', '', ' ~', 'quote"', 'back\\slash', 'tab\t', '\x7f', 'caf\xc3\xa9', '\xff\xfe', u'caf\xe9', 12, -1.5) :
+            self.assertEquals(encode_key(s), _encode(s, quote_numbers=True))
+            self.assertEquals(encode_value(s), _encode(s, quote_numbers=False))
+        self.assertEquals(encode_value('caf\xc3\xa9 "x"'), '"caf\\u00e9 \\"x\\""')
+
+    def test_output_is_written_in_blocks(self):
+        out = WriteRecorder()
+        buffered = BufferedOutput(out, 10)
+        for x in range(0, 7) :
+            buffered.write('abc')
+        self.assertEquals(out.writes, ['abcabcabcabc'])
+        buffered.flush()
+        buffered.flush()
+        self.assertEquals(out.writes, ['abcabcabcabc', 'abcabcabc'])
+        for make_callback in (JSONCallback, DiffCallback) :
+            out = WriteRecorder()
+            RdbParser(make_callback(out)).parse(dump_path('dictionary.rdb'))
+            self.assertEquals(len(out.writes), 1)
+
+    def assert_batches_match(self, make_callback, file_names=None):
+        for file_name in file_names or dump_files() :
+            random.seed(42)
+            batched = StringIO()
+            RdbParser(make_callback(batched)).parse(dump_path(file_name))
+            random.seed(42)
+            single = StringIO()
+            RdbParser(PerElementProxy(make_callback(single))).parse(dump_path(file_name))
+            self.assertEquals(batched.getvalue(), single.getvalue(), msg="batched output differs for %s" % file_name)
+
+class PerElementProxy(object):
+    '''Hides the batch methods of a callback, so the parser calls it once per element'''
+    def __init__(self, callback) :
+        self._callback = callback
+
+    def __getattr__(self, name) :
+        if name.endswith('_many') :
+            raise AttributeError(name)
+        return getattr(self._callback, name)
+
+class WriteRecorder(object):
+    def __init__(self) :
+        self.writes = []
+
+    def write(self, data) :
+        self.writes.append(data)
+
+class DatetimeProtocolCallback(ProtocolCallback):
+    wants_raw_expiry = False
+
+class BatchRecorder(RdbCallback):
+    def __init__(self) :
+        self.batches = []
+
+    def hset_many(self, key, pairs) :
+        self.batches.append(('hset_many', len(pairs)))
+
+    def sadd_many(self, key, members) :
+        self.batches.append(('sadd_many', len(members)))
+
+    def rpush_many(self, key, values) :
+        self.batches.append(('rpush_many', len(values)))
+
+    def zadd_many(self, key, pairs) :
+        self.batches.append(('zadd_many', len(pairs)))
+
+def as_strings(value, is_sorted_set=False):
+    '''The value of a key as redis would hold it, with numbers as strings, except for the scores of sorted sets'''
+    if is_sorted_set :
+        return dict((str(k), float(v)) for k, v in value.items())
+    if isinstance(value, dict) :
+        return dict((str(k), str(v)) for k, v in value.items())
+    if isinstance(value, list) :
+        return [str(x) for x in value]
+    return str(value)
+
+def read_commands(data):
+    '''Splits the redis protocol written by ProtocolCallback into lists of arguments'''
+    commands = []
+    offset = 0
+    while offset < len(data) :
+        end = data.index('\r\n', offset)
+        count = int(data[offset + 1:end])
+        offset = end + 2
+        args = []
+        for x in range(0, count) :
+            end = data.index('\r\n', offset)
+            length = int(data[offset + 1:end])
+            args.append(data[end + 2:end + 2 + length])
+            offset = end + 2 + length + 2
+        commands.append(args)
+    return commands
+
+def dump_path(file_name):
+    return os.path.join(os.path.dirname(__file__), 'dumps', file_name)
+
+def dump_files():
+    return sorted(os.listdir(os.path.join(os.path.dirname(__file__), 'dumps')))
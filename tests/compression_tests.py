@@ -0,0 +1,122 @@
+import unittest
+import os
+import io
+import bz2
+import gzip
+import shutil
+import tarfile
+import tempfile
+
+from rdbtools import RdbParser
+from rdbtools import compression
+from rdbtools.parallel import ParallelRdbParser
+from tests.parser_tests import MockRedis, load_rdb, TrickleStream
+
+class CompressedDumpTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def assert_parses_as(self, path, file_name):
+        r = MockRedis()
+        RdbParser(r).parse(path)
+        expected = load_rdb(file_name)
+        self.assertEquals(r.databases, expected.databases)
+        self.assertEquals(r.expiry, expected.expiry)
+
+    def test_gzip(self):
+        path = os.path.join(self.tmpdir, 'dump.rdb.gz')
+        f = gzip.open(path, 'wb')
+        f.write(dump_bytes('linkedlist.rdb'))
+        f.close()
+        self.assert_parses_as(path, 'linkedlist.rdb')
+
+    def test_gzip_with_several_members(self):
+        # pigz and concatenated .gz files hold one gzip stream after another
+        data = dump_bytes('regular_sorted_set.rdb')
+        path = os.path.join(self.tmpdir, 'dump.rdb.gz')
+        for part in (data[:100], data[100:]) :
+            f = gzip.open(path, 'ab')
+            f.write(part)
+            f.close()
+        self.assert_parses_as(path, 'regular_sorted_set.rdb')
+
+    def test_bzip2(self):
+        path = os.path.join(self.tmpdir, 'dump.rdb.bz2')
+        with open(path, 'wb') as f :
+            f.write(bz2.compress(dump_bytes('dictionary.rdb')))
+        self.assert_parses_as(path, 'dictionary.rdb')
+
+    def test_xz(self):
+        if compression.lzma is None :
+            return
+        path = os.path.join(self.tmpdir, 'dump.rdb.xz')
+        with open(path, 'wb') as f :
+            f.write(compression.lzma.compress(dump_bytes('dictionary.rdb')))
+        self.assert_parses_as(path, 'dictionary.rdb')
+
+    def test_zstd(self):
+        if compression.zstandard is None :
+            return
+        path = os.path.join(self.tmpdir, 'dump.rdb.zst')
+        with open(path, 'wb') as f :
+            f.write(compression.zstandard.ZstdCompressor().compress(dump_bytes('dictionary.rdb')))
+        self.assert_parses_as(path, 'dictionary.rdb')
+
+    def test_tar_picks_the_dump(self):
+        path = os.path.join(self.tmpdir, 'backup.tar')
+        self.write_archive(path, 'w', 'keys_with_expiry.rdb')
+        self.assert_parses_as(path, 'keys_with_expiry.rdb')
+
+    def test_compressed_tar(self):
+        path = os.path.join(self.tmpdir, 'backup.tar.gz')
+        self.write_archive(path, 'w:gz', 'multiple_databases.rdb')
+        self.assert_parses_as(path, 'multiple_databases.rdb')
+
+    def test_tar_without_a_dump(self):
+        path = os.path.join(self.tmpdir, 'backup.tar')
+        archive = tarfile.open(path, 'w')
+        archive.add(os.path.join(os.path.dirname(__file__), '__init__.py'), 'notes.txt')
+        archive.close()
+        self.assertRaises(Exception, RdbParser(MockRedis()).parse, path)
+
+    def test_parse_stream_from_a_pipe(self):
+        data = gzip_bytes(dump_bytes('ziplist_that_compresses_easily.rdb'))
+        r = MockRedis()
+        RdbParser(r).parse_stream(TrickleStream(io.BytesIO(data), 7))
+        self.assertEquals(r.databases, load_rdb('ziplist_that_compresses_easily.rdb').databases)
+
+    def test_parse_bytes(self):
+        r = MockRedis()
+        RdbParser(r).parse_bytes(bz2.compress(dump_bytes('intset_64.rdb')))
+        self.assertEquals(r.databases, load_rdb('intset_64.rdb').databases)
+
+    def test_parallel_parser_falls_back_to_serial(self):
+        path = os.path.join(self.tmpdir, 'dump.rdb.gz')
+        with open(path, 'wb') as f :
+            f.write(gzip_bytes(dump_bytes('multiple_databases.rdb')))
+        r = MockRedis()
+        ParallelRdbParser(r, MockRedis, jobs=2).parse(path)
+        self.assertEquals(r.databases, load_rdb('multiple_databases.rdb').databases)
+
+    def test_unknown_format(self):
+        self.assertRaises(Exception, RdbParser(MockRedis()).parse_bytes, 'NOT A DUMP FILE')
+
+    def write_archive(self, path, mode, file_name):
+        archive = tarfile.open(path, mode)
+        archive.add(os.path.join(os.path.dirname(__file__), '__init__.py'), 'backup/README')
+        archive.add(os.path.join(os.path.dirname(__file__), 'dumps', file_name), 'backup/dump.rdb')
+        archive.close()
+
+def dump_bytes(file_name):
+    with open(os.path.join(os.path.dirname(__file__), 'dumps', file_name), 'rb') as f :
+        return f.read()
+
+def gzip_bytes(data):
+    out = io.BytesIO()
+    f = gzip.GzipFile(fileobj=out, mode='wb')
+    f.write(data)
+    f.close()
+    return out.getvalue()
@@ -0,0 +1,95 @@
+import unittest
+import io
+import os
+import shutil
+import tempfile
+
+from rdbtools import RdbParser
+from rdbtools import crc64 as crc64_module
+from rdbtools.crc64 import crc64, python_crc64, read_checksums
+from tests.parser_tests import MockRedis, TrickleStream
+from tests.compression_tests import dump_bytes, gzip_bytes
+
+class Crc64TestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_dump(self, data):
+        path = os.path.join(self.tmpdir, 'dump.rdb')
+        with open(path, 'wb') as f :
+            f.write(data)
+        return path
+
+    def test_check_value(self):
+        # The test vector of crc64.c in redis
+        self.assertEquals(python_crc64('123456789'), 0xe9c6d914c4b8d9ca)
+        self.assertEquals(crc64('123456789'), 0xe9c6d914c4b8d9ca)
+
+    def test_incremental(self):
+        data = ''.join(chr(x * 7 % 256) for x in range(0, 1000))
+        for split in (0, 1, 7, 8, 9, 500, 999, 1000) :
+            self.assertEquals(python_crc64(data[split:], python_crc64(data[:split])), python_crc64(data))
+
+    def test_read_checksums(self):
+        data = dump_bytes('rdb_version_5_with_checksum.rdb')
+        version, stored, computed = read_checksums(io.BytesIO(data), read_size=5)
+        self.assertEquals(version, 5)
+        self.assertEquals(stored, computed)
+        self.assertEquals(computed, crc64(data[:-8]))
+
+    def test_read_checksums_of_compressed_dump(self):
+        data = dump_bytes('quicklist.rdb')
+        self.assertEquals(read_checksums(io.BytesIO(gzip_bytes(data))), read_checksums(io.BytesIO(data)))
+
+    def test_dump_without_checksum(self):
+        data = dump_bytes('linkedlist.rdb')
+        self.assertEquals(read_checksums(io.BytesIO(data)), (3, None, crc64(data)))
+
+    def test_checksum_disabled(self):
+        # rdbchecksum no stores 0
+        data = dump_bytes('rdb_version_5_with_checksum.rdb')[:-8] + '\0' * 8
+        self.assertEquals(read_checksums(io.BytesIO(data))[1], None)
+        r = MockRedis()
+        RdbParser(r, verify_checksum = True).parse(self.write_dump(data))
+        self.assert_('end_rdb' in r.methods_called)
+
+    def test_parse_verifies_checksum(self):
+        data = dump_bytes('quicklist.rdb')
+        path = self.write_dump(data)
+        for use_mmap in (False, True) :
+            r = MockRedis()
+            RdbParser(r, use_mmap = use_mmap, verify_checksum = True).parse(path)
+            self.assert_('end_rdb' in r.methods_called)
+        r = MockRedis()
+        RdbParser(r, verify_checksum = True).parse_stream(TrickleStream(io.BytesIO(data), 3))
+        self.assert_('end_rdb' in r.methods_called)
+        r = MockRedis()
+        RdbParser(r, verify_checksum = True).parse_bytes(gzip_bytes(data))
+        self.assert_('end_rdb' in r.methods_called)
+
+    def test_parse_detects_corruption(self):
+        data = dump_bytes('rdb_version_5_with_checksum.rdb')
+        # Change a letter of the value of 'abcd', which still parses
+        offset = data.index('efgh')
+        path = self.write_dump(data[:offset] + 'E' + data[offset + 1:])
+        for use_mmap in (False, True) :
+            r = MockRedis()
+            parser = RdbParser(r, use_mmap = use_mmap, verify_checksum = True)
+            self.assertRaises(Exception, parser.parse, path)
+            self.assert_('end_rdb' not in r.methods_called)
+        r = MockRedis()
+        RdbParser(r, use_mmap = True).parse(path)
+        self.assert_('end_rdb' in r.methods_called)
+
+    def test_python_crc64_without_crcmod(self):
+        data = dump_bytes('zipmap_with_big_values.rdb')
+        saved = crc64_module.crc64
+        crc64_module.crc64 = python_crc64
+        try :
+            version, stored, computed = read_checksums(io.BytesIO(data), read_size=1000)
+        finally :
+            crc64_module.crc64 = saved
+        self.assertEquals(stored, computed)
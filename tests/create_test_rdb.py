@@ -29,7 +29,12 @@ def create_test_rdbs(path_to_redis_dump, dump_folder) :
 #                intset_64, 
 #                regular_set, 
 #                sorted_set_as_ziplist, 
-#                regular_sorted_set
+#                regular_sorted_set,
+#                quicklist,
+#                sorted_set_with_binary_scores,
+#                stream,
+#                keys_with_lfu,
+#                keys_with_lru,
             )
     for t in tests :
         create_rdb_file(t, path_to_redis_dump, dump_folder)
@@ -167,6 +172,52 @@ def regular_sorted_set() :
     for x in xrange(0, num_entries) :
         r.zadd("force_sorted_set", float(x) / 100, random_string(50, x))
     
+def quicklist() :
+    '''Redis 3.2 and later, with "list-max-ziplist-size 8" and "list-compress-depth 1"'''
+    for x in xrange(0, 100) :
+        r.rpush("quicklist", x if x % 3 == 0 else "element-%d-%s" % (x, "a" * 38))
+    r.rpush("small_list", "a", 1, -20000)
+    r.pexpireat("small_list", 4102444800000)
+    r.rpush("big_values", "x" * 300, 70000, "y" * 20000, 1099511627776, -8388608)
+
+def sorted_set_with_binary_scores() :
+    '''Redis 4.0 and later, with "zset-max-ziplist-entries 4"'''
+    r.zadd("zset", 1.5, "one", -2.25, "two", "inf", "plus", "-inf", "minus", 1e100, "big", 0, "zero", 0.1, "tenth")
+    r.zadd("small_zset", 1, "a", 2, "b")
+
+def stream() :
+    '''Redis 5.0 and later'''
+    r.xadd("mystream", {"f1" : "v1", "f2" : "v2"}, id="1-1")
+    r.xadd("mystream", {"f1" : "v3"}, id="2-1")
+    r.xadd("mystream", {"name" : "x"}, id="3-0")
+    r.xdel("mystream", "2-1")
+    r.xgroup_create("mystream", "g1", 0)
+    r.xgroup_create("mystream", "g2", "$")
+    r.xreadgroup("g1", "alice", {"mystream" : ">"}, count=1)
+    r.xreadgroup("g1", "bob", {"mystream" : ">"})
+    r.xadd("empty_stream", {"a" : "b"}, id="5-5")
+    r.xdel("empty_stream", "5-5")
+    r.set("after_stream", "done")
+    r.hset("h", "a", 1)
+
+def keys_with_lfu() :
+    '''Redis 4.0 and later, the keys are saved with their access frequency'''
+    r.config_set("maxmemory-policy", "allkeys-lfu")
+    r.set("s1", "v")
+    r.get("s1")
+    r.get("s1")
+    r.hset("h", "f", "v")
+    r.sadd("st", 1, 2, 3)
+    r2.set("other", 42)
+    r2.pexpireat("other", 4102444800000)
+
+def keys_with_lru() :
+    '''Redis 4.0 and later, the keys are saved with their idle time'''
+    r.config_set("maxmemory-policy", "allkeys-lru")
+    r.set("s1", "v")
+    r.zadd("z", 1, "a")
+    redis.StrictRedis(db=1).rpush("l", "a", "b")
+
 def random_string(length, seed) :
     random.seed(seed)
     return ''.join(random.choice(string.ascii_uppercase + string.digits) for x in range(length))
@@ -0,0 +1,60 @@
+import unittest
+import re
+import random
+
+from rdbtools.filters import compile_key_filter, classify, EXACT, PREFIX, SUFFIX, SUBSTRING, REGEX, PREFIX_TUPLE_LIMIT
+
+class KeyFilterTestCase(unittest.TestCase):
+    def test_no_patterns_let_everything_through(self):
+        self.assertEquals(compile_key_filter(), None)
+        self.assertEquals(compile_key_filter([]), None)
+        self.assertEquals(compile_key_filter('.*'), None)
+        self.assertEquals(compile_key_filter(['user:', '.*']), None)
+
+    def test_classify(self):
+        self.assertEquals(classify('user:'), (PREFIX, 'user:'))
+        self.assertEquals(classify('user:.*'), (PREFIX, 'user:'))
+        self.assertEquals(classify(r'user\.1'), (PREFIX, 'user.1'))
+        self.assertEquals(classify('user:1$'), (EXACT, 'user:1'))
+        self.assertEquals(classify('.*:tmp$'), (SUFFIX, ':tmp'))
+        self.assertEquals(classify('.*session'), (SUBSTRING, 'session'))
+        self.assertEquals(classify('k[0-9]'), (REGEX, None))
+        self.assertEquals(classify('(?i)user'), (REGEX, None))
+        self.assertEquals(classify('.*$'), (REGEX, None))
+
+    def test_matches_like_the_regexes(self):
+        patterns = ['user:', 'user:1$', '.*:tmp$', '.*session', 'k[0-9]', '(a)b\\1', '(?i)CaSe']
+        random.seed(3)
+        for x in range(0, 200) :
+            include = random.sample(patterns, random.randint(1, 3))
+            exclude = random.sample(patterns, random.randint(0, 2))
+            key_filter = compile_key_filter(include, exclude)
+            for key in sample_keys() :
+                expected = any(re.match(p, key) for p in include) and not any(re.match(p, key) for p in exclude)
+                self.assertEquals(key_filter.match(key), expected, msg="%r %r %r" % (include, exclude, key))
+
+    def test_many_prefixes(self):
+        prefixes = ['prefix%d:' % x for x in range(0, PREFIX_TUPLE_LIMIT * 4)]
+        key_filter = compile_key_filter(prefixes)
+        self.assert_(key_filter.match('prefix7:a'))
+        self.assert_(key_filter.match('prefix63:'))
+        self.assert_(not key_filter.match('prefix64:'))
+        self.assert_(not key_filter.match('prefix'))
+
+    def test_integer_keys(self):
+        key_filter = compile_key_filter('-1', '-12$')
+        self.assert_(key_filter.match(-123))
+        self.assert_(not key_filter.match(-12))
+        self.assert_(not key_filter.match(123))
+
+    def test_exclude_only(self):
+        key_filter = compile_key_filter(None, ['.*:tmp$'])
+        self.assert_(key_filter.match('user:1'))
+        self.assert_(not key_filter.match('user:1:tmp'))
+
+    def test_invalid_regex(self):
+        self.assertRaises(re.error, compile_key_filter, ['user:', 'k[0-9'])
+
+def sample_keys():
+    return ['', 'user:', 'user:1', 'user:1\n', 'user:12', 'user:1:tmp', 'a:tmp\n', 'a\n:tmp', 'session',
+            'my\nsession', 'k1', 'k', 'abab', 'aba', 'case', 'CASE:x', 'xuser:', 'user:session:tmp']
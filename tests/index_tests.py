@@ -0,0 +1,65 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+from rdbtools import RdbParser, RdbCallback
+from rdbtools.index import RdbIndex, build_index
+from tests.parser_tests import MockRedis, load_rdb
+
+class RdbIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def copy_dump(self, file_name):
+        path = os.path.join(self.tmpdir, file_name)
+        shutil.copy(os.path.join(os.path.dirname(__file__), 'dumps', file_name), path)
+        build_index(path)
+        return path
+
+    def test_index_is_sorted(self):
+        path = self.copy_dump('multiple_databases.rdb')
+        with RdbIndex(path + '.idx') as index :
+            entries = [(x.db_number, x.key) for x in index]
+        self.assertEquals(entries, [(0, 'key_in_zeroth_database'), (2, 'key_in_second_database')])
+
+    def test_lookup(self):
+        path = self.copy_dump('keys_with_expiry.rdb')
+        with RdbIndex(path + '.idx') as index :
+            entry = index.lookup(0, 'expires_ms_precision')
+            self.assertEquals(entry.expiry, 1671963072573)
+            self.assertEquals(index.lookup(0, 'no_such_key'), None)
+            self.assertEquals(index.lookup(1, 'expires_ms_precision'), None)
+
+    def test_get_matches_full_parse(self):
+        for file_name in ('dictionary.rdb', 'linkedlist.rdb', 'regular_sorted_set.rdb', 'intset_64.rdb',
+                          'multiple_databases.rdb', 'keys_with_expiry.rdb', 'integer_keys.rdb', 'parser_filters.rdb') :
+            path = self.copy_dump(file_name)
+            full = load_rdb(file_name)
+            for db_number, keys in full.databases.items() :
+                for key, value in keys.items() :
+                    r = MockRedis()
+                    self.assert_(RdbParser(r).get(path, db_number, str(key)), msg="%s not found in %s" % (key, file_name))
+                    self.assertEquals(r.databases, {db_number : {key : value}})
+                    self.assertEquals(r.expiry[db_number], dict((k, v) for k, v in full.expiry[db_number].items() if k == key))
+
+    def test_get_with_mmap(self):
+        path = self.copy_dump('ziplist_that_compresses_easily.rdb')
+        r = MockRedis()
+        self.assert_(RdbParser(r, use_mmap=True).get(path, 0, 'ziplist_compresses_easily'))
+        self.assertEquals(r.databases[0]['ziplist_compresses_easily'], load_rdb('ziplist_that_compresses_easily.rdb').databases[0]['ziplist_compresses_easily'])
+
+    def test_get_missing_key(self):
+        path = self.copy_dump('dictionary.rdb')
+        r = MockRedis()
+        self.assertFalse(RdbParser(r).get(path, 0, 'no_such_key'))
+        self.assertEquals(r.methods_called, [])
+
+    def test_stale_index_is_rejected(self):
+        path = self.copy_dump('dictionary.rdb')
+        with open(path, 'ab') as f :
+            f.write('\x00')
+        self.assertRaises(Exception, RdbParser(RdbCallback()).get, path, 0, 'force_dictionary')
@@ -0,0 +1,113 @@
+import unittest
+import os
+import time
+import pickle
+import random
+import shutil
+import tempfile
+
+from rdbtools import keyset
+from rdbtools.keyset import KeySet, build_key_set, open_key_set, key_set_path
+from rdbtools import JSONCallback
+from tests.parser_tests import load_rdb
+from tests.parallel_tests import parse_parallel, parse_serial
+
+class KeySetTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_keys(self, keys, file_name='keys.txt'):
+        path = os.path.join(self.tmpdir, file_name)
+        with open(path, 'wb') as f :
+            f.write(''.join(x + '\n' for x in keys))
+        return path
+
+    def test_lookups(self):
+        random.seed(7)
+        keys = set('user:%d' % random.randint(0, 100000) for x in range(0, 2000))
+        path = self.write_keys(keys)
+        self.assertEquals(build_key_set(path), len(keys))
+        with KeySet(key_set_path(path)) as key_set :
+            self.assertEquals(len(key_set), len(keys))
+            self.assertEquals(list(key_set), sorted(keys))
+            for x in range(0, 100000, 7) :
+                key = 'user:%d' % x
+                self.assertEquals(key in key_set, key in keys, msg=key)
+            self.assert_('' not in key_set)
+            self.assert_('zzzz' not in key_set)
+
+    def test_bloom_filter_rules_out_most_keys(self):
+        path = self.write_keys('key:%d' % x for x in range(0, 5000))
+        build_key_set(path)
+        with KeySet(key_set_path(path)) as key_set :
+            searches = []
+            key_set._search = lambda key : searches.append(key) or False
+            for x in range(5000, 15000) :
+                'key:%d' in key_set
+            self.assert_(len(searches) < 300, len(searches))
+
+    def test_sorting_in_runs(self):
+        random.seed(11)
+        keys = ['k%d' % random.randint(0, 500) for x in range(0, 1000)]
+        path = self.write_keys(keys)
+        size = keyset.SORT_RUN_SIZE
+        keyset.SORT_RUN_SIZE = 64
+        try :
+            count = build_key_set(path)
+        finally :
+            keyset.SORT_RUN_SIZE = size
+        self.assertEquals(count, len(set(keys)))
+        with KeySet(key_set_path(path)) as key_set :
+            self.assertEquals(list(key_set), sorted(set(keys)))
+        self.assertEquals(sorted(os.listdir(self.tmpdir)), ['keys.txt', 'keys.txt.keyset'])
+
+    def test_rebuilt_when_the_list_changes(self):
+        path = self.write_keys(['a', 'b'])
+        key_set = open_key_set(path)
+        self.assert_('b' in key_set and 'c' not in key_set)
+        key_set.close()
+        self.write_keys(['a', 'b', 'c'])
+        os.utime(path, (time.time() + 10, time.time() + 10))
+        with open_key_set(path) as key_set :
+            self.assert_('c' in key_set)
+        with open_key_set(key_set_path(path)) as key_set :
+            self.assertEquals(len(key_set), 3)
+
+    def test_pickles_by_path(self):
+        path = self.write_keys(['a', 'b'])
+        with open_key_set(path) as key_set :
+            copy = pickle.loads(pickle.dumps(key_set))
+            self.assert_('a' in copy and 'c' not in copy)
+            copy.close()
+
+    def test_invalid_file(self):
+        path = self.write_keys(['a'])
+        self.assertRaises(Exception, KeySet, path)
+
+    def test_filter_by_key_set(self):
+        path = self.write_keys(['k1', 'set2', 'z3', 'missing'])
+        r = load_rdb('parser_filters.rdb', filters={'key_set' : path})
+        self.assertEquals(sorted(r.databases[0].keys()), ['k1', 'set2', 'z3'])
+        r = load_rdb('parser_filters.rdb', filters={'key_set' : path, 'keys' : 'set|z'})
+        self.assertEquals(sorted(r.databases[0].keys()), ['set2', 'z3'])
+
+    def test_exclude_key_set(self):
+        path = self.write_keys(['k1', 'set2', 'z3'])
+        r = load_rdb('parser_filters.rdb', filters={'exclude_key_set' : path})
+        expected = set(load_rdb('parser_filters.rdb').databases[0].keys()) - set(['k1', 'set2', 'z3'])
+        self.assertEquals(set(r.databases[0].keys()), expected)
+
+    def test_integer_keys(self):
+        path = self.write_keys(['-123', '125'])
+        r = load_rdb('integer_keys.rdb', filters={'key_set' : path})
+        self.assertEquals(sorted(r.databases[0].keys()), [-123, 125])
+
+    def test_key_set_in_parallel_workers(self):
+        path = self.write_keys(['k1', 'set2', 'z3'])
+        with open_key_set(path) as key_set :
+            filters = {'key_set' : key_set}
+            self.assertEquals(parse_parallel('parser_filters.rdb', JSONCallback, filters=filters, separator=','),
+                              parse_serial('parser_filters.rdb', JSONCallback, filters=filters))
@@ -0,0 +1,188 @@
+import unittest
+import sys
+import socket
+import threading
+import time
+
+try :
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from rdbtools import RdbParser, ProtocolCallback, RestoreCallback
+from rdbtools.loader import Loader, LoadCallback, key_slot, crc16
+from rdbtools.cli.rdb import load
+from tests.callbacks_tests import read_commands, dump_path
+from tests.replication_tests import read_command
+
+class LoaderTestCase(unittest.TestCase):
+    def test_key_slots(self):
+        # The examples of the redis cluster specification
+        self.assertEquals(crc16('123456789'), 0x31c3)
+        self.assertEquals(key_slot('{user1000}.following'), key_slot('{user1000}.followers'))
+        self.assertEquals(key_slot('{user1000}.following'), key_slot('user1000'))
+        self.assertEquals(key_slot('foo{}{bar}'), crc16('foo{}{bar}') % 16384)
+        self.assertEquals(key_slot('foo{{bar}}zap'), key_slot('{bar'))
+        self.assertEquals(key_slot('foo{bar}{zap}'), key_slot('bar'))
+        self.assertEquals(key_slot(-123), key_slot('-123'))
+
+    def test_load_into_server(self):
+        for file_name in ('multiple_databases.rdb', 'keys_with_expiry.rdb', 'dictionary.rdb', 'parser_filters.rdb') :
+            with FakeRedis() as server :
+                with Loader('127.0.0.1', server.port, max_in_flight=3) as loader :
+                    RdbParser(LoadCallback(loader, batch_size=10)).parse(dump_path(file_name))
+            self.assertEquals(server.commands, expected_commands(file_name, batch_size=10))
+            self.assertEquals(loader.errors, 0)
+            self.assertEquals(server.connections, 1)
+
+    def test_load_over_several_connections(self):
+        with FakeRedis(password='secret') as server :
+            with Loader('127.0.0.1', server.port, password='secret', connections=3) as loader :
+                RdbParser(LoadCallback(loader)).parse(dump_path('parser_filters.rdb'))
+        self.assertEquals(server.connections, 3)
+        self.assertEquals(sorted(server.commands), sorted(expected_commands('parser_filters.rdb')))
+
+    def test_cluster(self):
+        with FakeRedis() as first :
+            with FakeRedis() as second :
+                first.slots = second.slots = [[0, 8191, ['127.0.0.1', first.port, 'a']], [8192, 16383, ['', second.port, 'b']]]
+                with Loader('127.0.0.1', second.port, cluster=True) as loader :
+                    RdbParser(LoadCallback(loader)).parse(dump_path('parser_filters.rdb'))
+        self.assert_(first.commands and second.commands)
+        self.assert_(all(key_slot(x[2]) < 8192 for x in first.commands))
+        self.assert_(all(key_slot(x[2]) >= 8192 for x in second.commands))
+        self.assertEquals(sorted(first.commands + second.commands), sorted(expected_commands('parser_filters.rdb')))
+        self.assertEquals([x.split(' :')[0] for x in loader.report()], ['127.0.0.1:%d' % first.port, '127.0.0.1:%d' % second.port])
+
+    def test_cluster_has_database_0_only(self):
+        with FakeRedis() as server :
+            server.slots = [[0, 16383, ['127.0.0.1', server.port, 'a']]]
+            with Loader('127.0.0.1', server.port, cluster=True) as loader :
+                self.assertRaises(Exception, RdbParser(LoadCallback(loader)).parse, dump_path('multiple_databases.rdb'))
+
+    def test_errors_are_reported(self):
+        with FakeRedis(fail='k1') as server :
+            with Loader('127.0.0.1', server.port) as loader :
+                RdbParser(LoadCallback(loader)).parse(dump_path('parser_filters.rdb'))
+        self.assertEquals(loader.errors, 1)
+        report = loader.report()
+        self.assert_('1 errors' in report[0])
+        self.assertEquals(report[1], '  ERR k1 is read only')
+
+    def test_rate_limit(self):
+        with FakeRedis() as server :
+            with Loader('127.0.0.1', server.port, rate=100) as loader :
+                start = time.time()
+                RdbParser(LoadCallback(loader, batch_size=50)).parse(dump_path('dictionary.rdb'))
+                elapsed = time.time() - start
+        # 20 HSET commands of 50 fields
+        self.assertEquals(len(server.commands), 20)
+        self.assert_(elapsed >= 0.15)
+
+    def test_cli_load(self):
+        saved, sys.stderr = sys.stderr, StringIO()
+        try :
+            with FakeRedis() as server :
+                load(dump_path('keys_with_expiry.rdb'), {}, ('127.0.0.1', server.port), batch_size=5)
+            self.assertEquals(server.commands, expected_commands('keys_with_expiry.rdb'))
+            with FakeRedis(fail='k3') as server :
+                self.assertRaises(SystemExit, load, dump_path('parser_filters.rdb'), {}, ('127.0.0.1', server.port))
+            self.assert_('ERR k3 is read only' in sys.stderr.getvalue())
+        finally :
+            sys.stderr = saved
+
+    def test_cli_load_with_restore(self):
+        saved, sys.stderr = sys.stderr, StringIO()
+        try :
+            with FakeRedis() as server :
+                load(dump_path('multiple_databases.rdb'), {}, ('127.0.0.1', server.port), restore=True)
+        finally :
+            sys.stderr = saved
+        self.assertEquals(server.commands, expected_commands('multiple_databases.rdb', make_callback=RestoreCallback))
+        self.assertEquals([x[1] for x in server.commands], ['RESTORE', 'RESTORE'])
+
+def expected_commands(file_name, batch_size=100, make_callback=ProtocolCallback):
+    '''The commands of rdb -c protocol, or of the command of `make_callback`, with the database each is run in'''
+    out = StringIO()
+    RdbParser(make_callback(out, batch_size)).parse(dump_path(file_name))
+    commands = []
+    db_number = 0
+    for command in read_commands(out.getvalue()) :
+        if command[0] == 'SELECT' :
+            db_number = int(command[1])
+        else :
+            commands.append([db_number] + command)
+    return commands
+
+class FakeRedis(object):
+    '''
+    A stand-in redis server that records the commands it is sent, with their database,
+    on any number of connections. Writes to the key `fail` get an error reply, and
+    CLUSTER SLOTS replies with `slots`.
+    '''
+    def __init__(self, password=None, fail=None):
+        self.password = password
+        self.fail = fail
+        self.slots = None
+        self.commands = []
+        self.connections = 0
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.bind(('127.0.0.1', 0))
+        self._server.listen(5)
+        self.port = self._server.getsockname()[1]
+        self._threads = []
+        self._accept_thread = threading.Thread(target=self.accept)
+        self._accept_thread.daemon = True
+
+    def __enter__(self):
+        self._accept_thread.start()
+        return self
+
+    def __exit__(self, *args):
+        for thread in list(self._threads) :
+            thread.join(5)
+        self._server.close()
+
+    def accept(self):
+        while True :
+            try :
+                conn, address = self._server.accept()
+            except socket.error :
+                return
+            self.connections += 1
+            thread = threading.Thread(target=self.serve, args=(conn, ))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def serve(self, conn):
+        f = conn.makefile('rb')
+        db_number = 0
+        try :
+            while True :
+                command = read_command(f)
+                if command is None :
+                    return
+                name = command[0].upper()
+                if name == 'AUTH' :
+                    conn.sendall('+OK\r\n' if command[1] == self.password else '-ERR invalid password\r\n')
+                elif name == 'SELECT' :
+                    db_number = int(command[1])
+                    conn.sendall('+OK\r\n')
+                elif name == 'CLUSTER' :
+                    conn.sendall(encode_reply(self.slots))
+                elif command[1] == self.fail :
+                    conn.sendall('-ERR %s is read only\r\n' % command[1])
+                else :
+                    self.commands.append([db_number] + command)
+                    conn.sendall(':1\r\n')
+        finally :
+            f.close()
+            conn.close()
+
+def encode_reply(value):
+    if isinstance(value, list) :
+        return '*%d\r\n' % len(value) + ''.join(encode_reply(x) for x in value)
+    if isinstance(value, int) :
+        return ':%d\r\n' % value
+    return '$%d\r\n%s\r\n' % (len(value), value)
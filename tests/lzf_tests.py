@@ -0,0 +1,100 @@
+import unittest
+import os
+
+from rdbtools import RdbParser, RdbCallback
+from rdbtools.lzf import LzfDecompressor, load_library
+
+class LzfDecompressorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.decompressor = LzfDecompressor(use_library=False)
+
+    def test_fixtures_are_byte_identical(self):
+        for file_name in ('easily_compressible_string_key.rdb', 'ziplist_that_compresses_easily.rdb',
+                          'zipmap_that_compresses_easily.rdb', 'zipmap_with_big_values.rdb', 'parser_filters.rdb',
+                          'uncompressible_string_keys.rdb', 'hash_as_ziplist.rdb') :
+            blobs = lzf_blobs(file_name)
+            self.assert_(len(blobs) > 0, msg="No compressed strings in %s" % file_name)
+            for compressed, expected_length in blobs :
+                self.assertEquals(self.decompressor.decompress(compressed, expected_length),
+                                  reference_decompress(compressed, expected_length))
+
+    def test_literal_run(self):
+        self.assertEquals(self.decompressor.decompress('\x02abc', 3), 'abc')
+
+    def test_overlapping_back_reference(self):
+        # "ab" followed by 6 bytes copied from 2 bytes back
+        self.assertEquals(self.decompressor.decompress('\x01ab\x80\x01', 8), 'abababab')
+        # a run of a single repeated byte
+        self.assertEquals(self.decompressor.decompress('\x00a\xe0\x03\x00', 13), 'a' * 13)
+
+    def test_buffer_is_reused_across_calls(self):
+        self.assertEquals(self.decompressor.decompress('\x00a\xe0\x03\x00', 13), 'a' * 13)
+        self.assertEquals(self.decompressor.decompress('\x02abc', 3), 'abc')
+        self.assertEquals(self.decompressor.decompress('\x01ab\x80\x01', 8), 'abababab')
+
+    def test_length_mismatch(self):
+        self.assertRaises(Exception, self.decompressor.decompress, '\x02abc', 4)
+        self.assertRaises(Exception, self.decompressor.decompress, '\x02abc', 2)
+
+    def test_invalid_back_reference(self):
+        self.assertRaises(Exception, self.decompressor.decompress, '\x00a\x20\x05', 4)
+
+    def test_decompress_prefix(self):
+        for compressed, expected_length in lzf_blobs('ziplist_that_compresses_easily.rdb') + lzf_blobs('parser_filters.rdb') :
+            whole = reference_decompress(compressed, expected_length)
+            for size in (1, 10, 100) :
+                self.assertEquals(self.decompressor.decompress_prefix(compressed, size)[:size], whole[:size])
+            # a cut short input decompresses to the start of the output
+            for cut in (1, 5, 40) :
+                self.assert_(whole.startswith(self.decompressor.decompress_prefix(compressed[:cut], expected_length)))
+
+    def test_library_matches_pure_python(self):
+        if load_library() is None :
+            return
+        library = LzfDecompressor(use_library=True)
+        for compressed, expected_length in lzf_blobs('ziplist_that_compresses_easily.rdb') :
+            self.assertEquals(library.decompress(compressed, expected_length),
+                              reference_decompress(compressed, expected_length))
+
+def lzf_blobs(file_name):
+    parser = RecordingParser(RdbCallback())
+    parser.parse(os.path.join(os.path.dirname(__file__), 'dumps', file_name))
+    return parser.blobs
+
+class RecordingParser(RdbParser):
+    def __init__(self, callback):
+        RdbParser.__init__(self, callback)
+        self.blobs = []
+
+    def lzf_decompress(self, compressed, expected_length):
+        self.blobs.append((compressed, expected_length))
+        return reference_decompress(compressed, expected_length)
+
+def reference_decompress(compressed, expected_length):
+    '''The byte at a time decompressor the parser used to ship with'''
+    in_stream = bytearray(compressed)
+    in_len = len(in_stream)
+    in_index = 0
+    out_stream = bytearray()
+    out_index = 0
+    while in_index < in_len :
+        ctrl = in_stream[in_index]
+        in_index = in_index + 1
+        if ctrl < 32 :
+            for x in xrange(0, ctrl + 1) :
+                out_stream.append(in_stream[in_index])
+                in_index = in_index + 1
+                out_index = out_index + 1
+        else :
+            length = ctrl >> 5
+            if length == 7 :
+                length = length + in_stream[in_index]
+                in_index = in_index + 1
+            ref = out_index - ((ctrl & 0x1f) << 8) - in_stream[in_index] - 1
+            in_index = in_index + 1
+            for x in xrange(0, length + 2) :
+                out_stream.append(out_stream[ref])
+                ref = ref + 1
+                out_index = out_index + 1
+    assert len(out_stream) == expected_length
+    return str(out_stream)
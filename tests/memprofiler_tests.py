@@ -3,6 +3,7 @@ import unittest
 from rdbtools import RdbParser
 from rdbtools import MemoryCallback
 import os
+import random
 
 class Stats():
     def __init__(self):
@@ -11,10 +12,10 @@ class Stats():
     def next_record(self, record):
         self.records[record.key] = record
 
-def get_stats(file_name):
+def get_stats(file_name, lazy_values=False):
     stats = Stats()
     callback = MemoryCallback(stats, 64)
-    parser = RdbParser(callback)
+    parser = RdbParser(callback, lazy_values=lazy_values)
     parser.parse(os.path.join(os.path.dirname(__file__), 'dumps', file_name))
     return stats.records
     
@@ -25,5 +26,12 @@ class MemoryCallbackTestCase(unittest.TestCase):
     def test_len_largest_element(self):
         stats = get_stats('ziplist_that_compresses_easily.rdb')
         self.assertEqual(stats['ziplist_compresses_easily'].len_largest_element, 36, "Length of largest element does not match")
-        
-    
\ No newline at end of file
+
+    def test_lazy_values_give_the_same_report(self):
+        for file_name in os.listdir(os.path.join(os.path.dirname(__file__), 'dumps')) :
+            # the skiplist estimate is randomised
+            random.seed(42)
+            eager = get_stats(file_name)
+            random.seed(42)
+            lazy = get_stats(file_name, lazy_values=True)
+            self.assertEquals(eager, lazy, msg="Memory report differs for %s" % file_name)
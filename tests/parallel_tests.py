@@ -0,0 +1,101 @@
+import unittest
+import os
+
+try :
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from rdbtools import RdbParser, RdbCallback, JSONCallback, DiffCallback, ProtocolCallback, RestoreCallback, MemoryCallback, StatsAggregator
+from rdbtools.parallel import ParallelRdbParser
+from rdbtools.cli.rdb import memory_callback
+
+# The skiplist memory estimate is randomised, so it is left out of memory comparisons
+DUMPS_WITH_SKIPLISTS = ('regular_sorted_set.rdb', 'parser_filters.rdb', 'sorted_set_with_binary_scores.rdb')
+
+class ParallelParserTestCase(unittest.TestCase):
+    def test_iter_entries_covers_every_key(self):
+        parser = RdbParser(RdbCallback())
+        entries = list(parser.iter_entries(dump_path('multiple_databases.rdb'), read_keys=True))
+        keys = [(x.db_number, x.key) for x in entries if x.key is not None]
+        self.assertEquals(keys, [(0, 'key_in_zeroth_database'), (2, 'key_in_second_database')])
+        for previous, entry in zip(entries, entries[1:]) :
+            self.assertEquals(previous.end, entry.offset)
+
+    def test_iter_entries_reads_expiry(self):
+        parser = RdbParser(RdbCallback())
+        entries = [x for x in parser.iter_entries(dump_path('keys_with_expiry.rdb'), read_keys=True) if x.key]
+        self.assertEquals(entries[0].expiry, 1671963072573)
+
+    def test_json_is_identical(self):
+        for file_name in dump_files() :
+            self.assertEquals(parse_parallel(file_name, JSONCallback, separator=','), parse_serial(file_name, JSONCallback),
+                              msg="JSON differs for %s" % file_name)
+
+    def test_diff_is_identical(self):
+        for file_name in dump_files() :
+            self.assertEquals(parse_parallel(file_name, DiffCallback), parse_serial(file_name, DiffCallback),
+                              msg="diff differs for %s" % file_name)
+
+    def test_protocol_is_identical(self):
+        for file_name in ('multiple_databases.rdb', 'keys_with_expiry.rdb', 'dictionary.rdb', 'linkedlist.rdb') :
+            self.assertEquals(parse_parallel(file_name, ProtocolCallback), parse_serial(file_name, ProtocolCallback),
+                              msg="protocol differs for %s" % file_name)
+
+    def test_restore_is_identical(self):
+        for file_name in ('multiple_databases.rdb', 'keys_with_expiry.rdb', 'dictionary.rdb', 'ziplist_that_compresses_easily.rdb') :
+            self.assertEquals(parse_parallel(file_name, RestoreCallback), parse_serial(file_name, RestoreCallback),
+                              msg="restore differs for %s" % file_name)
+
+    def test_memory_report_is_identical(self):
+        for file_name in dump_files() :
+            if file_name in DUMPS_WITH_SKIPLISTS :
+                continue
+            self.assertEquals(parse_parallel(file_name, memory_callback, lazy_values=True),
+                              parse_serial(file_name, memory_callback, lazy_values=True),
+                              msg="memory report differs for %s" % file_name)
+
+    def test_filters_are_applied(self):
+        filters = {'dbs' : [2]}
+        self.assertEquals(parse_parallel('multiple_databases.rdb', JSONCallback, filters=filters, separator=','),
+                          parse_serial('multiple_databases.rdb', JSONCallback, filters=filters))
+        filters = {'keys' : 'k[0-9]'}
+        self.assertEquals(parse_parallel('parser_filters.rdb', JSONCallback, filters=filters, separator=','),
+                          parse_serial('parser_filters.rdb', JSONCallback, filters=filters))
+
+    def test_stats_are_merged(self):
+        stats = StatsAggregator()
+        parser = ParallelRdbParser(MemoryCallback(stats, 64), stats_callback, jobs=2, chunk_size=1,
+                                   collect=stats_of, merge=stats.merge)
+        parser.parse(dump_path('linkedlist.rdb'))
+        serial = StatsAggregator()
+        RdbParser(MemoryCallback(serial, 64)).parse(dump_path('linkedlist.rdb'))
+        self.assertEquals(stats.aggregates, serial.aggregates)
+        self.assertEquals(stats.histograms, serial.histograms)
+        self.assertEquals(stats.scatters, serial.scatters)
+
+def stats_callback(out):
+    return MemoryCallback(StatsAggregator(), 64)
+
+def stats_of(callback):
+    return callback._stream
+
+def dump_path(file_name):
+    return os.path.join(os.path.dirname(__file__), 'dumps', file_name)
+
+def dump_files():
+    return sorted(os.listdir(os.path.join(os.path.dirname(__file__), 'dumps')))
+
+def parse_serial(file_name, make_callback, filters=None, **parser_options):
+    out = StringIO()
+    parser = RdbParser(make_callback(out), filters, **parser_options)
+    parser.parse(dump_path(file_name))
+    return out.getvalue()
+
+def parse_parallel(file_name, make_callback, filters=None, separator='', **parser_options):
+    out = StringIO()
+    # a chunk size of one byte puts every key in a range of its own
+    parser = ParallelRdbParser(make_callback(out), make_callback, out, filters=filters, jobs=2, chunk_size=1,
+                               separator=separator, **parser_options)
+    parser.parse(dump_path(file_name))
+    return out.getvalue()
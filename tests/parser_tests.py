@@ -1,7 +1,11 @@
 import unittest
 import os
+import io
 import math
-from rdbtools import RdbCallback, RdbParser
+import struct
+import tempfile
+from rdbtools import RdbCallback, RdbParser, LazyValue
+from rdbtools import parser as parser_module
 
 class RedisParserTestCase(unittest.TestCase):
     def setUp(self):
@@ -34,6 +38,15 @@ class RedisParserTestCase(unittest.TestCase):
         self.assertEquals(expiry.second, 12)
         self.assertEquals(expiry.microsecond, 573000)        
         
+    def test_keys_with_raw_expiry(self):
+        r = RawExpiryMockRedis()
+        RdbParser(r).parse(os.path.join(os.path.dirname(__file__), 'dumps', 'keys_with_expiry.rdb'))
+        expected = load_rdb('keys_with_expiry.rdb').expiry[0]
+        self.assertEquals(r.expiry[0]['expires_ms_precision'], 1671963072573)
+        self.assertEquals(dict((k, parser_module.expiry_to_datetime(v)) for k, v in r.expiry[0].items()), expected)
+        records = RdbParser(RdbCallback(), raw_expiry = True).iter_records(os.path.join(os.path.dirname(__file__), 'dumps', 'keys_with_expiry.rdb'))
+        self.assertEquals(dict((x.key, x.expiry) for x in records), r.expiry[0])
+
     def test_integer_keys(self):
         r = load_rdb('integer_keys.rdb')
         self.assertEquals(r.databases[0][125], "Positive 8 bit integer")
@@ -166,6 +179,18 @@ class RedisParserTestCase(unittest.TestCase):
         self.assertEquals(r.databases[0]['k3'], "wwwwwwww")
         self.assertEquals(len(r.databases[0]), 2)
 
+    def test_filtering_by_several_keys(self):
+        r = load_rdb('parser_filters.rdb', filters={"keys":["k1$", "set", "z[12]"], "exclude_keys":[".*[56]$"]})
+        self.assertEquals(sorted(r.databases[0].keys()), ['k1', 'set1', 'set2', 'set3', 'set4', 'z1', 'z2'])
+
+    def test_excluding_keys(self):
+        r = load_rdb('parser_filters.rdb', filters={"exclude_keys":["[lnbhs]"]})
+        self.assertEquals(sorted(r.databases[0].keys()), ['k1', 'k3', 'z1', 'z2', 'z3', 'z4'])
+
+    def test_filtering_integer_keys(self):
+        r = load_rdb('integer_keys.rdb', filters={"keys":"-1"})
+        self.assertEquals(sorted(r.databases[0].keys()), [-183358245, -123])
+
     def test_filtering_by_type(self):
         r = load_rdb('parser_filters.rdb', filters={"types":["sortedset"]})
         self.assert_('z1' in r.databases[0])
@@ -189,12 +214,443 @@ class RedisParserTestCase(unittest.TestCase):
         self.assertEquals(r.databases[0]['abcdef'], 'abcdef')
         self.assertEquals(r.databases[0]['longerstring'], 'thisisalongerstring.idontknowwhatitmeans')
 
+    def test_quicklist(self):
+        r = load_rdb('quicklist.rdb')
+        expected = [x if x % 3 == 0 else 'element-%d-%s' % (x, 'a' * 38) for x in range(0, 100)]
+        self.assertEquals(r.lengths[0]['quicklist'], 100)
+        self.assertEquals(r.databases[0]['quicklist'], expected)
+        self.assertEquals(r.databases[0]['small_list'], ['a', 1, -20000])
+        self.assertEquals(r.expiry[0]['small_list'].year, 2100)
+        self.assertEquals(r.databases[0]['big_values'], ['x' * 300, 70000, 'y' * 20000, 1099511627776, -8388608])
+
+    def test_sorted_set_with_binary_scores(self):
+        r = load_rdb('sorted_set_with_binary_scores.rdb')
+        self.assertEquals(r.databases[0]['zset'], {'one' : 1.5, 'two' : -2.25, 'plus' : float('inf'), 'minus' : float('-inf'),
+                                                   'big' : 1e100, 'zero' : 0, 'tenth' : 0.1})
+        self.assertEquals(r.databases[0]['small_zset'], {'a' : 1, 'b' : 2})
+
+    def test_aux_fields_and_database_sizes(self):
+        r = load_rdb('keys_with_lru.rdb')
+        self.assertEquals(r.aux['redis-ver'], '6.2.14')
+        self.assertEquals(r.aux['redis-bits'], 64)
+        self.assertEquals(r.db_sizes, {0 : (2, 0), 1 : (1, 0)})
+
+    def test_keys_with_idle_time_and_frequency(self):
+        r = load_rdb('keys_with_lru.rdb')
+        self.assertEquals(r.databases, {0 : {'s1' : 'v', 'z' : {'a' : 1}}, 1 : {'l' : ['a', 'b']}})
+        r = load_rdb('keys_with_lfu.rdb')
+        self.assertEquals(r.databases, {0 : {'s1' : 'v', 'h' : {'f' : 'v'}, 'st' : [1, 2, 3]}, 2 : {'other' : 42}})
+        self.assertEquals(r.expiry[2]['other'].year, 2100)
+
+    def test_streams_are_skipped(self):
+        r = load_rdb('stream.rdb')
+        self.assertEquals(r.databases, {0 : {'h' : {'a' : 1}, 'after_stream' : 'done'}})
+        infos = dict((x.key, x) for x in RdbParser(RdbCallback()).iter_key_info(
+                    os.path.join(os.path.dirname(__file__), 'dumps', 'stream.rdb')))
+        self.assertEquals((infos['mystream'].type, infos['mystream'].length), ('stream', 2))
+        self.assertEquals(infos['empty_stream'].length, 0)
+        r = load_rdb('stream.rdb', filters={'keys' : 'after'})
+        self.assertEquals(r.databases, {0 : {'after_stream' : 'done'}})
+
+    def test_listpacks(self):
+        data = listpack_dump()
+        r = MockRedis()
+        RdbParser(r).parse_bytes(data)
+        self.assertEquals(r.aux, {'redis-ver' : '7.2.0'})
+        self.assertEquals(r.db_sizes, {0 : (6, 1)})
+        self.assertEquals(r.databases[0], LISTPACK_DUMP_VALUES)
+        self.assertEquals(r.expiry[0]['set'].year, 2100)
+
+    def test_ziplist_entry_encodings(self):
+        values = ['a', 'x' * 100, 'y' * 20000, 0, 12, -1, 200, -30000, -8000000, 2 ** 31 - 1, -2 ** 40]
+        body = '\x0a' + rdb_string('list') + rdb_string(ziplist(values))
+        body += '\x0d' + rdb_string('hash') + rdb_string(ziplist(['f', 'v' * 300, 'n', 13]))
+        r = MockRedis()
+        RdbParser(r).parse_bytes('REDIS0006\xfe\x00' + body + '\xff' + '\x00' * 8)
+        self.assertEquals(r.databases[0]['list'], values)
+        self.assertEquals(r.databases[0]['hash'], {'f' : 'v' * 300, 'n' : 13})
+
+    def test_zipmap_with_free_bytes(self):
+        # a value overwritten with a shorter one leaves free bytes after it
+        zipmap = '\x02' + '\x01a' + '\x03\x02' + 'bcd??' + '\x02ef' + '\xfe' + struct.pack('<I', 300) + '\x00' + 'g' * 300 + '\xff'
+        r = MockRedis()
+        RdbParser(r).parse_bytes('REDIS0003\xfe\x00' + '\x09' + rdb_string('zipmap') + rdb_string(zipmap) + '\xff')
+        self.assertEquals(r.databases[0]['zipmap'], {'a' : 'bcd', 'ef' : 'g' * 300})
+        self.assertEquals(r.lengths[0]['zipmap'], 2)
+
+    def test_listpacks_without_callbacks(self):
+        data = listpack_dump()
+        with io.BytesIO(data) as f :
+            infos = list(RdbParser(RdbCallback()).iter_key_info_stream(f))
+        self.assertEquals([(x.key, x.type, x.encoding, x.length) for x in infos],
+                          [('hash', 'hash', 'listpack', 8), ('zset', 'sortedset', 'listpack', 3), ('set', 'set', 'listpack', 3),
+                           ('list', 'list', 'quicklist', 4), ('module', 'module', 'module', 0), ('stream', 'stream', 'stream', 0),
+                           ('after', 'string', 'string', 4)])
+        r = MockRedis()
+        RdbParser(r, filters={'keys' : 'after'}).parse_bytes(data)
+        self.assertEquals(r.databases[0], {'after' : 'done'})
+        fd, path = tempfile.mkstemp(suffix='.rdb')
+        try :
+            with os.fdopen(fd, 'wb') as f :
+                f.write(data)
+            records = dict((x.key, x.value) for x in RdbParser(RdbCallback()).iter_records(path))
+        finally :
+            os.remove(path)
+        self.assertEquals(records.pop('zset'), [(1, 'm1'), (2.5, 'm2'), (-3, 'm3')])
+        self.assertEquals(records, dict((key, set(value) if key == 'set' else value) for key, value in LISTPACK_DUMP_VALUES.items()
+                                        if key != 'zset'))
+
+    def test_unsupported_version(self):
+        self.assertRaises(Exception, RdbParser(MockRedis()).parse_bytes, 'REDIS0012\xff' + '\x00' * 8)
+
+    def test_mmap_reader_matches_file_reader(self):
+        for file_name in os.listdir(os.path.join(os.path.dirname(__file__), 'dumps')) :
+            r = load_rdb(file_name)
+            m = load_rdb(file_name, use_mmap=True)
+            self.assertEquals(r.databases, m.databases, msg = "mmap reader differs for %s" % file_name)
+            self.assertEquals(r.lengths, m.lengths)
+            self.assertEquals(r.expiry, m.expiry)
+
+    def test_mmap_reader_with_filters(self):
+        r = load_rdb('parser_filters.rdb', filters={"types":["sortedset"]}, use_mmap=True)
+        self.assertEquals(len(r.databases[0]), 4)
+
+    def test_mmap_reader_hands_out_buffers(self):
+        r = BufferedMockRedis()
+        parser = RdbParser(r, use_mmap=True)
+        parser.parse(os.path.join(os.path.dirname(__file__), 'dumps', 'linkedlist.rdb'))
+        self.assertEquals(r.lengths[0]["force_linkedlist"], 1000)
+        self.assert_("JYY4GIFI0ETHKP4VAJF5333082J4R1UPNPLE329YT0EYPGHSJQ" in r.databases[0]["force_linkedlist"])
+        self.assert_(r.buffers_seen > 0)
+
+    def test_lazy_values_decode_on_access(self):
+        r = LazyMockRedis()
+        parser = RdbParser(r, lazy_values=True)
+        parser.parse(os.path.join(os.path.dirname(__file__), 'dumps', 'easily_compressible_string_key.rdb'))
+        key = "".join('a' for x in range(0, 200))
+        self.assertEquals(r.databases[0][key], "Key that redis should compress easily")
+        handle = r.handles[0]
+        self.assertEquals(handle.encoding, 'raw')
+        self.assertEquals(len(handle), len("Key that redis should compress easily"))
+
+    def test_lazy_values_of_compressed_strings(self):
+        r = LazyMockRedis()
+        parser = RdbParser(r, lazy_values=True)
+        parser.parse(os.path.join(os.path.dirname(__file__), 'dumps', 'parser_filters.rdb'))
+        compressed = [x for x in r.handles if x.encoding == 'lzf']
+        self.assert_(len(compressed) > 0)
+        for handle in compressed :
+            self.assert_(handle.compressed_length < len(handle))
+            self.assertEquals(len(handle.value), len(handle))
+
+    def test_lazy_values_match_eager_values(self):
+        for file_name in ('linkedlist.rdb', 'dictionary.rdb', 'regular_set.rdb', 'regular_sorted_set.rdb',
+                          'uncompressible_string_keys.rdb', 'integer_keys.rdb', 'parser_filters.rdb') :
+            for use_mmap in (False, True) :
+                r = LazyMockRedis()
+                parser = RdbParser(r, lazy_values=True, use_mmap=use_mmap)
+                parser.parse(os.path.join(os.path.dirname(__file__), 'dumps', file_name))
+                self.assertEquals(r.databases, load_rdb(file_name).databases, msg="lazy values differ for %s" % file_name)
+
+    def test_parse_stream_matches_file_reader(self):
+        for file_name in os.listdir(os.path.join(os.path.dirname(__file__), 'dumps')) :
+            with open(os.path.join(os.path.dirname(__file__), 'dumps', file_name), 'rb') as f :
+                r = MockRedis()
+                # small buffers and short reads, so objects straddle refills of the buffer
+                RdbParser(r).parse_stream(TrickleStream(f, 7), buffer_size=16)
+            expected = load_rdb(file_name)
+            self.assertEquals(r.databases, expected.databases, msg = "stream reader differs for %s" % file_name)
+            self.assertEquals(r.expiry, expected.expiry)
+
+    def test_parse_bytes(self):
+        with open(os.path.join(os.path.dirname(__file__), 'dumps', 'regular_sorted_set.rdb'), 'rb') as f :
+            r = MockRedis()
+            RdbParser(r).parse_bytes(f.read())
+        self.assertEquals(r.databases, load_rdb('regular_sorted_set.rdb').databases)
+
+    def test_parse_dump_payload(self):
+        path = os.path.join(os.path.dirname(__file__), 'dumps', 'dictionary.rdb')
+        parser = RdbParser(RdbCallback())
+        entry = [x for x in parser.iter_entries(path, read_keys=True) if x.key][0]
+        with open(path, 'rb') as f :
+            # A DUMP payload is the type, the object, the RDB version and a checksum
+            f.seek(entry.offset)
+            data_type = f.read(1)
+            parser.skip_string(f)
+            payload = data_type + f.read(entry.end - f.tell()) + '\x06\x00' + '\x00' * 8
+        r = MockRedis()
+        r.start_database(0)
+        RdbParser(r).parse_dump_payload(entry.key, payload)
+        self.assertEquals(r.databases[0][entry.key], load_rdb('dictionary.rdb').databases[0][entry.key])
+
+    def test_iter_records_match_callbacks(self):
+        for file_name in os.listdir(os.path.join(os.path.dirname(__file__), 'dumps')) :
+            expected = load_rdb(file_name)
+            # a limit of 0 hands out every linked list, hashtable and skiplist in chunks
+            for materialize_limit in (1024, 0) :
+                keys = []
+                parser = RdbParser(RdbCallback())
+                for record in parser.iter_records(os.path.join(os.path.dirname(__file__), 'dumps', file_name), materialize_limit) :
+                    keys.append((record.db_number, record.key))
+                    value = expected.databases[record.db_number][record.key]
+                    if record.type == 'set' :
+                        value = set(value)
+                    self.assertEquals(record_value(record), value, msg = "%s differs in %s" % (record.key, file_name))
+                    self.assertEquals(record.expiry, expected.expiry[record.db_number].get(record.key))
+                self.assertEquals(sorted(keys), sorted((db, key) for db in expected.databases for key in expected.databases[db]))
+
+    def test_iter_records_skips_unused_chunks(self):
+        parser = RdbParser(RdbCallback())
+        records = parser.iter_records(os.path.join(os.path.dirname(__file__), 'dumps', 'parser_filters.rdb'), 0)
+        keys = [x.key for x in records]
+        self.assertEquals(sorted(keys), sorted(load_rdb('parser_filters.rdb').databases[0].keys()))
+
+    def test_iter_records_with_filters(self):
+        parser = RdbParser(RdbCallback(), filters={"types":["sortedset"]})
+        records = list(parser.iter_records(os.path.join(os.path.dirname(__file__), 'dumps', 'parser_filters.rdb')))
+        self.assertEquals(len(records), 4)
+        self.assert_(all(x.type == 'sortedset' for x in records))
+
+    def test_iter_records_stops_early(self):
+        parser = RdbParser(RdbCallback())
+        records = parser.iter_records(os.path.join(os.path.dirname(__file__), 'dumps', 'dictionary.rdb'), 0)
+        record = next(records)
+        self.assertEquals((record.key, record.type, record.encoding, record.length), ('force_dictionary', 'hash', 'hashtable', 1000))
+        self.assertEquals(len(next(record.chunks)), 1000)
+        records.close()
+        self.assertRaises(StopIteration, next, records)
+
+    def test_iter_key_info_matches_callbacks(self):
+        for file_name in os.listdir(os.path.join(os.path.dirname(__file__), 'dumps')) :
+            expected = load_rdb(file_name)
+            sizes = SizeRecorder(RdbCallback())
+            sizes.parse(os.path.join(os.path.dirname(__file__), 'dumps', file_name))
+            path = os.path.join(os.path.dirname(__file__), 'dumps', file_name)
+            infos = list(RdbParser(RdbCallback()).iter_key_info(path))
+            with open(path, 'rb') as f :
+                self.assertEquals(list(RdbParser(RdbCallback()).iter_key_info_stream(f)), infos)
+            for info in infos :
+                self.assertEquals(info.size, sizes.sizes[(info.db_number, info.key)])
+                if info.type in ('stream', 'module') :
+                    # listed, but not passed to callbacks
+                    continue
+                value = expected.databases[info.db_number][info.key]
+                length = len(str(value)) if info.type == 'string' else len(value)
+                self.assertEquals(info.length, length, msg = "%s differs in %s" % (info.key, file_name))
+                self.assertEquals(info.expiry, expected.expiry[info.db_number].get(info.key))
+            self.assertEquals(sorted((x.db_number, x.key) for x in infos if x.type not in ('stream', 'module')),
+                              sorted((db, key) for db in expected.databases for key in expected.databases[db]))
+
+    def test_iter_key_info_reads_only_headers(self):
+        parser = RdbParser(RdbCallback())
+        def lzf_decompress(compressed, expected_length) :
+            raise AssertionError('decompressed a whole string')
+        parser.lzf_decompress = lzf_decompress
+        infos = list(parser.iter_key_info(os.path.join(os.path.dirname(__file__), 'dumps', 'ziplist_that_compresses_easily.rdb')))
+        self.assertEquals([(x.encoding, x.length) for x in infos], [('ziplist', 6)])
+
+    def test_iter_key_info_counts_long_ziplists(self):
+        # ziplists of 65535 entries and more do not have their length in the header
+        header_length = parser_module.ziplist_header_length
+        parser_module.ziplist_header_length = lambda header : None
+        try :
+            infos = list(RdbParser(RdbCallback()).iter_key_info(os.path.join(os.path.dirname(__file__), 'dumps', 'parser_filters.rdb')))
+        finally :
+            parser_module.ziplist_header_length = header_length
+        expected = load_rdb('parser_filters.rdb').databases[0]
+        for info in infos :
+            if info.encoding == 'ziplist' :
+                self.assertEquals(info.length, len(expected[info.key]))
+
+    def test_iter_key_info_with_filters(self):
+        parser = RdbParser(RdbCallback(), filters={"types":["sortedset"], "exclude_keys":"z1$"})
+        infos = parser.iter_key_info(os.path.join(os.path.dirname(__file__), 'dumps', 'parser_filters.rdb'))
+        self.assertEquals(sorted(x.key for x in infos), ['z2', 'z3', 'z4'])
+
+    def test_filtering_by_ttl(self):
+        def filtered(**filters) :
+            r = MockRedis()
+            RdbParser(r, filters).parse_bytes(expiring_keys_dump())
+            return sorted(r.databases[0].keys())
+        # redis keeps a key until the time is past its expiry
+        self.assertEquals(filtered(as_of = AS_OF), ['at_as_of', 'in_a_minute', 'in_a_second', 'in_an_hour', 'persistent'])
+        self.assertEquals(filtered(as_of = AS_OF, ttl_min = 60), ['in_a_minute', 'in_an_hour', 'persistent'])
+        self.assertEquals(filtered(as_of = AS_OF, ttl_max = 60), ['at_as_of', 'in_a_minute', 'in_a_second'])
+        self.assertEquals(filtered(as_of = AS_OF, ttl_min = 10, ttl_max = 60), ['in_a_minute'])
+        self.assertEquals(filtered(as_of = AS_OF + 7200), ['persistent'])
+        # without as_of, ttls are from now, when every key of the dump has expired
+        self.assertEquals(filtered(ttl_min = 0), ['persistent'])
+
+    def test_ttl_filters_skip_keys(self):
+        parser = RdbParser(MockRedis(), filters = {'as_of' : AS_OF + 2})
+        def read_string(f) :
+            key = RdbParser.read_string(parser, f)
+            self.assert_(key not in ('at_as_of', 'in_a_second'), 'read the expired key %s' % key)
+            return key
+        parser.read_string = read_string
+        parser.parse_bytes(expiring_keys_dump())
+        fd, path = tempfile.mkstemp(suffix='.rdb')
+        try :
+            with os.fdopen(fd, 'wb') as f :
+                f.write(expiring_keys_dump())
+            records = [x.key for x in parser.iter_records(path)]
+            infos = [x.key for x in parser.iter_key_info(path)]
+        finally :
+            os.remove(path)
+        self.assertEquals(records, ['persistent', 'in_a_minute', 'in_an_hour'])
+        self.assertEquals(infos, records)
+
+def record_value(record) :
+    '''Returns the value of a record in the shape MockRedis stores it in'''
+    value = record.value
+    if record.chunks is not None :
+        value = [x for chunk in record.chunks for x in chunk]
+        if record.type == 'hash' :
+            value = dict(value)
+    if record.type == 'set' :
+        return set(value)
+    if record.type == 'sortedset' :
+        return dict((member, score) for score, member in value)
+    return value
+
+class SizeRecorder(RdbParser) :
+    '''Records the number of bytes each value takes in the dump file'''
+    def __init__(self, callback) :
+        RdbParser.__init__(self, callback)
+        self.sizes = {}
+        self._db_number = 0
+
+    def read_key_and_object(self, f, db_number, data_type) :
+        self._db_number = db_number
+        RdbParser.read_key_and_object(self, f, db_number, data_type)
+
+    def read_object(self, f, data_type) :
+        start = f.tell()
+        RdbParser.read_object(self, f, data_type)
+        self.sizes[(self._db_number, self._key)] = f.tell() - start
+
+# Keys and values of the dump built by `listpack_dump`, as MockRedis stores them
+LISTPACK_DUMP_VALUES = {
+    'hash' : {'a' : 1, 'b' : 'x' * 100, 'c' : -100, 'n16' : 30000, 'n24' : -8000000, 'n32' : 2 ** 31 - 1, 'n64' : -2 ** 40, 'big' : 'y' * 5000},
+    'zset' : {'m1' : 1, 'm2' : 2.5, 'm3' : -3},
+    'set' : ['x', 1, 300],
+    'list' : [1, 'two', 'plain' * 20, 3],
+    'after' : 'done',
+}
+
+AS_OF = 1500000000
+
+def expiring_keys_dump() :
+    '''A dump with keys that expire at AS_OF, and before and after it'''
+    body = '\xfe\x00'
+    body += '\x00' + rdb_string('persistent') + rdb_string('value')
+    body += '\xfd' + struct.pack('<I', AS_OF - 60) + '\x00' + rdb_string('a_minute_ago') + rdb_string('value')
+    body += '\xfc' + struct.pack('<Q', AS_OF * 1000) + '\x00' + rdb_string('at_as_of') + rdb_string('value')
+    body += '\xfc' + struct.pack('<Q', AS_OF * 1000 + 1000) + '\x00' + rdb_string('in_a_second') + rdb_string('value')
+    body += '\xfd' + struct.pack('<I', AS_OF + 60) + '\x0d' + rdb_string('in_a_minute') + rdb_string(ziplist(['a', 'b']))
+    body += '\xfc' + struct.pack('<Q', AS_OF * 1000 + 3600000) + '\x00' + rdb_string('in_an_hour') + rdb_string('value')
+    return 'REDIS0007' + body + '\xff' + '\x00' * 8
+
+def listpack_dump() :
+    '''A version 11 dump with the listpack encodings of redis 7, and values the parser skips'''
+    body = '\xfa' + rdb_string('redis-ver') + rdb_string('7.2.0')
+    body += '\xfe\x00' + '\xfb\x06\x01'
+    # a hash with an access frequency, then a sorted set with an idle time
+    body += '\xf9\x05' + '\x10' + rdb_string('hash') + rdb_string(listpack(['a', 1, 'b', 'x' * 100, 'c', -100, 'n16', 30000,
+                    'n24', -8000000, 'n32', 2 ** 31 - 1, 'n64', -2 ** 40, 'big', 'y' * 5000]))
+    body += '\xf8\x81' + struct.pack('>Q', 1000) + '\x11' + rdb_string('zset') + rdb_string(listpack(['m1', 1, 'm2', '2.5', 'm3', -3]))
+    body += '\xfc' + struct.pack('<Q', 4102444800000) + '\x14' + rdb_string('set') + rdb_string(listpack(['x', 1, 300]))
+    body += '\x12' + rdb_string('list') + '\x03' + '\x02' + rdb_string(listpack([1, 'two'])) + \
+            '\x01' + rdb_string('plain' * 20) + '\x02' + rdb_string(listpack([3]))
+    # a module value : the module id, then unsigned int, string, double, float, signed int and EOF opcodes
+    body += '\x07' + rdb_string('module') + '\x81' + struct.pack('>Q', 2 ** 40) + '\x02\x05' + '\x05' + rdb_string('abc') + \
+            '\x04' + struct.pack('<d', 1.5) + '\x03' + struct.pack('<f', 1.5) + '\x01\x07' + '\x00'
+    # a stream without entries, with a consumer group, a pending entry and a consumer
+    body += '\x15' + rdb_string('stream') + '\x00' + '\x00' + '\x00\x00' + '\x00\x00\x00\x00\x00' + \
+            '\x01' + rdb_string('group') + '\x00\x00\x00' + '\x01' + '\x00' * 24 + '\x01' + \
+            '\x01' + rdb_string('consumer') + '\x00' * 16 + '\x01' + '\x00' * 16
+    body += '\x00' + rdb_string('after') + '\x81' + struct.pack('>Q', 4) + 'done'
+    # a library of functions, and module data saved after the keys
+    body += '\xf5' + rdb_string('#!lua name=lib') + '\xf7' + '\x01\x02\x02' + '\x02\x07' + '\x00'
+    return 'REDIS0011' + body + '\xff' + '\x00' * 8
+
+def rdb_string(value) :
+    length = len(value)
+    if length < 64 :
+        return chr(length) + value
+    elif length < 16384 :
+        return chr(0x40 | (length >> 8)) + chr(length & 0xFF) + value
+    return '\x80' + struct.pack('>I', length) + value
+
+def ziplist(entries) :
+    body = ''
+    prev_length = 0
+    for entry in entries :
+        if isinstance(entry, str) :
+            if len(entry) < 64 :
+                encoded = chr(len(entry)) + entry
+            elif len(entry) < 16384 :
+                encoded = chr(0x40 | (len(entry) >> 8)) + chr(len(entry) & 0xFF) + entry
+            else :
+                encoded = '\x80' + struct.pack('>I', len(entry)) + entry
+        elif 0 <= entry <= 12 :
+            encoded = chr(0xF1 + entry)
+        elif -2 ** 7 <= entry < 2 ** 7 :
+            encoded = '\xfe' + struct.pack('<b', entry)
+        elif -2 ** 15 <= entry < 2 ** 15 :
+            encoded = '\xc0' + struct.pack('<h', entry)
+        elif -2 ** 23 <= entry < 2 ** 23 :
+            encoded = '\xf0' + struct.pack('<i', entry)[:3]
+        elif -2 ** 31 <= entry < 2 ** 31 :
+            encoded = '\xd0' + struct.pack('<i', entry)
+        else :
+            encoded = '\xe0' + struct.pack('<q', entry)
+        entry = (chr(prev_length) if prev_length < 254 else '\xfe' + struct.pack('<I', prev_length)) + encoded
+        body += entry
+        prev_length = len(entry)
+    return struct.pack('<IIH', len(body) + 11, 10, len(entries)) + body + '\xff'
+
+def listpack(entries) :
+    body = ''
+    for entry in entries :
+        if isinstance(entry, str) :
+            if len(entry) < 64 :
+                encoded = chr(0x80 | len(entry)) + entry
+            elif len(entry) < 4096 :
+                encoded = chr(0xE0 | (len(entry) >> 8)) + chr(len(entry) & 0xFF) + entry
+            else :
+                encoded = '\xf0' + struct.pack('<I', len(entry)) + entry
+        elif 0 <= entry < 128 :
+            encoded = chr(entry)
+        elif -4096 <= entry < 4096 :
+            encoded = chr(0xC0 | ((entry & 0x1FFF) >> 8)) + chr(entry & 0xFF)
+        elif -2 ** 15 <= entry < 2 ** 15 :
+            encoded = '\xf1' + struct.pack('<h', entry)
+        elif -2 ** 23 <= entry < 2 ** 23 :
+            encoded = '\xf2' + struct.pack('<i', entry)[:3]
+        elif -2 ** 31 <= entry < 2 ** 31 :
+            encoded = '\xf3' + struct.pack('<i', entry)
+        else :
+            encoded = '\xf4' + struct.pack('<q', entry)
+        body += encoded + listpack_backlen(len(encoded))
+    return struct.pack('<IH', len(body) + 7, len(entries)) + body + '\xff'
+
+def listpack_backlen(size) :
+    # 7 bits a byte, the first without the continuation bit, as the length is read backwards
+    groups = []
+    while True :
+        groups.insert(0, size & 127)
+        size >>= 7
+        if not size :
+            break
+    return chr(groups[0]) + ''.join(chr(x | 128) for x in groups[1:])
+
 def floateq(f1, f2) :
     return math.fabs(f1 - f2) < 0.00001
 
-def load_rdb(file_name, filters=None) :
+def load_rdb(file_name, filters=None, use_mmap=False) :
     r = MockRedis()
-    parser = RdbParser(r, filters)
+    parser = RdbParser(r, filters, use_mmap=use_mmap)
     parser.parse(os.path.join(os.path.dirname(__file__), 'dumps', file_name))
     return r
     
@@ -205,6 +661,8 @@ class MockRedis(RdbCallback):
         self.expiry = {}
         self.methods_called = []
         self.dbnum = 0
+        self.aux = {}
+        self.db_sizes = {}
 
     def currentdb(self) :
         return self.databases[self.dbnum]
@@ -231,6 +689,12 @@ class MockRedis(RdbCallback):
         self.expiry[dbnum] = {}
         self.lengths[dbnum] = {}
     
+    def aux_field(self, key, value):
+        self.aux[key] = value
+
+    def db_size(self, db_size, expires_size):
+        self.db_sizes[self.dbnum] = (db_size, expires_size)
+
     def set(self, key, value, expiry, info):
         self.currentdb()[key] = value
         if expiry :
@@ -327,4 +791,54 @@ class MockRedis(RdbCallback):
     def end_rdb(self):
         self.methods_called.append('end_rdb')
 
+class BufferedMockRedis(MockRedis):
+    wants_buffers = True
+
+    def __init__(self) :
+        MockRedis.__init__(self)
+        self.buffers_seen = 0
+
+    def rpush(self, key, value) :
+        if not isinstance(value, (str, int, long)) :
+            self.buffers_seen += 1
+            value = str(value)
+        MockRedis.rpush(self, key, value)
+
+class RawExpiryMockRedis(MockRedis):
+    wants_raw_expiry = True
+
+class LazyMockRedis(MockRedis):
+    '''Decodes lazy values as they arrive, since they only stay valid during the parse'''
+    def __init__(self) :
+        MockRedis.__init__(self)
+        self.handles = []
+
+    def decode(self, value) :
+        if isinstance(value, LazyValue) :
+            self.handles.append(value)
+            return value.value
+        return value
+
+    def set(self, key, value, expiry, info):
+        MockRedis.set(self, key, self.decode(value), expiry, info)
+
+    def hset(self, key, field, value):
+        MockRedis.hset(self, key, self.decode(field), self.decode(value))
+
+    def sadd(self, key, member):
+        MockRedis.sadd(self, key, self.decode(member))
+
+    def rpush(self, key, value) :
+        MockRedis.rpush(self, key, self.decode(value))
+
+    def zadd(self, key, score, member):
+        MockRedis.zadd(self, key, score, self.decode(member))
+
+class TrickleStream(object):
+    '''A file object that only has `read`, and returns at most `chunk` bytes per call, like a pipe'''
+    def __init__(self, f, chunk) :
+        self._f = f
+        self._chunk = chunk
 
+    def read(self, size) :
+        return self._f.read(min(size, self._chunk))
@@ -0,0 +1,148 @@
+import unittest
+import os
+import socket
+import threading
+
+try :
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from rdbtools import RdbParser, JSONCallback
+from rdbtools.replication import open_snapshot
+from rdbtools.cli.rdb import run
+from tests.parser_tests import MockRedis, load_rdb
+
+class ReplicationTestCase(unittest.TestCase):
+    def test_psync(self):
+        with FakeMaster('dictionary.rdb') as master :
+            r = parse_from(master)
+        self.assertEquals(r.databases, load_rdb('dictionary.rdb').databases)
+        self.assertEquals(master.commands, [['PSYNC', '?', '-1']])
+
+    def test_sync_on_old_servers(self):
+        with FakeMaster('keys_with_expiry.rdb', psync=False) as master :
+            r = parse_from(master)
+        self.assertEquals(r.databases, load_rdb('keys_with_expiry.rdb').databases)
+        self.assertEquals(r.expiry, load_rdb('keys_with_expiry.rdb').expiry)
+        self.assertEquals([x[0] for x in master.commands], ['PSYNC', 'SYNC'])
+
+    def test_password(self):
+        with FakeMaster('linkedlist.rdb', password='secret') as master :
+            r = parse_from(master, password='secret')
+        self.assertEquals(r.databases, load_rdb('linkedlist.rdb').databases)
+        with FakeMaster('linkedlist.rdb', password='secret') as master :
+            self.assertRaises(Exception, open_snapshot, '127.0.0.1', master.port, 'wrong')
+
+    def test_reads_stop_at_end_of_snapshot(self):
+        with FakeMaster('multiple_databases.rdb') as master :
+            snapshot = open_snapshot('127.0.0.1', master.port)
+            try :
+                data = snapshot.read(1024 * 1024)
+                self.assertEquals(len(data), snapshot.length)
+                self.assertEquals(snapshot.read(10), '')
+            finally :
+                snapshot.close()
+        with open(dump_path('multiple_databases.rdb'), 'rb') as f :
+            self.assertEquals(data, f.read())
+
+    def test_truncated_snapshot(self):
+        with FakeMaster('linkedlist.rdb', truncate=100) as master :
+            self.assertRaises(Exception, parse_from, master)
+
+    def test_cli_run(self):
+        with FakeMaster('multiple_databases.rdb') as master :
+            snapshot = open_snapshot('127.0.0.1', master.port)
+            out = StringIO()
+            try :
+                run('json', snapshot, out, {})
+            finally :
+                snapshot.close()
+        expected = StringIO()
+        RdbParser(JSONCallback(expected)).parse(dump_path('multiple_databases.rdb'))
+        self.assertEquals(out.getvalue(), expected.getvalue())
+
+def dump_path(file_name):
+    return os.path.join(os.path.dirname(__file__), 'dumps', file_name)
+
+def parse_from(master, password=None):
+    r = MockRedis()
+    snapshot = open_snapshot('127.0.0.1', master.port, password)
+    try :
+        RdbParser(r).parse_stream(snapshot)
+    finally :
+        snapshot.close()
+    return r
+
+class FakeMaster(object):
+    '''
+    A stand-in redis master that serves one of the test dumps to a single replica
+
+    The snapshot is preceded by keep-alive newlines, sent in small pieces, and
+    followed by a command from the replication stream, as a real master would.
+    '''
+    def __init__(self, file_name, psync=True, password=None, truncate=None):
+        with open(dump_path(file_name), 'rb') as f :
+            self.snapshot = f.read()
+        self.psync = psync
+        self.password = password
+        self.truncate = truncate
+        self.commands = []
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.bind(('127.0.0.1', 0))
+        self._server.listen(1)
+        self.port = self._server.getsockname()[1]
+        self._thread = threading.Thread(target=self.serve)
+        self._thread.daemon = True
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._thread.join(5)
+        self._server.close()
+
+    def serve(self):
+        conn, address = self._server.accept()
+        f = conn.makefile('rb')
+        try :
+            while True :
+                command = read_command(f)
+                if command is None :
+                    return
+                self.commands.append(command)
+                name = command[0].upper()
+                if name == 'AUTH' :
+                    if command[1] == self.password :
+                        conn.sendall('+OK\r\n')
+                    else :
+                        conn.sendall('-ERR invalid password\r\n')
+                elif name == 'PSYNC' and not self.psync :
+                    conn.sendall("-ERR unknown command 'PSYNC'\r\n")
+                elif name in ('PSYNC', 'SYNC') :
+                    if name == 'PSYNC' :
+                        conn.sendall('+FULLRESYNC 0123456789abcdef0123456789abcdef01234567 1\r\n')
+                    conn.sendall('\n\n')
+                    conn.sendall('$%d\r\n' % len(self.snapshot))
+                    snapshot = self.snapshot[:self.truncate]
+                    for x in range(0, len(snapshot), 100) :
+                        conn.sendall(snapshot[x:x + 100])
+                    if self.truncate is None :
+                        conn.sendall('*1\r\n$4\r\nPING\r\n')
+                    return
+                else :
+                    conn.sendall('-ERR unknown command\r\n')
+        finally :
+            f.close()
+            conn.close()
+
+def read_command(f):
+    line = f.readline()
+    if not line :
+        return None
+    args = []
+    for x in range(0, int(line[1:])) :
+        length = int(f.readline()[1:])
+        args.append(f.read(length + 2)[:length])
+    return args
@@ -0,0 +1,85 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+
+try :
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from rdbtools import RdbParser, NDJSONCallback
+from rdbtools.shards import RotatingShards, HashedShards, open_shards, shard_path, parse_size
+from tests.callbacks_tests import dump_path
+
+class ShardsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.output = os.path.join(self.tmpdir, 'dump.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_shard_names(self):
+        self.assertEquals(shard_path('/exports/dump.json', 3), '/exports/dump-00003.json')
+        self.assertEquals(parse_size('1000'), 1000)
+        self.assertEquals(parse_size('256m'), 256 * 1024 * 1024)
+        self.assertRaises(ValueError, parse_size, 'big')
+
+    def test_rotating_shards(self):
+        with RotatingShards(self.output, 100) as shards :
+            for x in range(0, 50) :
+                shards.write_record('key%d' % x, '%-29d\n' % x)
+        self.assertEquals(shards.paths, [shard_path(self.output, x) for x in range(0, 13)])
+        lines = []
+        for path in shards.paths :
+            with open(path, 'rb') as f :
+                data = f.read()
+            self.assert_(len(data) <= 120)
+            lines.extend(data.splitlines())
+        self.assertEquals([int(x) for x in lines], range(0, 50))
+        self.assertEquals(sorted(os.listdir(self.tmpdir)), sorted(os.path.basename(x) for x in shards.paths))
+
+    def test_hashed_shards(self):
+        with HashedShards(self.output, 4) as shards :
+            for x in range(0, 1000) :
+                shards.write_record('key%d' % (x % 100), 'key%d\n' % (x % 100))
+        owners = {}
+        for path in shards.paths :
+            with open(path, 'rb') as f :
+                for key in f.read().splitlines() :
+                    owners.setdefault(key, set()).add(path)
+        self.assertEquals(len(owners), 100)
+        self.assert_(all(len(x) == 1 for x in owners.values()))
+        self.assertEquals(len(set.union(*owners.values())), 4)
+
+    def test_unfinished_shards_are_not_renamed(self):
+        try :
+            with RotatingShards(self.output, 10) as shards :
+                shards.write_record('a', 'a' * 10 + '\n')
+                shards.write_record('b', 'b' * 10 + '\n')
+                raise ValueError('parse failed')
+        except ValueError :
+            pass
+        self.assertEquals(sorted(os.listdir(self.tmpdir)), ['dump-00000.json', 'dump-00001.json.tmp'])
+
+    def test_ndjson_shards_hold_every_key(self):
+        out = StringIO()
+        RdbParser(NDJSONCallback(out)).parse(dump_path('parser_filters.rdb'))
+        expected = out.getvalue().splitlines(True)
+        for shard_size, count in ((200, None), (None, 3)) :
+            with open_shards(self.output, shard_size, count) as shards :
+                RdbParser(NDJSONCallback(shards)).parse(dump_path('parser_filters.rdb'))
+            lines = []
+            for path in shards.paths :
+                with open(path, 'rb') as f :
+                    lines.extend(f.read().splitlines(True))
+                os.remove(path)
+            self.assert_(len(shards.paths) > 1)
+            self.assertEquals(sorted(lines), sorted(expected))
+            if shard_size :
+                self.assertEquals(lines, expected)
+        for line in expected :
+            record = json.loads(line)
+            self.assertEquals(sorted(record.keys()), ['db', 'expiry', 'key', 'type', 'value'])